@@ -0,0 +1,45 @@
+'''
+Benchmark util.fpString_to_array against util.fpString_to_array_fast.
+Check both functions return the same array and report rows per second.
+Usage:
+    python fpString_to_array_benchmark.py [num_row] [csv_with_fingerprint_column]
+'''
+import sys
+import time
+import numpy as np
+import pandas as pd
+from lightchem.utility import util
+
+def random_fingerprint(num_row, num_bit = 1024, density = 0.03, seed = 2016):
+    '''
+    Create random fingerprint strings with roughly the density of ECFP1024.
+    '''
+    np.random.seed(seed)
+    bits = np.random.binomial(1, density, (num_row, num_bit))
+    return pd.Series(["".join(item) for item in bits.astype(str)])
+
+def time_function(function, fp_col, sep):
+    start_time = time.time()
+    fp_array = function(fp_col, sep)
+    return fp_array, time.time() - start_time
+
+if __name__ == "__main__":
+    num_row = 20000
+    if len(sys.argv) > 1:
+        num_row = int(sys.argv[1])
+    if len(sys.argv) > 2:
+        fp_col = pd.read_csv(sys.argv[2], nrows = num_row)['fingerprint']
+    else:
+        fp_col = random_fingerprint(num_row)
+    fp_col_sep = pd.Series(["|".join(item) for item in fp_col])
+
+    for sep, col in [("", fp_col), ("|", fp_col_sep)]:
+        old_array, old_time = time_function(util.fpString_to_array, col, sep)
+        new_array, new_time = time_function(util.fpString_to_array_fast, col, sep)
+        assert old_array.dtype == new_array.dtype
+        assert np.array_equal(old_array, new_array)
+        print("sep='%s', %d rows x %d bits, outputs equal" % (sep, old_array.shape[0],
+                                                              old_array.shape[1]))
+        print("  fpString_to_array:      %12.0f rows/s" % (len(col) / old_time))
+        print("  fpString_to_array_fast: %12.0f rows/s" % (len(col) / new_time))
+        print("  speedup: %.1fx" % (old_time / new_time))
@@ -0,0 +1,25 @@
+# script to convert fingerprint csv files into binary stores, which
+# load.readData opens with np.memmap instead of parsing the csv again.
+# Usage: python csv_to_binary_store.py [csv_file ...]
+# Without arguments, convert every *_ecfp1024 and *_MACCSkey(s)167 csv under
+# datasets/. Each store is written next to its csv, ex: muv_BinaryLabel_ecfp1024_store
+
+from lightchem.load import binary_store
+import glob
+import os
+import sys
+import time
+
+if __name__ == "__main__":
+    current_dir = os.path.dirname(os.path.realpath(__file__))
+    if len(sys.argv) > 1:
+        csv_files = sys.argv[1:]
+    else:
+        csv_files = []
+        for pattern in ["*_ecfp1024.csv.zip", "*_MACCSkey*167.csv.zip"]:
+            csv_files += glob.glob(os.path.join(current_dir, "*", "*", pattern))
+    for csv_file in sorted(csv_files):
+        start_time = time.time()
+        store_dir = binary_store.csv_to_store(csv_file)
+        print("%s -> %s --- %s seconds ---" % (csv_file, store_dir,
+                                               time.time() - start_time))
@@ -17,13 +17,13 @@ if __name__ == "__main__":
     muv = muv.fillna(0)
 
     smile_colname = 'smiles'
-    fp = fingerprint.smile_to_fps(muv,smile_colname)
+    fp = fingerprint.smile_to_fps(muv,smile_colname,n_jobs = -1)
     # morgan(ecfp) fp
     morgan_fp = fp.Morgan()
     morgan_fp.to_csv(current_dir + "/muv_BinaryLabel_ecfp1024.csv",index = False)
 
     # MACCSkeys fp
-    fp = fingerprint.smile_to_fps(muv,smile_colname)
+    fp = fingerprint.smile_to_fps(muv,smile_colname,n_jobs = -1)
     maccs_fp = fp.MACCSkeys()
     maccs_fp.to_csv(current_dir + "/muv_BinaryLabel_MACCSkey167.csv",index = False)
 
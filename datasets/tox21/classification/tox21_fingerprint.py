@@ -17,13 +17,13 @@ if __name__ == "__main__":
     tox21 = tox21.fillna(0)
 
     smile_colname = 'smiles'
-    fp = fingerprint.smile_to_fps(tox21,smile_colname)
+    fp = fingerprint.smile_to_fps(tox21,smile_colname,n_jobs = -1)
     # morgan(ecfp) fp
     morgan_fp = fp.Morgan()
     morgan_fp.to_csv(current_dir + "/tox21_BinaryLabel_ecfp1024.csv",index = False)
 
     # MACCSkeys fp
-    fp = fingerprint.smile_to_fps(tox21,smile_colname)
+    fp = fingerprint.smile_to_fps(tox21,smile_colname,n_jobs = -1)
     maccs_fp = fp.MACCSkeys()
     maccs_fp.to_csv(current_dir + "/tox21_BinaryLabel_MACCSkey167.csv",index = False)
 
@@ -12,6 +12,7 @@ Gblinear
 import sys
 from sklearn import metrics
 from lightchem.load import load
+from lightchem.load import binary_store
 from lightchem.fold import fold
 from lightchem.data import xgb_data
 from lightchem.eval import xgb_eval
@@ -48,12 +49,13 @@ if __name__ == "__main__":
     data_name = 'binaryECFP'
     label_colname = target_name # label column name of one target
     model_name_to_use = ['GbtreeLogistic','GblinearLogistic'] # Define model to use
-    temp_data = load.readData(file_dir,label_colname)
+    temp_data = load.readData(binary_store.store_or_csv(file_dir),label_colname,
+                              feature_format='csr')
     temp_data.read()
     X_data = temp_data.features()
     y_data = temp_data.label()
     myfold = fold.fold(X_data,y_data,4,SEED)
-    myfold = myfold.generate_skfolds()
+    myfold = myfold.generate_foldIndex()
     data = xgb_data.xgbData(myfold,X_data,y_data)
     data.build()
     setting_list.append({'data_name':data_name,'model_type':model_name_to_use,
@@ -66,7 +68,8 @@ if __name__ == "__main__":
     data_name = 'binaryMACCSkeys'
     label_colname = target_name
     model_name_to_use = ['GbtreeLogistic','GblinearLogistic']
-    temp_data = load.readData(file_dir,label_colname)
+    temp_data = load.readData(binary_store.store_or_csv(file_dir),label_colname,
+                              feature_format='csr')
     temp_data.read()
     X_data = temp_data.features()
     y_data = temp_data.label()
@@ -13,6 +13,7 @@ Gbtree
 import sys
 from sklearn import metrics
 from lightchem.load import load
+from lightchem.load import binary_store
 from lightchem.fold import fold
 from lightchem.data import xgb_data
 from lightchem.eval import xgb_eval
@@ -49,12 +50,13 @@ if __name__ == "__main__":
     data_name = 'binaryECFP'
     label_colname = 'pcba-' + aid # label column name of one target
     model_name_to_use = ['GbtreeLogistic'] # Define model to use
-    temp_data = load.readData(file_dir,label_colname)
+    temp_data = load.readData(binary_store.store_or_csv(file_dir),label_colname,
+                              feature_format='packed',chunksize=50000)
     temp_data.read()
     X_data = temp_data.features()
     y_data = temp_data.label()
     myfold = fold.fold(X_data,y_data,4,SEED)
-    myfold = myfold.generate_skfolds()
+    myfold = myfold.generate_foldIndex()
     data = xgb_data.xgbData(myfold,X_data,y_data)
     data.build()
     setting_list.append({'data_name':data_name,'model_type':model_name_to_use,
@@ -66,7 +68,8 @@ if __name__ == "__main__":
     data_name = 'contECFP'
     label_colname = aid + '_logAC50'
     model_name_to_use = ['GbtreeRegression']
-    temp_data = load.readData(file_dir,label_colname)
+    temp_data = load.readData(binary_store.store_or_csv(file_dir),label_colname,
+                              feature_format='packed',chunksize=50000)
     temp_data.read()
     X_data = temp_data.features()
     y_data = temp_data.label()
@@ -81,7 +84,8 @@ if __name__ == "__main__":
     data_name = 'binaryMACCSkeys'
     label_colname = 'pcba-' + aid
     model_name_to_use = ['GbtreeLogistic']
-    temp_data = load.readData(file_dir,label_colname)
+    temp_data = load.readData(binary_store.store_or_csv(file_dir),label_colname,
+                              feature_format='packed',chunksize=50000)
     temp_data.read()
     X_data = temp_data.features()
     y_data = temp_data.label()
@@ -96,7 +100,8 @@ if __name__ == "__main__":
     data_name = 'contMACCSkeys'
     label_colname = aid + '_logAC50'
     model_name_to_use = ['GbtreeRegression']
-    temp_data = load.readData(file_dir,label_colname)
+    temp_data = load.readData(binary_store.store_or_csv(file_dir),label_colname,
+                              feature_format='packed',chunksize=50000)
     temp_data.read()
     X_data = temp_data.features()
     y_data = temp_data.label()
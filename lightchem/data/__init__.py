@@ -1 +1,3 @@
 from lightchem.data.xgb_data import *
+from lightchem.data.packed_fingerprint import *
+from lightchem.data.dmatrix_cache import *
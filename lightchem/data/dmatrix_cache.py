@@ -0,0 +1,205 @@
+"""
+Content-addressed on-disk cache of xgboost.DMatrix.
+"""
+
+import os
+import hashlib
+import tempfile
+import threading
+import numpy as np
+import scipy.sparse
+import xgboost as xgb
+from lightchem.data.packed_fingerprint import packedFingerprint
+
+DMATRIX_EXTENSION = '.buffer'
+ARRAY_EXTENSION = '.npy'
+
+def data_hash(X_data,label = None):
+    """
+    Return sha1 hex digest of features and label. Equal content gives equal
+    digest regardless of where the data is read from.
+    Parameters:
+    -----------
+    X_data: numpy.ndarray/pandas.DataFrame/packedFingerprint/scipy.sparse matrix
+      Features
+    label: numpy.ndarray
+      Label(Response variable), default to None.
+    """
+    digest = hashlib.sha1()
+    if isinstance(X_data,packedFingerprint):
+        _update_digest(digest,'packed',X_data.shape,X_data.packed())
+    elif scipy.sparse.issparse(X_data):
+        X_data = X_data.tocsr()
+        _update_digest(digest,'csr',X_data.shape,X_data.data,
+                       X_data.indices,X_data.indptr)
+    else:
+        X_data = np.asarray(X_data)
+        _update_digest(digest,'dense',X_data.shape,X_data)
+    if label is not None:
+        _update_digest(digest,'label',np.shape(label),np.asarray(label))
+    return digest.hexdigest()
+
+def row_hash(key,row_index):
+    """
+    Return sha1 hex digest of a subset of rows, selected by row_index, of the
+    data with digest key.
+    """
+    digest = hashlib.sha1()
+    digest.update(key.encode('ascii'))
+    _update_digest(digest,'rows',np.shape(row_index),np.asarray(row_index,dtype=np.int64))
+    return digest.hexdigest()
+
+def _update_digest(digest,tag,shape,*arrays):
+    digest.update((tag + str(tuple(shape))).encode('ascii'))
+    for array in arrays:
+        array = np.ascontiguousarray(array)
+        digest.update(str(array.dtype).encode('ascii'))
+        digest.update(memoryview(array.reshape(-1).view(np.uint8)))
+
+class dmatrixCache(object):
+    """
+    Directory of xgboost.DMatrix binary files named by content hash. Files are
+    evicted in least recently used order once the directory exceeds
+    max_bytes. Hits and misses are counted for `stats`.
+    """
+    def __init__(self,cache_dir,max_bytes = None):
+        """
+        Parameters:
+        -----------
+        cache_dir: str
+          Directory of cached files. Created if not exists.
+        max_bytes: int
+          Size cap of the directory in bytes. Default to None, no limit.
+        """
+        if not os.path.exists(cache_dir):
+            os.makedirs(cache_dir)
+        self.__cache_dir = cache_dir
+        self.__max_bytes = max_bytes
+        self.__hits = 0
+        self.__misses = 0
+        self.__lock = threading.Lock()
+
+    def get(self,key,build_fn):
+        """
+        Return the DMatrix stored under key, or call build_fn() to create it
+        and save it under key.
+        """
+        path = self.__path(key,DMATRIX_EXTENSION)
+        if self.__hit(path):
+            return xgb.DMatrix(path,silent = True)
+        dmatrix = build_fn()
+        self.__save(path,lambda f: dmatrix.save_binary(f,silent = True))
+        return dmatrix
+
+    def get_array(self,key,build_fn):
+        """
+        Return the numpy.ndarray stored under key, or call build_fn() to
+        create it and save it under key.
+        """
+        path = self.__path(key,ARRAY_EXTENSION)
+        if self.__hit(path):
+            return np.load(path)
+        array = build_fn()
+        def write(temp_path):
+            # np.save appends .npy to file names, write through a file object.
+            with open(temp_path,'wb') as f:
+                np.save(f,array)
+        self.__save(path,write)
+        return array
+
+    def stats(self):
+        """
+        Return dict with number of hits, misses, hit rate, and number and
+        total bytes of cached files.
+        """
+        files = self.__files()
+        lookups = self.__hits + self.__misses
+        return {'hits':self.__hits,
+                'misses':self.__misses,
+                'hit_rate':float(self.__hits) / lookups if lookups > 0 else 0.0,
+                'num_file':len(files),
+                'nbytes':sum(size for _,size,_ in files)}
+
+    def report(self):
+        """
+        Return one line summary of `stats`.
+        """
+        stats = self.stats()
+        return ('DMatrix cache: {} hits, {} misses, hit rate {:.1%}, '
+                '{} files, {:.1f} MB').format(stats['hits'],stats['misses'],
+                                              stats['hit_rate'],stats['num_file'],
+                                              stats['nbytes'] / 1024.0**2)
+
+    def clear(self):
+        """
+        Remove all cached files.
+        """
+        for path,_,_ in self.__files():
+            self.__remove(path)
+
+    def __path(self,key,extension):
+        return os.path.join(self.__cache_dir,key + extension)
+
+    def __hit(self,path):
+        if os.path.isfile(path):
+            # Mark as recently used.
+            try:
+                os.utime(path,None)
+            except OSError:
+                pass
+            with self.__lock:
+                self.__hits += 1
+            return True
+        with self.__lock:
+            self.__misses += 1
+        return False
+
+    def __save(self,path,write_fn):
+        """
+        Write to a temporary file and rename, so that other processes never
+        read a partially written file.
+        """
+        handle, temp_path = tempfile.mkstemp(dir = self.__cache_dir,
+                                             suffix = '.tmp')
+        os.close(handle)
+        try:
+            write_fn(temp_path)
+            os.rename(temp_path,path)
+        finally:
+            self.__remove(temp_path)
+        self.__evict(keep = path)
+
+    def __files(self):
+        """
+        Return list of (path, size, mtime) of cached files.
+        """
+        files = []
+        for name in os.listdir(self.__cache_dir):
+            if not (name.endswith(DMATRIX_EXTENSION) or name.endswith(ARRAY_EXTENSION)):
+                continue
+            path = os.path.join(self.__cache_dir,name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            files.append((path,stat.st_size,stat.st_mtime))
+        return files
+
+    def __evict(self,keep):
+        if self.__max_bytes is None:
+            return
+        files = sorted(self.__files(),key = lambda item: item[2])
+        total = sum(size for _,size,_ in files)
+        for path,size,_ in files:
+            if total <= self.__max_bytes:
+                break
+            if path == keep:
+                continue
+            self.__remove(path)
+            total -= size
+
+    def __remove(self,path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
@@ -0,0 +1,156 @@
+"""
+Bit-packed fingerprint matrix.
+"""
+
+import numpy as np
+import scipy.sparse
+from lightchem.utility import util
+
+class packedFingerprint(object):
+    """
+    0/1 fingerprint matrix stored with np.packbits, where each row of num_bit
+    bits takes ceil(num_bit/8) bytes, 1/64 of the same matrix in float64.
+    Rows can be selected like a numpy array, features are only unpacked on
+    demand, either into a scipy.sparse.csr_matrix or dense blocks.
+    """
+    def __init__(self,packed,num_bit):
+        """
+        Parameters:
+        -----------
+        packed: numpy.ndarray
+          uint8 array of shape (num_row, ceil(num_bit/8)), output of
+          np.packbits(fp_array, axis=1). Can be a numpy.memmap.
+        num_bit: int
+          Number of bits(features) of one fingerprint.
+        """
+        packed = np.asanyarray(packed)
+        if packed.dtype != np.uint8 or packed.ndim != 2:
+            raise ValueError('packed must be a 2-D uint8 array')
+        if packed.shape[1] != (num_bit + 7) // 8:
+            raise ValueError('packed has ' + str(packed.shape[1]) + ' bytes per '
+                             'row, which does not match num_bit = ' + str(num_bit))
+        self.__packed = packed
+        self.__num_bit = int(num_bit)
+
+    @classmethod
+    def from_array(cls,fp_array,chunk_size = 10000):
+        """
+        Pack a dense 0/1 array or scipy.sparse matrix. Pack chunk_size rows at
+        a time so that only one chunk is converted to dense boolean at once.
+        """
+        if scipy.sparse.issparse(fp_array):
+            fp_array = fp_array.tocsr()
+        else:
+            fp_array = np.asanyarray(fp_array)
+        if fp_array.ndim != 2:
+            raise ValueError('fp_array must be 2-D')
+        num_row, num_bit = fp_array.shape
+        packed = np.zeros((num_row, (num_bit + 7) // 8), dtype = np.uint8)
+        for start in range(0, num_row, chunk_size):
+            block = fp_array[start:start + chunk_size]
+            if scipy.sparse.issparse(block):
+                block = block.toarray()
+            if np.any((block != 0) & (block != 1)):
+                raise ValueError('packedFingerprint only stores 0/1 values')
+            packed[start:start + chunk_size] = np.packbits(block != 0, axis = 1)
+        return cls(packed, num_bit)
+
+    @classmethod
+    def from_fpString(cls,fp_col,sep = "",chunk_size = 10000):
+        """
+        Decode fingerprint strings chunk by chunk and pack them, so the whole
+        column is never held unpacked.
+        Parameters:
+        -----------
+        fp_col: Pandas.Series, each item is a fingerprint string. Ex: 000101,110100
+        sep: Value used to seperate original value.
+        """
+        fp_list = list(fp_col)
+        blocks = []
+        num_bit = 0
+        for start in range(0, len(fp_list), chunk_size):
+            block = util.fpString_to_array_fast(fp_list[start:start + chunk_size],
+                                                sep, dtype = np.uint8)
+            if start == 0:
+                num_bit = block.shape[1]
+            elif block.shape[1] != num_bit:
+                raise ValueError('All fingerprint strings must have the same length')
+            if np.any(block > 1):
+                raise ValueError('packedFingerprint only stores 0/1 values')
+            blocks.append(np.packbits(block, axis = 1))
+        if len(blocks) == 0:
+            return cls(np.zeros((0, 0), dtype = np.uint8), 0)
+        return cls(np.concatenate(blocks), num_bit)
+
+    @property
+    def shape(self):
+        return (self.__packed.shape[0], self.__num_bit)
+
+    @property
+    def ndim(self):
+        return 2
+
+    @property
+    def nbytes(self):
+        return self.__packed.nbytes
+
+    def __len__(self):
+        return self.__packed.shape[0]
+
+    def __getitem__(self,rows):
+        """
+        Select rows, return a packedFingerprint. rows can be an integer, slice,
+        boolean mask or array of row index.
+        """
+        if isinstance(rows, tuple):
+            raise IndexError('packedFingerprint only supports row selection')
+        if isinstance(rows, (int, np.integer)):
+            rows = [rows]
+        if not isinstance(rows, slice):
+            rows = np.asarray(rows)
+        return packedFingerprint(self.__packed[rows], self.__num_bit)
+
+    def packed(self):
+        """
+        Return the underlying packed uint8 array.
+        """
+        return self.__packed
+
+    def toarray(self,dtype = np.uint8):
+        """
+        Unpack all rows into a dense array.
+        """
+        return self.__unpack(self.__packed, dtype)
+
+    def dense_blocks(self,block_size = 10000,dtype = np.float32):
+        """
+        Generator that unpacks block_size rows at a time into dense arrays.
+        """
+        for start in range(0, self.__packed.shape[0], block_size):
+            yield self.__unpack(self.__packed[start:start + block_size], dtype)
+
+    def tocsr(self,dtype = np.float32,block_size = 10000):
+        """
+        Unpack into a scipy.sparse.csr_matrix, one block of rows at a time, so
+        the matrix is never held as dense float.
+        """
+        num_row = self.__packed.shape[0]
+        indptr = np.zeros(num_row + 1, dtype = np.int64)
+        indices = []
+        for start in range(0, num_row, block_size):
+            block = self.__unpack(self.__packed[start:start + block_size], np.uint8)
+            row, col = np.nonzero(block)
+            indices.append(col)
+            indptr[start + 1:start + block.shape[0] + 1] = np.cumsum(
+                np.bincount(row, minlength = block.shape[0])) + indptr[start]
+        if len(indices) > 0:
+            indices = np.concatenate(indices)
+        else:
+            indices = np.zeros(0, dtype = np.int64)
+        data = np.ones(len(indices), dtype = dtype)
+        return scipy.sparse.csr_matrix((data, indices, indptr),
+                                       shape = (num_row, self.__num_bit))
+
+    def __unpack(self,packed,dtype):
+        fp_array = np.unpackbits(packed, axis = 1)[:, :self.__num_bit]
+        return fp_array.astype(dtype, copy = False)
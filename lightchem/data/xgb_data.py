@@ -9,127 +9,512 @@ import numpy as np
 import itertools as it
 import xgboost as xgb
 import scipy
+import scipy.sparse
 import os
 import glob
+import collections
+import contextlib
+import atexit
+import threading
+import weakref
+from lightchem.data.packed_fingerprint import packedFingerprint
+from lightchem.data import dmatrix_cache
+from lightchem.eval import xgb_eval
+from lightchem.fold.fold import as_foldIndex
+
+def to_csr(X_data):
+    """
+    Convert features into a float32 scipy.sparse.csr_matrix, the format used
+    to build xgboost.DMatrix.
+    Sparse matrix is passed as is and packedFingerprint is unpacked straight
+    into the sparse matrix, so neither is held as a dense float64 array.
+    Parameters:
+    -----------
+    X_data: numpy.ndarray/pandas.DataFrame/packedFingerprint/scipy.sparse matrix
+      Features
+    """
+    if isinstance(X_data,packedFingerprint):
+        X_data = X_data.tocsr()
+    elif scipy.sparse.issparse(X_data):
+        X_data = X_data.tocsr()
+    else:
+        X_data = scipy.sparse.csr_matrix(np.asarray(X_data))
+    if X_data.dtype != np.float32:
+        # DMatrix stores float32, converting only the non-zero values here
+        # avoids the element by element copy in xgboost.
+        X_data = X_data.astype(np.float32)
+    return X_data
+
+def to_DMatrix(X_data,label = None):
+    """
+    Convert features into xgboost.DMatrix through a scipy.sparse.csr_matrix.
+    Parameters:
+    -----------
+    X_data: numpy.ndarray/pandas.DataFrame/packedFingerprint/scipy.sparse matrix
+      Features
+    label: numpy.ndarray
+      Label(Response variable), default to None.
+    """
+    return xgb.DMatrix(to_csr(X_data),label=label)
+
+def slice_DMatrix(dmatrix,row_index):
+    """
+    Select rows of a xgboost.DMatrix by row index. Only the index is passed
+    from python, rows are selected inside xgboost.
+    Parameters:
+    -----------
+    dmatrix: xgboost.DMatrix
+    row_index: numpy.ndarray
+      Integer row index.
+    """
+    # int32 index is handed to xgboost without a per-element python copy.
+    return dmatrix.slice(np.asarray(row_index,dtype=np.int32))
+
+class foldCache(object):
+    """
+    LRU cache of fold xgboost.DMatrix shared by xgbData objects. Once the
+    estimated size of cached DMatrix exceeds max_bytes, least recently used
+    folds are evicted, and rebuilt by their xgbData when requested again.
+    """
+    def __init__(self,max_bytes = None):
+        """
+        Parameters:
+        -----------
+        max_bytes: int
+          Memory cap in bytes. Default to None, no limit.
+        """
+        self.__max_bytes = max_bytes
+        self.__items = collections.OrderedDict()
+        self.__nbytes = 0
+        self.__lock = threading.Lock()
+
+    def set_max_bytes(self,max_bytes):
+        """
+        Change memory cap, None means no limit.
+        """
+        with self.__lock:
+            self.__max_bytes = max_bytes
+            self.__evict()
+
+    def max_bytes(self):
+        return self.__max_bytes
+
+    def nbytes(self):
+        """
+        Return estimated size of cached DMatrix in bytes.
+        """
+        return self.__nbytes
+
+    def __len__(self):
+        return len(self.__items)
+
+    def clear(self):
+        with self.__lock:
+            self.__items.clear()
+            self.__nbytes = 0
+
+    def get(self,owner,key,build_fn,nbytes):
+        """
+        Return cached item of owner, or call build_fn() to create and cache it.
+        Parameters:
+        -----------
+        owner: object
+          Object the item belongs to. Items of owners that have been garbage
+          collected are dropped.
+        key: hashable
+          Key of the item, unique within owner.
+        build_fn: function
+          Function without argument that creates the item.
+        nbytes: int
+          Estimated size of the item in bytes.
+        """
+        cache_key = (id(owner),key)
+        with self.__lock:
+            entry = self.__items.get(cache_key)
+            if entry is not None and entry[0]() is owner:
+                # Move to the most recently used end.
+                del self.__items[cache_key]
+                self.__items[cache_key] = entry
+                return entry[1]
+        item = build_fn()
+        with self.__lock:
+            if cache_key in self.__items:
+                self.__nbytes -= self.__items.pop(cache_key)[2]
+            self.__items[cache_key] = (weakref.ref(owner),item,nbytes)
+            self.__nbytes += nbytes
+            self.__evict()
+        return item
+
+    def __evict(self):
+        for cache_key in list(self.__items.keys()):
+            if self.__items[cache_key][0]() is None:
+                self.__nbytes -= self.__items.pop(cache_key)[2]
+        # The most recently used item is kept even if it exceeds max_bytes.
+        while (self.__max_bytes is not None and self.__nbytes > self.__max_bytes
+               and len(self.__items) > 1):
+            self.__nbytes -= self.__items.popitem(last = False)[1][2]
+
+# Fold cache used by xgbData unless another foldCache is given.
+# Ex: xgb_data.shared_fold_cache.set_max_bytes(4 * 1024**3)
+shared_fold_cache = foldCache()
+# Free cached DMatrix before xgboost's library handle is torn down at exit.
+atexit.register(shared_fold_cache.clear)
+
+class featureStore(object):
+    """
+    Features, folds and fold DMatrix shared by xgbData objects that only
+    differ in label. DMatrix are built without label, each xgbData sets its
+    own label on them when it hands them out.
+    """
+    def __init__(self,fold,X_data,createTestset = True,fold_cache = None,
+                 disk_cache = None):
+        """
+        Parameters:
+        -----------
+        fold: fold.foldIndex/pandas.DataFrame
+          Contains cross validation folds information.
+        X_data: numpy.ndarray/packedFingerprint/scipy.sparse.csr_matrix
+          Training features
+        createTestset: boolean, default to True
+          Whether to use last fold as test set.
+        fold_cache: foldCache
+          LRU cache holding fold DMatrix. Default to shared_fold_cache.
+        disk_cache: dmatrix_cache.dmatrixCache
+          On-disk cache. If set, fold and test DMatrix are saved under the
+          hash of features and row index, and loaded by later runs on the
+          same data and folds without converting features.
+          Default to None.
+        """
+        self.__folds = as_foldIndex(fold)
+        self.__all_x = X_data
+        self.__has_test = createTestset
+        if fold_cache is None:
+            fold_cache = shared_fold_cache
+        self.__fold_cache = fold_cache
+        self.__disk_cache = disk_cache
+        self.__data_key = None
+        self.__master = None
+        self.__row_nbytes = None
+        self.__train_folds = None
+        self.__train_row_index = None
+        self.__test_row_index = None
+        self.__dtest = None
+        # DMatrix -> token of the xgbData whose label it holds.
+        self.__label_owner = weakref.WeakKeyDictionary()
+        # DMatrix holding sample weight.
+        self.__weighted = weakref.WeakKeyDictionary()
+        self.__lock = threading.RLock()
+        # Token of the label in use by running models, and their number.
+        self.__gate = threading.Condition(threading.Lock())
+        self.__gate_owner = None
+        self.__gate_count = 0
+
+    def build(self):
+        """
+        Split folds and prepare master DMatrix. Only the first call does work.
+        """
+        with self.__lock:
+            if self.__row_nbytes is not None:
+                return
+            if self.__disk_cache is None:
+                self.__build_master()
+            else:
+                self.__data_key = dmatrix_cache.data_hash(self.__all_x)
+                self.__row_nbytes = self.__disk_cache.get_array(
+                    self.__data_key + '_row_nbytes',self.__build_master)
+            if self.__has_test: # Ceate both training set and test set
+                # determine number of folds
+                num_folds = self.__folds.num_fold()
+                # use last folds,i.e.last column's valudate row as final test set.
+                train_row_index = self.__folds.train_index(num_folds-1)
+                self.__test_row_index = self.__folds.validate_index(num_folds-1)
+                self.__train_folds = self.__folds.subset(train_row_index,num_folds-1)
+                self.__train_row_index = train_row_index
+            else: # only create training set. Treat whole data as training data.
+                self.__train_folds = self.__folds
+                self.__train_row_index = np.arange(self.__all_x.shape[0])
+
+    def is_built(self):
+        return self.__row_nbytes is not None
+
+    def has_test(self):
+        return self.__has_test
+
+    def __build_master(self):
+        """
+        Convert all features to master DMatrix. Return estimated bytes of
+        each row in xgboost.
+        """
+        X_csr = to_csr(self.__all_x)
+        # xgboost stores 8 bytes(index and value) per non-zero entry, plus
+        # row pointer and label.
+        self.__row_nbytes = 8 * np.diff(X_csr.indptr) + 12
+        self.__master = xgb.DMatrix(X_csr)
+        return self.__row_nbytes
+
+    def __slice_rows(self,row_index):
+        """
+        Slice rows from master DMatrix, or load them from disk_cache.
+        """
+        def build_fn():
+            with self.__lock:
+                if self.__master is None:
+                    self.__build_master()
+            return slice_DMatrix(self.__master,row_index)
+        if self.__disk_cache is None:
+            return build_fn()
+        return self.__disk_cache.get(
+            dmatrix_cache.row_hash(self.__data_key,row_index),build_fn)
+
+    def __slice_fold(self,which_fold):
+        """
+        Slice training and validating data of one fold from master DMatrix.
+        """
+        train_index, validate_index = self.fold_index(which_fold)
+        dtrain = self.__slice_rows(train_index)
+        dvalidate = self.__slice_rows(validate_index)
+        return (dtrain,dvalidate)
+
+    def fold_index(self,which_fold):
+        """
+        Return row index of training and validating data of one fold.
+        """
+        train_folds = self.__train_folds
+        train_index = self.__train_row_index[train_folds.train_index(which_fold)]
+        validate_index = self.__train_row_index[train_folds.validate_index(which_fold)]
+        return train_index, validate_index
+
+    def train_folds(self):
+        return self.__train_folds
+
+    def train_row_index(self):
+        return self.__train_row_index
+
+    def test_row_index(self):
+        return self.__test_row_index
+
+    def num_feature(self):
+        return self.__all_x.shape[1]
+
+    def get_fold(self,which_fold):
+        """
+        Return (dtrain, dvalidate) of one fold, from fold_cache if present.
+        """
+        train_index, validate_index = self.fold_index(which_fold)
+        nbytes = (int(self.__row_nbytes[train_index].sum()) +
+                  int(self.__row_nbytes[validate_index].sum()))
+        return self.__fold_cache.get(self,which_fold,
+                                     lambda: self.__slice_fold(which_fold),
+                                     nbytes)
+
+    def get_test(self):
+        """
+        Return test DMatrix.
+        """
+        with self.__lock:
+            if self.__dtest is None:
+                self.__dtest = self.__slice_rows(self.__test_row_index)
+            return self.__dtest
+
+    @contextlib.contextmanager
+    def label_gate(self,owner):
+        """
+        Context manager that holds DMatrix of this store on the label of
+        owner. Any number of users of the same owner enter at once, users of
+        other owners wait until all of them exit, so that a model training on
+        shared DMatrix never sees its label switched.
+        """
+        with self.__gate:
+            while self.__gate_count > 0 and self.__gate_owner != owner:
+                self.__gate.wait()
+            self.__gate_owner = owner
+            self.__gate_count += 1
+        try:
+            yield
+        finally:
+            with self.__gate:
+                self.__gate_count -= 1
+                if self.__gate_count == 0:
+                    self.__gate_owner = None
+                    self.__gate.notify_all()
+
+    def set_label(self,dmatrix,owner,label,row_index = None,weight = None):
+        """
+        Set label and weight of dmatrix to those of owner, unless it already
+        holds them.
+        Parameters:
+        -----------
+        dmatrix: xgboost.DMatrix
+        owner: hashable
+          Token of the label.
+        label: numpy.ndarray
+          Label of all rows.
+        row_index: numpy.ndarray
+          Rows of label that dmatrix holds. Default to None, all rows.
+        weight: numpy.ndarray
+          Sample weight of all rows. Default to None, unweighted.
+        """
+        with self.__lock:
+            if self.__label_owner.get(dmatrix) != owner:
+                if row_index is not None:
+                    label = label[row_index]
+                    if weight is not None:
+                        weight = weight[row_index]
+                dmatrix.set_label(label)
+                xgb_eval.clear_eval_context(dmatrix)
+                if weight is not None:
+                    dmatrix.set_weight(weight)
+                    self.__weighted[dmatrix] = True
+                elif self.__weighted.pop(dmatrix,False):
+                    # Clear weight set by previous owner, an empty weight
+                    # means unweighted, see native_eval.offload.
+                    dmatrix.set_weight(np.zeros(0,dtype = np.float32))
+                self.__label_owner[dmatrix] = owner
 
 class xgbData(object):
     """
     Class contains lightchem's data format.
     """
+    __tokens = it.count()
 
-    def __init__(self,fold,X_data,y_data,createTestset = True):
+    def __init__(self,fold,X_data,y_data,createTestset = True,fold_cache = None,
+                 disk_cache = None,feature_store = None,weight = None):
         """Default data format.
         Parameters:
         -----------
-        fold: pandas.DataFrame
-        Contains cross validation folds information.
-        X_data: numpy.ndarray
+        fold: fold.foldIndex/pandas.DataFrame
+        Contains cross validation folds information. Legacy DataFrame is
+        converted to foldIndex.
+        X_data: numpy.ndarray/packedFingerprint/scipy.sparse.csr_matrix
           Training features
         y_data: numpy.ndarray
           Label(Response variable)
         createTestset: boolean, default to True
           Whether to create test dataset. If True, use one fold as
           test set, remaining folds as training set.
+        fold_cache: foldCache
+          LRU cache holding fold DMatrix. Default to shared_fold_cache.
+        disk_cache: dmatrix_cache.dmatrixCache
+          On-disk cache. If set, fold and test DMatrix are saved under the
+          hash of features and row index, and loaded by later runs on the
+          same data and folds without converting features.
+          Default to None.
+        feature_store: featureStore
+          Share features and fold DMatrix of another xgbData, see
+          `with_label`. fold, X_data, createTestset and caches are then
+          taken from feature_store. Default to None.
+        weight: numpy.ndarray
+          Sample weight of each row, Ex: number of duplicates a row stands
+          for. Default to None, unweighted.
         """
-        self.__folds = fold
-        self.__train_folds = None
-        self.__num_train_fold = None
-        self.__all_x = X_data
+        if feature_store is None:
+            feature_store = featureStore(fold,X_data,createTestset,
+                                         fold_cache,disk_cache)
+        self.__store = feature_store
         self.__label = y_data
-        self.__train_x = None
+        self.__weight = None if weight is None else np.asarray(weight,dtype = np.float32)
+        self.__token = next(xgbData.__tokens)
         self.__train_label = None
-        self.__test_x = None
         self.__test_label = None
-        self.__collect_dtrain = None
-        self.__collect_dtest = None
-        self.__has_test = createTestset
 
+    def with_label(self,y_data,weight = None):
+        """
+        Return a new xgbData with label y_data and sample weight, sharing
+        features and fold DMatrix with this one. Fold DMatrix are switched to
+        the label of the xgbData that requests them.
+        """
+        return xgbData(None,None,y_data,feature_store = self.__store,
+                       weight = weight)
+
+    def label_gate(self):
+        """
+        Context manager to hold while training on DMatrix of this xgbData.
+        xgbData sharing features through `with_label` wait for each other,
+        see featureStore.label_gate.
+        """
+        return self.__store.label_gate(self.__token)
 
     def build(self):
         """
-        Create each fold's training and validating data and tranform
-        to xgboost requried data format. If createTestset == True, will create
-        testset.
-        """
-        if self.__has_test: # Ceate both training set and test set
-            # determine number of folds
-            num_folds = self.__folds.shape[1]
-            # use last folds,i.e.last column's valudate row as final test set.
-            train_row_index = np.where(self.__folds.iloc[:,num_folds-1]!=1)[0]
-            test_row_index = np.where(self.__folds.iloc[:,num_folds-1]==1)[0]
-            self.__train_folds = self.__folds.iloc[train_row_index]
-            self.__train_folds = self.__train_folds.iloc[:,0:num_folds-1]
-            self.__num_train_fold = self.__train_folds.shape[1]
-            # split all data into train and test
-            self.__train_x = self.__all_x[train_row_index]
-            self.__train_label = self.__label[train_row_index]
-            self.__test_x = self.__all_x[test_row_index]
-            self.__test_label = self.__label[test_row_index]
-            self.__collect_dtrain = []
-            self.__collect_dtest = []
-            # convert to xgboost data format
-            for i in range(self.__num_train_fold):
-                dtrain = xgb.DMatrix(scipy.sparse.csr_matrix(np.array(self.__train_x[np.array(self.__train_folds.iloc[:,i]==0)])),
-                                        label=self.__train_label[np.array(self.__train_folds.iloc[:,i]==0)])
-                dvalidate = xgb.DMatrix(scipy.sparse.csr_matrix(np.array(self.__train_x[np.array(self.__train_folds.iloc[:,i]==1)])),
-                                        label=self.__train_label[np.array(self.__train_folds.iloc[:,i]==1)])
-                self.__collect_dtrain.append((dtrain,dvalidate))
-
-            dtest = xgb.DMatrix(scipy.sparse.csr_matrix(np.array(self.__test_x)),
-                                    label=self.__test_label)
-            self.__collect_dtest.append(dtest)
-        else: # only create training set. Treat whole data as training data.
-            self.__train_folds = self.__folds
-            self.__num_train_fold = self.__train_folds.shape[1]
-            self.__train_x = self.__all_x
-            self.__train_label = self.__label
-            self.__collect_dtrain = []
-            for i in range(self.__num_train_fold):
-                dtrain = xgb.DMatrix(scipy.sparse.csr_matrix(np.array(self.__train_x[np.array(self.__train_folds.iloc[:,i]==0)])),label=self.__train_label[np.array(self.__train_folds.iloc[:,i]==0)])
-                #xgb.DMatrix.save_binary(dtrain,"./xgb_data/dtrain_" + str(TARGET_NAME) + "_" + str(feature_name_writeout) + "_" + str(label_name_writeout) + "_fold" + str(i) + "_v1.buffer")
-                dvalidate = xgb.DMatrix(scipy.sparse.csr_matrix(np.array(self.__train_x[np.array(self.__train_folds.iloc[:,i]==1)])), label=self.__train_label[np.array(self.__train_folds.iloc[:,i]==1)])
-                #xgb.DMatrix.save_binary(dvalidate,"./xgb_data/dvalidate_" + str(TARGET_NAME) + "_" + str(feature_name_writeout) + "_" + str(label_name_writeout) + "_fold" + str(i) + "_v1.buffer")
-                self.__collect_dtrain.append((dtrain,dvalidate))
+        Prepare each fold's training and validating data. If
+        createTestset == True, will create testset.
+        All features are converted to one master xgboost.DMatrix once. Fold
+        and test DMatrix are sliced from it by row index when first requested
+        by `get_dtrain`/`get_dtest`, and fold DMatrix are kept in fold_cache.
+        With disk_cache, the master DMatrix is only built if some fold is not
+        found on disk.
+        """
+        self.__store.build()
+        self.__train_label = self.__label[self.__store.train_row_index()]
+        if self.__store.has_test():
+            self.__test_label = self.__label[self.__store.test_row_index()]
 
     def numberOfTrainFold(self):
         """
         Return number of training fold
         """
-        return self.__num_train_fold
+        if not self.__store.is_built():
+            return None
+        return self.__store.train_folds().num_fold()
 
     def get_dtrain(self,which_fold):
         """
-        Return a list, containing tuples, each tuple contains training and
-        validating data in xgboost data format.
+        Return a tuple contains training and validating data of one fold in
+        xgboost data format. The fold is sliced from master DMatrix if it is
+        not in fold_cache.
+        Fold DMatrix are shared with xgbData created by `with_label`, and
+        relabeled in place to the label of this xgbData, so hold
+        `label_gate` while using them.
         """
-        if not isinstance(self.__collect_dtrain,list):
+        if self.__train_label is None:
             raise ValueError('You must call `build` before `get_dtrain`')
-        return self.__collect_dtrain[which_fold]
+        num_fold = self.numberOfTrainFold()
+        if which_fold < 0:
+            which_fold += num_fold
+        if not 0 <= which_fold < num_fold:
+            raise IndexError('which_fold out of range')
+        fold_data = self.__store.get_fold(which_fold)
+        train_index, validate_index = self.__store.fold_index(which_fold)
+        self.__store.set_label(fold_data[0],self.__token,self.__label,train_index,
+                               self.__weight)
+        self.__store.set_label(fold_data[1],self.__token,self.__label,validate_index,
+                               self.__weight)
+        return fold_data
 
     def get_dtest(self):
         """
-        Return a tuple, containing testing data in xgboost data format.
+        Return testing data in xgboost data format.
         """
-        if not isinstance(self.__collect_dtest,list):
+        if self.__train_label is None or not self.__store.has_test():
             raise ValueError('You must call `build` before `get_dtest` ',
                              'and set createTestset = True')
-        return self.__collect_dtest[0]
+        dtest = self.__store.get_test()
+        self.__store.set_label(dtest,self.__token,self.__label,
+                               self.__store.test_row_index(),self.__weight)
+        return dtest
 
     def get_testLabel(self):
         """
         Return an array containing testing label.
         """
-        if not isinstance(self.__collect_dtest,list):
+        if self.__train_label is None or not self.__store.has_test():
             raise ValueError('You must call `build` before `get_testLabel`')
         return self.__test_label
 
     def get_train_fold(self):
         """
-        Return a DataFrame containig training folds.
+        Return a DataFrame containig training folds. Built on each call, use
+        `get_train_foldIndex` instead.
         """
-        if not isinstance(self.__train_folds,pd.DataFrame):
-            raise ValueError('You must call `build` before `get_train_fold`')
-        return self.__train_folds
+        return self.get_train_foldIndex().to_DataFrame()
+
+    def get_train_foldIndex(self):
+        """
+        Return a fold.foldIndex containig training folds.
+        """
+        if not self.__store.is_built():
+            raise ValueError('You must call `build` before `get_train_foldIndex`')
+        return self.__store.train_folds()
 
     def get_holdoutLabel(self):
         """
@@ -139,8 +524,19 @@ class xgbData(object):
             raise ValueError('You must call `build` before `get_holdoutLabel`')
         return self.__train_label
 
+    def get_holdoutWeight(self):
+        """
+        Return an array containing sample weight of training rows, None if
+        unweighted.
+        """
+        if not isinstance(self.__train_label,np.ndarray):
+            raise ValueError('You must call `build` before `get_holdoutWeight`')
+        if self.__weight is None:
+            return None
+        return self.__weight[self.__store.train_row_index()]
+
     def num_feature(self):
         """
         Return number of features
         """
-        return self.__all_x.shape[1]
+        return self.__store.num_feature()
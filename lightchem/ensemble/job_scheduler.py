@@ -0,0 +1,80 @@
+"""
+Run independent model training jobs concurrently under one thread budget.
+"""
+import time
+from multiprocessing.pool import ThreadPool
+from lightchem.utility import thread_budget
+
+class jobScheduler(object):
+    """
+    Run jobs up to n_jobs at once in threads, xgboost releases the GIL while
+    training. Results are returned in submission order, so that the models
+    collected do not depend on which job finishes first. Wall time of each
+    job is recorded for `report`.
+    """
+    def __init__(self,n_jobs = 1,nthread = -1):
+        """
+        Parameters:
+        -----------
+        n_jobs: int
+          Number of jobs run at once. -1 means one job per cpu core.
+          Default to 1.
+        nthread: int
+          Total number of threads shared by running jobs. -1 means all
+          usable cpu cores, see thread_budget.usable_cores. Default to -1.
+        """
+        self.__budget = thread_budget.threadBudget(nthread)
+        if n_jobs is None:
+            n_jobs = 1
+        elif n_jobs < 0:
+            n_jobs = thread_budget.usable_cores() + 1 + n_jobs
+        self.__n_jobs = max(1,n_jobs)
+        self.__wall_time = []
+
+    def n_jobs(self):
+        return self.__n_jobs
+
+    def job_nthread(self):
+        """
+        Number of threads each running job should use.
+        """
+        return self.__budget.share(self.__n_jobs)
+
+    def run(self,jobs):
+        """
+        Run jobs and return list of their results in the same order.
+        Parameters:
+        -----------
+        jobs: list
+          List of (name, function without argument).
+        """
+        def timed(job):
+            name, job_fn = job
+            start_time = time.time()
+            result = job_fn()
+            return result, (name,time.time() - start_time)
+        if self.__n_jobs == 1 or len(jobs) <= 1:
+            outputs = [timed(job) for job in jobs]
+        else:
+            pool = ThreadPool(min(self.__n_jobs,len(jobs)))
+            try:
+                with thread_budget.blas_limit(self.job_nthread()):
+                    outputs = pool.map(timed,jobs,chunksize = 1)
+            finally:
+                pool.close()
+                pool.join()
+        self.__wall_time.extend(wall_time for _,wall_time in outputs)
+        return [result for result,_ in outputs]
+
+    def wall_time(self):
+        """
+        Return list of (job name, wall time in seconds) of jobs run so far.
+        """
+        return list(self.__wall_time)
+
+    def report(self):
+        """
+        Return wall time of each job, one line per job.
+        """
+        return '\n'.join('{:.1f}s {}'.format(seconds,name)
+                         for name,seconds in self.__wall_time)
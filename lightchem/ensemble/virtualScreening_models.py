@@ -7,6 +7,7 @@ import pandas as pd
 from lightchem.load import load
 from lightchem.fold import fold
 from lightchem.data import xgb_data
+from lightchem.data import dmatrix_cache
 from lightchem.eval import xgb_eval
 from lightchem.eval import eval_testset
 from lightchem.model import first_layer_model
@@ -14,6 +15,7 @@ from lightchem.model import second_layer_model
 from lightchem.model import hyper_parameter
 from lightchem.eval import defined_eval
 from lightchem.utility import util
+from lightchem.ensemble import job_scheduler
 
 class CalibratedBoostingForest(object):
     """
@@ -22,7 +24,9 @@ class CalibratedBoostingForest(object):
     def __init__(self,training_info,eval_name,fold_info = 4,createTestset = True,
                     finalModel = None, num_gblinear = [1,1], num_gbtree = [1,1],
                     layer2_modeltype = ['GbtreeLogistic','GblinearLogistic'],
-                    nthread = -1, seed = 2016,verbose = False):
+                    nthread = -1, seed = 2016,verbose = False,
+                    dmatrix_cache_dir = None, dmatrix_cache_max_bytes = None,
+                    weight_col_name = None, fold_n_jobs = 1, n_jobs = 1):
         """
         Parameters:
         ----------
@@ -31,6 +35,9 @@ class CalibratedBoostingForest(object):
           containing training data(required to have fingerprint column named 'fingerprint',
           and concatanate fingerprint in a string),
           second item is a list containing the one or more label name.
+          An optional third item is the feature matrix of the dataframe,
+          Ex: output of smile_to_fps.fingerprints, then the fingerprint
+          column is not needed.
           The first label name of first tuple is the default label that will be
           used for both layer models.
           If multiple label names present, VsEnsembleModel will automatically build
@@ -42,9 +49,9 @@ class CalibratedBoostingForest(object):
         eval_name: str
           Name of evaluation metric used to monitor and stop training process.
            Must in eval.defined_eval
-        fold_info: int or DataFrame
-          either a DataFrame contains fold index or a single integer indicating
-          number of fold to create
+        fold_info: int, DataFrame or fold.foldIndex
+          either a DataFrame/foldIndex contains fold index or a single integer
+          indicating number of fold to create
         createTestset: logic
           Whether internally create a test set. Help selecting the best model
         finalModel: str
@@ -60,7 +67,32 @@ class CalibratedBoostingForest(object):
         num_gbtree: list
           List contains two integer, corresponds to number of hyper-parameter
             sets to generate for layer1 and layer2 gbtree model.
-        """
+        dmatrix_cache_dir: str
+          Directory to cache layer1 fold DMatrix on disk, so that later runs
+          on the same data and folds skip building them. Default to None.
+        dmatrix_cache_max_bytes: int
+          Size cap of dmatrix_cache_dir in bytes, least recently used files
+          are evicted beyond it. Default to None, no limit.
+        weight_col_name: str
+          Name of sample weight column of training dataframes, Ex:
+          `multiplicity` column of deduplicate.deduplicate. Default to None,
+          unweighted.
+        fold_n_jobs: int
+          Number of cross validation folds of a model trained at once,
+          `nthread` is divided among them. -1 means one fold per cpu core.
+          Default to 1.
+        n_jobs: int
+          Number of layer1 models trained at once, `nthread` is divided among
+          them. Models sharing features but not label wait for each other.
+          -1 means one model per cpu core. Default to 1.
+        """
+        self.__weight_col_name = weight_col_name
+        self.__fold_n_jobs = fold_n_jobs
+        self.__n_jobs = n_jobs
+        self.__disk_cache = None
+        if dmatrix_cache_dir is not None:
+            self.__disk_cache = dmatrix_cache.dmatrixCache(dmatrix_cache_dir,
+                                                           dmatrix_cache_max_bytes)
         self.__training_info = training_info
         self.__check_labelType()
         self.__eval_name = eval_name
@@ -96,10 +128,10 @@ class CalibratedBoostingForest(object):
             self.__prepare_result()
 
     def __determine_fold(self, fold_info):
-        if isinstance(fold_info, pd.DataFrame):
+        if isinstance(fold_info, (pd.DataFrame, fold.foldIndex)):
             self.__has_fold = True
-            self.my_fold = fold_info
-            self.__num_folds = fold_info.shape[1]
+            self.my_fold = fold.as_foldIndex(fold_info)
+            self.__num_folds = self.my_fold.num_fold()
         elif isinstance(fold_info, int):
             self.__has_fold = False
             self.my_fold = None
@@ -116,8 +148,19 @@ class CalibratedBoostingForest(object):
         #Based on how many unique number, automatically detect if label column
         # is binary or continuous.
         num_xgbData = 0
+        # Features of each DataFrame are parsed once and shared by its labels.
+        parsed_features = {}
+        shared_data = {}
         for item in self.__training_info:
             temp_df = item[0]
+            features = item[2] if len(item) > 2 else None
+            data_key = (id(temp_df),id(features))
+            if not data_key in parsed_features:
+                temp_data = load.readData(temp_df,feature_format='csr',
+                                          features=features)
+                temp_data.read()
+                parsed_features[data_key] = temp_data.features()
+            X_data = parsed_features[data_key]
             for column_name in item[1]:
                 # if it is binary label, use models for binary label.
                 if len(np.unique(temp_df[column_name])) == 2:
@@ -128,17 +171,24 @@ class CalibratedBoostingForest(object):
                     temp_labelType = 'continuous'
                 if self.__final_labelType == None:
                     self.__final_labelType = temp_labelType
-                temp_data = load.readData(temp_df,column_name)
-                temp_data.read()
-                X_data = temp_data.features()
-                y_data = temp_data.label()
+                y_data = np.array(temp_df[column_name].astype(np.float64))
+                weight = None
+                if self.__weight_col_name is not None:
+                    weight = np.array(temp_df[self.__weight_col_name].astype(np.float64))
                 # Need to generate fold once, based on binary label
                 if not self.__has_fold:
                     self.my_fold = fold.fold(X_data,y_data,self.__num_folds,self.seed)
-                    self.my_fold = self.my_fold.generate_skfolds()
+                    self.my_fold = self.my_fold.generate_foldIndex()
                     self.__has_fold = True
-                data = xgb_data.xgbData(self.my_fold,X_data,y_data,
-                                        createTestset = self.__createTestset)
+                if not data_key in shared_data:
+                    data = xgb_data.xgbData(self.my_fold,X_data,y_data,
+                                            createTestset = self.__createTestset,
+                                            disk_cache = self.__disk_cache,
+                                            weight = weight)
+                    shared_data[data_key] = data
+                else:
+                    # Labels of one DataFrame share fold feature DMatrix.
+                    data = shared_data[data_key].with_label(y_data,weight)
                 data.build()
                 temp_dataName = 'Number:' + str(num_xgbData) + " xgbData, " + 'labelType: ' + temp_labelType
                 self.__setting_list.append({'data_name':temp_dataName,
@@ -154,14 +204,19 @@ class CalibratedBoostingForest(object):
         used for that model. If it is second layer model, data used is just all
         the data we have. [df1,df2], where df is concatanated fp string.
         """
-        # transform fp string into array
+        # transform fp string into array, once per DataFrame
         list_test_x_array = []
+        parsed_features = {}
         for item in testing_info:
             temp_df = item[0]
-            temp_data = load.readData(temp_df)
-            temp_data.read()
-            X_data = temp_data.features()
-            list_test_x_array.append(X_data)
+            features = item[2] if len(item) > 2 else None
+            data_key = (id(temp_df),id(features))
+            if not data_key in parsed_features:
+                temp_data = load.readData(temp_df,feature_format='csr',
+                                          features=features)
+                temp_data.read()
+                parsed_features[data_key] = temp_data.features()
+            list_test_x_array.append(parsed_features[data_key])
 
         name = self.__best_model.name
         self.__test_data = []
@@ -216,6 +271,8 @@ class CalibratedBoostingForest(object):
         evaluation_metric_name = self.__eval_name
         print 'Building first layer models'
         #---------------------------------first layer models ----------
+        scheduler = job_scheduler.jobScheduler(self.__n_jobs,self.nthread)
+        layer1_jobs = []
         for data_dict in self.__setting_list:
             for model_type in data_dict['model_type']:
                 num_sets = 1
@@ -240,12 +297,18 @@ class CalibratedBoostingForest(object):
                     # Retrieve default parameter and change default seed.
                     default_param,default_MAXIMIZE,default_STOPPING_ROUND = model.get_param()
                     params['seed'] = self.seed
-                    params['nthread'] = self.nthread
+                    params['nthread'] = scheduler.job_nthread()
                     stopping_round = 200
                     model.update_param(params,default_MAXIMIZE,stopping_round)
-                    model.xgb_cv()
-                    model.generate_holdout_pred()
-                    self.__layer1_model_list.append(model)
+                    layer1_jobs.append((unique_name,
+                                        self.__layer1_job(model,data_dict['data'])))
+        # Models are collected in the order jobs are created.
+        self.__layer1_model_list.extend(scheduler.run(layer1_jobs))
+        if self.__verbose:
+            print 'Layer1 model wall time:'
+            print scheduler.report()
+            if self.__disk_cache is not None:
+                print self.__disk_cache.report()
 
         #------------------------------------second layer models
         layer2_label_data = self.__setting_list[0]['data'] # layer1 data object containing the label for layer2 model
@@ -291,11 +354,22 @@ class CalibratedBoostingForest(object):
                         default_STOPPING_ROUND = 300
 
                     l2model.update_param(params,default_MAXIMIZE,default_STOPPING_ROUND)
-                    l2model.xgb_cv()
+                    l2model.xgb_cv(self.__fold_n_jobs)
                     self.__layer2_model_list.append(l2model)
         self.__prepare_result()
 
 
+    def __layer1_job(self,model,data):
+        """
+        Return function that trains a layer1 model and returns it.
+        """
+        def job():
+            # xgb_cv and generate_holdout_pred hold the label gate of data.
+            model.xgb_cv(self.__fold_n_jobs)
+            model.generate_holdout_pred()
+            return model
+        return job
+
     def __prepare_result(self):
         # merge cv and test result together. Calcuate the weighted average of
         # cv and test result for each model(layer1, layer2 model). Then use the best
@@ -470,10 +544,10 @@ class VsEnsembleModel(object):
         self.__all_model_result = None
 
     def __determine_fold(self, fold_info):
-        if isinstance(fold_info, pd.DataFrame):
+        if isinstance(fold_info, (pd.DataFrame, fold.foldIndex)):
             self.__has_fold = True
-            self.my_fold = fold_info
-            self.__num_folds = fold_info.shape[1]
+            self.my_fold = fold.as_foldIndex(fold_info)
+            self.__num_folds = self.my_fold.num_fold()
         elif isinstance(fold_info, int):
             self.__has_fold = False
             self.my_fold = None
@@ -501,14 +575,15 @@ class VsEnsembleModel(object):
                     model_type_to_use = ['GbtreeRegression','GblinearRegression']
                     temp_labelType = 'continuous'
 
-                temp_data = load.readData(temp_df,column_name)
+                temp_data = load.readData(temp_df,column_name,feature_format='csr',
+                                          features=item[2] if len(item) > 2 else None)
                 temp_data.read()
                 X_data = temp_data.features()
                 y_data = temp_data.label()
                 # Need to generate fold once, based on binary label
                 if not self.__has_fold:
                     self.my_fold = fold.fold(X_data,y_data,self.__num_folds,self.seed)
-                    self.my_fold = self.my_fold.generate_skfolds()
+                    self.my_fold = self.my_fold.generate_foldIndex()
                     self.__has_fold = True
                 data = xgb_data.xgbData(self.my_fold,X_data,y_data)
                 data.build()
@@ -530,7 +605,8 @@ class VsEnsembleModel(object):
         list_test_x_array = []
         for item in testing_info:
             temp_df = item[0]
-            temp_data = load.readData(temp_df)
+            temp_data = load.readData(temp_df,feature_format='csr',
+                                      features=item[2] if len(item) > 2 else None)
             temp_data.read()
             X_data = temp_data.features()
             list_test_x_array.append(X_data)
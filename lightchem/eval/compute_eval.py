@@ -5,6 +5,7 @@ Self defined evaluation metrics.
 import numpy as np
 from sklearn import metrics
 from lightchem.utility import util
+from lightchem.utility.metric_kernel import metricKernel
 
 # Custom eval metric to calculate holdout result
 def compute_roc_auc(labels_arr, scores_arr ):
@@ -12,7 +13,7 @@ def compute_roc_auc(labels_arr, scores_arr ):
     Compute Area under the curve of Receiver Operating Characteristic
     '''
     if len(np.unique(labels_arr)) == 2:
-        auc = util.ROC_auc(labels_arr, scores_arr)
+        auc = metricKernel(labels_arr, scores_arr).roc_auc()
     else:
         auc = 'ND'
     return auc
@@ -22,7 +23,7 @@ def compute_PR_avg(labels_arr, scores_arr ):
     Compute average precision.
     '''
     if len(np.unique(labels_arr)) == 2:
-        avg = util.avg_precision(labels_arr, scores_arr)
+        avg = metricKernel(labels_arr, scores_arr).avg_precision()
     else:
         avg = 'ND'
     return avg
@@ -32,14 +33,15 @@ def compute_PR_auc(labels_arr, scores_arr ):
     Compute AUC of Precision-recall
     '''
     if len(np.unique(labels_arr)) == 2:
-        auc = util.PRC_auc(labels_arr, scores_arr)
+        auc = metricKernel(labels_arr, scores_arr).pr_auc()
     else:
         auc = 'ND'
     return auc
 
 def enrichment_factor(labels_arr, scores_arr, percentile ):
     '''Compute the enrichment factor'''
-    ef = util.enrichment_factor(labels_arr, scores_arr, np.array([percentile]))[0]
+    kernel = metricKernel(labels_arr, scores_arr)
+    ef = kernel.enrichment_factor(np.array([percentile]))[0]
     return ef
 
 def compute_NEF_auc(labels_arr, scores_arr, max_percentile):
@@ -48,8 +50,8 @@ def compute_NEF_auc(labels_arr, scores_arr, max_percentile):
     percentile is max_percentile.
     '''
     if len(np.unique(labels_arr)) == 2:
-        auc = util.nef_auc(labels_arr, scores_arr,
-                           np.linspace(0.001, max_percentile, 10))
+        kernel = metricKernel(labels_arr, scores_arr)
+        auc = kernel.nef_auc(np.linspace(0.001, max_percentile, 10))
     else:
         auc = 'ND'
     return auc
@@ -61,8 +63,8 @@ def compute_AEF(labels_arr, scores_arr, max_percentile):
     '''
     if len(np.unique(labels_arr)) == 2:
         percentile_list = np.linspace(0, max_percentile, 10)
-        aef = util.enrichment_factor(labels_arr, scores_arr, percentile_list)
-        aef = np.nanmean(aef)
+        kernel = metricKernel(labels_arr, scores_arr)
+        aef = kernel.average_enrichment_factor(percentile_list)
     else:
         aef = 'ND'
     return aef
@@ -80,5 +82,5 @@ def compute_ReliabilityScore(labels_arr, scores_arr):
     Calculate the Reliability Scores for binary label.
     '''
     scores_arr = util.__normalize_minMax(scores_arr)
-    rs = util.reliability_score(labels_arr, scores_arr, n_bin=20)
+    rs = metricKernel(labels_arr, scores_arr).reliability_score(n_bin=20)
     return rs
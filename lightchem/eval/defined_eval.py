@@ -41,6 +41,10 @@ class definedEvaluation(object):
                         'Logloss': [xgb_eval.evalLogloss,False,100],
                         'ReliabilityScore': [xgb_eval.evalReliabilityScore,
                                                 False,100]}
+        # Metrics computed natively by xgboost, and objectives they apply to.
+        # Only metrics making the same early stopping decisions, native
+        # logloss is a mean rounded to 6 digits, not the custom sum.
+        self.__NATIVE = {'ROCAUC' : ['auc',None]}
 
     def __check_cut_value(self,name):
         eval_cut = re.split("_", name)
@@ -63,6 +67,31 @@ class definedEvaluation(object):
             func = functools.partial(func, cut=new_cut)
         return func
 
+    def native_metric(self,eval_name,objective = None):
+        """
+        Return name of xgboost's native eval_metric equivalent to eval_name
+        for models with objective, None if there is none.
+        """
+        evaluation_cut = self.__check_cut_value(eval_name)
+        name = evaluation_cut[0]
+        self.validate_eval_name(name)
+        if not name in self.__NATIVE:
+            return None
+        metric, objectives = self.__NATIVE[name]
+        if objectives is not None and not objective in objectives:
+            return None
+        return metric
+
+    def eval_cut(self,eval_name):
+        """
+        Return threshold of evalname_X, None if not given.
+        """
+        evaluation_cut = self.__check_cut_value(eval_name)
+        self.validate_eval_name(evaluation_cut[0])
+        if len(evaluation_cut) == 2:
+            return float(evaluation_cut[1])
+        return None
+
     def is_maximize(self,eval_name):
         evaluation_cut = self.__check_cut_value(eval_name)
         name = evaluation_cut[0]
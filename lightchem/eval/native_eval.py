@@ -0,0 +1,68 @@
+"""
+Use xgboost's native eval_metric instead of a python feval for evaluation
+metrics that have a native equivalent, so that boosting rounds do not copy
+predictions and labels into python.
+"""
+import numpy as np
+import threading
+import weakref
+from lightchem.data import xgb_data
+from lightchem.eval import defined_eval
+from lightchem.eval import xgb_eval
+
+# DMatrix -> {cut: (evalContext, copy holding its binary labels)}. A copy is
+# stale once the evalContext of its DMatrix is cleared by a label change.
+_binary_copies = weakref.WeakKeyDictionary()
+_binary_copies_lock = threading.Lock()
+
+def binary_copy(dmatrix,cut = None):
+    """
+    Return copy of dmatrix holding the binary labels custom metrics compute
+    from its labels for cut, see xgb_eval.eval_context. The copy is sliced
+    once and reused until labels of dmatrix change.
+    """
+    context = xgb_eval.eval_context(dmatrix,cut)
+    with _binary_copies_lock:
+        cached = _binary_copies.get(dmatrix,{}).get(cut)
+    if cached is not None and cached[0] is context:
+        return cached[1]
+    copy = xgb_data.slice_DMatrix(dmatrix,np.arange(dmatrix.num_row()))
+    copy.set_label(context.labels())
+    with _binary_copies_lock:
+        _binary_copies.setdefault(dmatrix,{})[cut] = (context,copy)
+    return copy
+
+def offload(eval_name,param,evals):
+    """
+    Return (eval_metric, evals) to train with xgboost's native metric
+    equivalent to eval_name, or None if the python feval is needed.
+    Native metric is only used when no DMatrix in evals has sample weight,
+    which custom metrics ignore, and their binary labels hold both classes.
+    DMatrix with continuous labels are replaced by a copy holding the binary
+    labels custom metrics compute from them, see binary_copy.
+    Parameters:
+    -----------
+    eval_name: str
+      Name of evaluation metric, see defined_eval.definedEvaluation.
+    param: dict
+      xgboost parameter of the model.
+    evals: list
+      Watchlist of (xgboost.DMatrix, name). The last one drives early
+      stopping.
+    """
+    preDefined_eval = defined_eval.definedEvaluation()
+    metric = preDefined_eval.native_metric(eval_name,param.get('objective'))
+    if metric is None or len(evals) == 0:
+        return None
+    cut = preDefined_eval.eval_cut(eval_name)
+    native_evals = []
+    for dmatrix, name in evals:
+        if dmatrix.get_weight().size > 0:
+            return None
+        binary = xgb_eval.eval_context(dmatrix,cut).labels()
+        if not set(np.unique(binary)) == set([0,1]):
+            return None
+        if not np.array_equal(binary,dmatrix.get_label()):
+            dmatrix = binary_copy(dmatrix,cut)
+        native_evals.append((dmatrix,name))
+    return metric, native_evals
@@ -6,20 +6,74 @@ training process.
 from sklearn import metrics
 from sklearn.model_selection import StratifiedKFold
 import numpy as np
+import threading
+import weakref
 from lightchem.utility import util
+from lightchem.utility.metric_kernel import metricKernel
 
-def __map_cont_to_bin(dtrain, cut):
-    labels = dtrain.get_label()
+def binary_label(labels, cut=None):
+    '''
+    Return binary labels. Continuous labels(more than 2 unique values) above
+    cut are set to 1, others to 0. cut defaults to the 99th percentile, or
+    the second smallest value if the percentile is the smallest.
+    '''
     unique = np.unique(labels)
     if len(unique) > 2: # which means it is continuous label
         if cut == None:
             cut = np.percentile(labels,99)
             if cut == unique[0]:
                 cut = unique[1]
-        labels[np.where(dtrain.get_label()>cut)] = 1
-        labels[np.where(dtrain.get_label()<=cut)] = 0
+        labels = np.where(labels > cut, 1, 0).astype(labels.dtype)
     return labels
 
+class evalContext(object):
+    '''
+    Binary labels of a DMatrix for one cut and their number of positives,
+    computed once and reused by evaluation functions every boosting round.
+    '''
+    def __init__(self, labels, cut=None):
+        labels = np.array(binary_label(labels, cut))
+        labels.flags.writeable = False
+        self.__labels = labels
+        self.__num_positive = np.nansum(labels)
+
+    def labels(self):
+        return self.__labels
+
+    def num_positive(self):
+        return self.__num_positive
+
+# DMatrix -> {cut: evalContext}. Entries go away with their DMatrix, and
+# must be cleared by clear_eval_context when its labels change.
+_eval_contexts = weakref.WeakKeyDictionary()
+_eval_contexts_lock = threading.Lock()
+
+def eval_context(dtrain, cut=None):
+    '''
+    Return evalContext of dtrain for cut, computed on first use.
+    '''
+    with _eval_contexts_lock:
+        context = _eval_contexts.get(dtrain, {}).get(cut)
+    if context is None:
+        context = evalContext(dtrain.get_label(), cut)
+        with _eval_contexts_lock:
+            _eval_contexts.setdefault(dtrain, {})[cut] = context
+    return context
+
+def clear_eval_context(dtrain):
+    '''
+    Forget evalContext of dtrain, call it after changing labels of dtrain.
+    '''
+    with _eval_contexts_lock:
+        _eval_contexts.pop(dtrain, None)
+
+def __map_cont_to_bin(dtrain, cut):
+    return eval_context(dtrain, cut).labels()
+
+def __kernel(preds, dtrain, cut):
+    context = eval_context(dtrain, cut)
+    return metricKernel(context.labels(), preds, context.num_positive())
+
 def __NA_to_zero(prediction):
     # Check infinite, NaN. Convert to 0.
     index = np.where(np.logical_or(np.isinf(prediction), np.isnan(prediction)))
@@ -31,18 +85,18 @@ def evalrocauc(preds, dtrain, cut=None):
     Return ROC AUC score
     '''
     preds = __NA_to_zero(preds)
-    labels = __map_cont_to_bin(dtrain, cut)
-    return 'ROCAUC', util.ROC_auc(labels, preds)
+    return 'ROCAUC', __kernel(preds, dtrain, cut).roc_auc()
 
 def evalpravg(preds, dtrain, cut=None):
     '''
     Return Precision Recall avg score
     '''
     preds = __NA_to_zero(preds)
-    labels = __map_cont_to_bin(dtrain, cut)
-    pravg = util.avg_precision(labels, preds)
-    if len(np.unique(preds)) <= 128:
+    kernel = __kernel(preds, dtrain, cut)
+    if kernel.num_unique() <= 128:
         pravg = 0
+    else:
+        pravg = kernel.avg_precision()
     return 'PRAVG', pravg
 
 def evalprauc(preds, dtrain, cut=None):
@@ -50,10 +104,11 @@ def evalprauc(preds, dtrain, cut=None):
     Return Precision Recall AUC score
     '''
     preds = __NA_to_zero(preds)
-    labels = __map_cont_to_bin(dtrain, cut)
-    prauc = util.PRC_auc(labels, preds)
-    if len(np.unique(preds)) <= 128:
+    kernel = __kernel(preds, dtrain, cut)
+    if kernel.num_unique() <= 128:
         prauc = 0
+    else:
+        prauc = kernel.pr_auc()
     return 'PRAUC', prauc
 
 def evalefr1(preds, dtrain, cut=None):
@@ -61,9 +116,8 @@ def evalefr1(preds, dtrain, cut=None):
     Return enrichment factor at 0.01
     '''
     preds = __NA_to_zero(preds)
-    labels = __map_cont_to_bin(dtrain, cut)
     percentile = 0.01
-    ef = util.enrichment_factor(labels, preds, np.array([percentile]))[0]
+    ef = __kernel(preds, dtrain, cut).enrichment_factor(np.array([percentile]))[0]
     return 'EFR1', ef
 
 def evalefr015(preds, dtrain, cut=None):
@@ -71,9 +125,8 @@ def evalefr015(preds, dtrain, cut=None):
     Return enrichment factor at 0.0015
     '''
     preds = __NA_to_zero(preds)
-    labels = __map_cont_to_bin(dtrain, cut)
     percentile = 0.0015
-    ef = util.enrichment_factor(labels, preds, np.array([percentile]))[0]
+    ef = __kernel(preds, dtrain, cut).enrichment_factor(np.array([percentile]))[0]
     return 'EFR015', ef
 
 
@@ -82,13 +135,14 @@ def evalNEFauc25(preds, dtrain, cut=None):
     Return Normalized Enrichment Factor AUC ranging from 0.001 to 0.25
     '''
     preds = __NA_to_zero(preds)
-    labels = __map_cont_to_bin(dtrain, cut)
-    nef = util.nef_auc(labels, preds, np.linspace(0.001, .25, 10))
+    kernel = __kernel(preds, dtrain, cut)
     # EF calculation for first several rounds are wrong when trees are small and
     # unique predictions are low.
     # Mannually set to zero. 2^7 = 128 -> Tree with depth 7
-    if len(np.unique(preds)) <= 128:
+    if kernel.num_unique() <= 128:
         nef = 0
+    else:
+        nef = kernel.nef_auc(np.linspace(0.001, .25, 10))
     return 'NEFAUC25', nef
 
 def evalNEFauc5(preds, dtrain, cut=None):
@@ -96,13 +150,14 @@ def evalNEFauc5(preds, dtrain, cut=None):
     Return Normalized Enrichment Factor AUC ranging from 0.001 to 0.05
     '''
     preds = __NA_to_zero(preds)
-    labels = __map_cont_to_bin(dtrain, cut)
-    nef = util.nef_auc(labels, preds, np.linspace(0.001, .05, 10))
+    kernel = __kernel(preds, dtrain, cut)
     # EF calculation for first several rounds are wrong when trees are small and
     # unique predictions are low.
     # Mannually set to zero. 2^7 = 128 -> Tree with depth 7
-    if len(np.unique(preds)) <= 128:
+    if kernel.num_unique() <= 128:
         nef = 0
+    else:
+        nef = kernel.nef_auc(np.linspace(0.001, .05, 10))
     return 'NEFAUC5', nef
 
 def evalAEF5(preds, dtrain, cut=None):
@@ -110,14 +165,13 @@ def evalAEF5(preds, dtrain, cut=None):
     Return average enrichment factor at multiple threshold where max threshold is 5%.
     '''
     preds = __NA_to_zero(preds)
-    labels = __map_cont_to_bin(dtrain, cut)
-    percentile_list = np.linspace(0,0.05,10)
-    aef = util.enrichment_factor(labels, preds, percentile_list)
-    aef = np.nanmean(aef)
+    kernel = __kernel(preds, dtrain, cut)
     # EF calculation for first 2 round is wrong when trees are small.
     # Mannually set to zero. 2^7 = 128 -> Tree with depth 7
-    if len(np.unique(preds)) <= 128:
+    if kernel.num_unique() <= 128:
         aef = 0
+    else:
+        aef = kernel.average_enrichment_factor(np.linspace(0,0.05,10))
     return 'AEF', aef
 
 def evalLogloss(preds, dtrain, cut=None):
@@ -135,7 +189,6 @@ def evalReliabilityScore(preds, dtrain, cut=None):
     Return realibility scores
     '''
     preds = __NA_to_zero(preds)
-    labels = __map_cont_to_bin(dtrain, cut)
     preds = util.__normalize_minMax(preds)
-    rs = util.reliability_score(labels, preds, n_bin=20)
+    rs = __kernel(preds, dtrain, cut).reliability_score(n_bin=20)
     return "ReliabilityScore", rs
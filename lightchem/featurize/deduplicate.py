@@ -0,0 +1,62 @@
+"""
+Collapse duplicate structures of a dataset by canonical smile before
+featurization and training.
+"""
+import numpy as np
+import pandas as pd
+from lightchem.featurize import fingerprint
+
+# Rules to aggregate labels of duplicates, passed to pandas groupby.
+LABEL_RULES = ['max','min','mean','median','first']
+
+def deduplicate(input_df,smile_col_name,label_names = None,rule = 'max',
+                strip_salts = True,n_jobs = 1):
+    """
+    Canonicalize smiles and collapse rows of the same compound into one.
+    Return (unique_df, row_map), where unique_df has one row per canonical
+    smile with columns smile_col_name(canonical smile), label names and
+    `multiplicity`(number of original rows), in order of first appearance.
+    row_map is an int64 array giving the unique_df row of each input row,
+    -1 for molecules failed to parse, which are dropped.
+    multiplicity can be used as sample weight, Ex: weight_col_name of
+    CalibratedBoostingForest.
+    Parameters:
+    -----------
+    input_df: pandas.DataFrame
+      DataFrame containing smile strings and labels.
+    smile_col_name: str
+      Name of smile column.
+    label_names: list
+      Names of label columns. Default to None.
+    rule: str or callable
+      How to aggregate labels of duplicates, one of LABEL_RULES or a function
+      taking a pandas.Series. Missing labels are skipped. Default to `max`,
+      a compound is active if any of its copies is active.
+    strip_salts: boolean, default to True
+      Keep only the largest fragment of each molecule, so that salts and
+      the parent compound are collapsed together.
+    n_jobs: int
+      Number of processes used to canonicalize smiles. -1 means using all
+      cpu cores. Default to 1.
+    """
+    if label_names is None:
+        label_names = []
+    if not callable(rule) and not rule in LABEL_RULES:
+        raise ValueError('rule should be a function or one of ' +
+                         ', '.join(LABEL_RULES))
+    fp = fingerprint.smile_to_fps(input_df,smile_col_name,n_jobs = n_jobs)
+    canonical = pd.Series(fp.canonical_smiles(strip_salts),index = input_df.index)
+    keep = np.array(pd.notnull(canonical))
+    # Group id in order of first appearance.
+    codes, uniques = pd.factorize(canonical[keep])
+    row_map = np.full(len(input_df),-1,dtype = np.int64)
+    row_map[keep] = codes
+    unique_df = pd.DataFrame({smile_col_name:np.asarray(uniques,dtype = object)})
+    if len(label_names) > 0:
+        labels = input_df.loc[keep,list(label_names)].groupby(codes).agg(rule)
+        for name in label_names:
+            unique_df[name] = np.asarray(labels[name])
+    unique_df['multiplicity'] = np.bincount(codes,minlength = len(uniques))
+    print 'Number of rows: ' + str(len(input_df)) + ', unique compounds: ' + \
+        str(len(unique_df)) + ', failed: ' + str((~keep).sum())
+    return unique_df, row_map
@@ -5,53 +5,384 @@ from rdkit import Chem
 from rdkit.Chem.Fingerprints import FingerprintMols
 from rdkit.Chem import AllChem
 from rdkit.Chem import MACCSkeys
+from rdkit.Chem import rdMolDescriptors
+import numpy as np
+import scipy.sparse
 import pandas as pd
+import multiprocessing
+from lightchem.utility import util
+from lightchem.data.packed_fingerprint import packedFingerprint
+from lightchem.featurize.fingerprint_cache import fingerprint_key
+
+def _morgan(mol,radius = 2,nBits = 1024):
+    return AllChem.GetMorganFingerprintAsBitVect(mol,radius = radius,
+                                                 nBits = nBits)
+
+def _maccs(mol):
+    return MACCSkeys.GenMACCSKeys(mol)
+
+def _atom_pair(mol,nBits = 2048):
+    return rdMolDescriptors.GetHashedAtomPairFingerprintAsBitVect(mol,
+                                                                  nBits = nBits)
+
+def _topological_torsion(mol,nBits = 2048):
+    return rdMolDescriptors.GetHashedTopologicalTorsionFingerprintAsBitVect(
+        mol,nBits = nBits)
+
+# Fingerprint type -> (function(mol, **params) returning bit vector,
+#                      default number of bits)
+FINGERPRINT_TYPES = {'Morgan':(_morgan,1024),
+                     'MACCSkeys':(_maccs,167),
+                     'AtomPair':(_atom_pair,2048),
+                     'TopologicalTorsion':(_topological_torsion,2048)}
+
+def num_bit(fp_type,params = None):
+    """
+    Number of bits of a fingerprint type with given parameters.
+    """
+    if not fp_type in FINGERPRINT_TYPES:
+        raise ValueError('Fingerprint type should be one of ' +
+                         ', '.join(sorted(FINGERPRINT_TYPES)))
+    if params is not None and 'nBits' in params:
+        return params['nBits']
+    return FINGERPRINT_TYPES[fp_type][1]
+
+def _mol_from_smile(smile):
+    """
+    Return RDKit molecule of smile, None if smile is missing(None or NaN) or
+    can not be parsed.
+    """
+    if not isinstance(smile,basestring):
+        return None
+    return Chem.MolFromSmiles(smile)
+
+def _fingerprint_chunk(args):
+    """
+    Compute fingerprints of a chunk of smiles. Each smile is parsed once and
+    all requested fingerprint types are computed from the molecule. Defined
+    at module level so that it can be sent to worker processes.
+    Parameters:
+    -----------
+    args: tuple
+      (smiles, fp_types), where smiles is a list of smile strings, fp_types
+      is a list of (name, fingerprint type, params).
+    Return (dict of name to (number of on bits of each molecule, on bit
+            index of all molecules), boolean array marking molecules failed)
+    """
+    smiles, fp_types = args
+    counts = {}
+    onbits = {}
+    for name, fp_type, params in fp_types:
+        counts[name] = np.zeros(len(smiles),dtype = np.int64)
+        onbits[name] = []
+    mol_fail = np.zeros(len(smiles),dtype = bool)
+    for i,smile in enumerate(smiles):
+        tmp_mol = _mol_from_smile(smile)
+        if not tmp_mol:
+            # fail to construct a RDKit molecule, fingerprint stays all 0.
+            mol_fail[i] = True
+            continue
+        for name, fp_type, params in fp_types:
+            fps = FINGERPRINT_TYPES[fp_type][0](tmp_mol,**params)
+            bits = list(fps.GetOnBits())
+            counts[name][i] = len(bits)
+            onbits[name].extend(bits)
+    result = {}
+    for name, fp_type, params in fp_types:
+        result[name] = (counts[name],np.array(onbits[name],dtype = np.int32))
+    return result, mol_fail
+
+def _largest_fragment(mol):
+    """
+    Return the fragment with most heavy atoms, which drops counter ions and
+    solvents of salts.
+    """
+    fragments = Chem.GetMolFrags(mol,asMols = True)
+    if len(fragments) <= 1:
+        return mol
+    return max(fragments,key = lambda fragment: fragment.GetNumHeavyAtoms())
+
+def _canonical_chunk(args):
+    """
+    Return canonical smile of each smile in a chunk, None if it fails to
+    construct a RDKit molecule. Defined at module level so that it can be
+    sent to worker processes.
+    Parameters:
+    -----------
+    args: tuple
+      (smiles, strip_salts), where strip_salts keeps only the largest
+      fragment of each molecule.
+    """
+    smiles, strip_salts = args
+    canonical = []
+    for smile in smiles:
+        tmp_mol = _mol_from_smile(smile)
+        if tmp_mol and strip_salts:
+            tmp_mol = _largest_fragment(tmp_mol)
+        canonical.append(Chem.MolToSmiles(tmp_mol) if tmp_mol else None)
+    return canonical
+
+def onbits_to_array(counts,indices,num_bit,output = 'dense'):
+    """
+    Write on bit index of molecules straight into a numeric fingerprint
+    matrix, without going through bit strings.
+    Parameters:
+    -----------
+    counts: numpy.ndarray
+      Number of on bits of each molecule.
+    indices: numpy.ndarray
+      On bit index of all molecules, concatenated in molecule order.
+    num_bit: int
+      Number of bits of the fingerprint.
+    output: str
+      `dense`: uint8 numpy.ndarray.
+      `packed`: packedFingerprint, bits packed 8 per byte.
+      `csr`: float32 scipy.sparse.csr_matrix.
+      `onbits`: list of on bit index arrays, one per molecule.
+    """
+    counts = np.asarray(counts,dtype = np.int64)
+    indices = np.asarray(indices,dtype = np.int64)
+    num_row = len(counts)
+    if output == 'onbits':
+        return np.split(indices,np.cumsum(counts)[:-1]) if num_row > 0 else []
+    if output == 'csr':
+        indptr = np.zeros(num_row + 1,dtype = np.int64)
+        indptr[1:] = np.cumsum(counts)
+        return scipy.sparse.csr_matrix((np.ones(len(indices),dtype = np.float32),
+                                        indices,indptr),shape = (num_row,num_bit))
+    rows = np.repeat(np.arange(num_row),counts)
+    if output == 'dense':
+        fp_array = np.zeros((num_row,num_bit),dtype = np.uint8)
+        fp_array[rows,indices] = 1
+        return fp_array
+    if output == 'packed':
+        packed = np.zeros((num_row,(num_bit + 7) // 8),dtype = np.uint8)
+        # Same bit order as np.packbits, first bit is the highest bit.
+        np.bitwise_or.at(packed,(rows,indices >> 3),
+                         (128 >> (indices & 7)).astype(np.uint8))
+        return packedFingerprint(packed,num_bit)
+    raise ValueError("output should be `dense`, `packed`, `csr` or `onbits`")
+
+def _num_jobs(n_jobs):
+    """
+    Number of processes to use, -1 means all cpu cores.
+    """
+    if n_jobs is None:
+        return 1
+    if n_jobs < 0:
+        return max(1, multiprocessing.cpu_count() + 1 + n_jobs)
+    return max(1, n_jobs)
 
 class smile_to_fps(object):
 
-    def __init__(self,input_df,smile_col_name):
+    def __init__(self,input_df,smile_col_name,n_jobs = 1,fp_cache = None,
+                 canonical_key = False):
+        """
+        Parameters:
+        -----------
+        input_df: pandas.DataFrame
+          DataFrame containing smile strings.
+        smile_col_name: str
+          Name of smile column.
+        n_jobs: int
+          Number of processes used to compute fingerprints. -1 means using
+          all cpu cores. Default to 1.
+        fp_cache: fingerprint_cache.fingerprintCache
+          Cache of fingerprints keyed by smile. Only fingerprints of smiles
+          not in the cache are computed, smiles found are not parsed.
+          Default to None.
+        canonical_key: boolean
+          Also key fp_cache by canonical smile, so that other spellings of a
+          cached molecule are found. Smiles not in the cache are then parsed
+          once more to get their canonical smile. Default to False.
+        """
         assert smile_col_name in input_df.columns
-        self.__df = input_df.copy()
+        # Only copied by methods returning a DataFrame.
+        self.__df = input_df
         self.__smile_col = smile_col_name
+        self.__n_jobs = _num_jobs(n_jobs)
+        self.__fp_cache = fp_cache
+        self.__canonical_key = canonical_key
+
+    def fingerprints(self,fp_types,output = 'dense'):
+        """
+        Compute several fingerprint types in one pass, each smile is parsed
+        once. Fingerprints are written straight into numeric arrays.
+        Return (dict of name to fingerprint matrix of shape
+        (number of smiles, num_bit), boolean array marking molecules failed).
+        Fingerprint of failed molecule is all 0.
+        Parameters:
+        -----------
+        fp_types: dict
+          Map output name to (fingerprint type, parameter dict), fingerprint
+          type in FINGERPRINT_TYPES.
+          Ex: {'ecfp1024':('Morgan',{'radius':2,'nBits':1024}),
+               'maccs':('MACCSkeys',{})}
+        output: str
+          Format of fingerprint matrix, see onbits_to_array. `dense`: uint8
+          numpy.ndarray, `packed`: packedFingerprint, `csr`:
+          scipy.sparse.csr_matrix, `onbits`: list of on bit index arrays.
+          Default to `dense`.
+        """
+        if not output in ['dense','packed','csr','onbits']:
+            raise ValueError("output should be `dense`, `packed`, `csr` or `onbits`")
+        fp_types = [(name,fp_type,dict(params or {}))
+                    for name,(fp_type,params) in sorted(fp_types.items())]
+        for name,fp_type,params in fp_types:
+            num_bit(fp_type,params)
+        smiles = list(self.__df[self.__smile_col])
+        if self.__fp_cache is None:
+            onbits, mol_fail = self.__compute_onbits(smiles,fp_types)
+        else:
+            onbits, mol_fail = self.__cached_onbits(smiles,fp_types)
+            print self.__fp_cache.report()
+        arrays = {}
+        for name,fp_type,params in fp_types:
+            counts, indices = onbits[name]
+            arrays[name] = onbits_to_array(counts,indices,num_bit(fp_type,params),
+                                           output)
+        print 'Number of molecue failed: ' + str(mol_fail.sum())
+        return arrays, mol_fail
+
+    def canonical_smiles(self,strip_salts = False):
+        """
+        Return list of canonical smile of each smile, None for molecules
+        failed.
+        Parameters:
+        -----------
+        strip_salts: boolean, default to False
+          Keep only the largest fragment of each molecule, so that salts of
+          a compound have the same canonical smile as the compound.
+        """
+        return self.__canonical(list(self.__df[self.__smile_col]),strip_salts)
+
+    def __canonical(self,smiles,strip_salts):
+        return [smile for result in
+                self.__map_chunks(_canonical_chunk,smiles,strip_salts)
+                for smile in result]
+
+    def __compute_onbits(self,smiles,fp_types):
+        """
+        Compute fingerprints of smiles. Return (dict of name to (counts,
+        indices), boolean array marking molecules failed).
+        """
+        results = self.__map_chunks(_fingerprint_chunk,smiles,fp_types)
+        onbits = {}
+        for name,fp_type,params in fp_types:
+            counts = np.concatenate([result[0][name][0] for result in results])
+            indices = np.concatenate([result[0][name][1] for result in results])
+            onbits[name] = (counts,indices)
+        mol_fail = np.concatenate([result[1] for result in results])
+        return onbits, mol_fail
+
+    def __cache_lookup(self,keys,fp_types):
+        """
+        Return dict of name to {key: on bits} found in fp_cache, and sorted
+        list of keys missing from any fingerprint type.
+        """
+        tables = {}
+        missing = set()
+        for name,fp_type,params in fp_types:
+            tables[name] = self.__fp_cache.get_many(keys,fingerprint_key(fp_type,params))
+            missing.update(key for key in keys if not key in tables[name])
+        return tables, sorted(missing)
+
+    def __cache_put(self,tables,items,fp_types):
+        """
+        Add items, dict of name to {key: on bits}, to fp_cache and tables.
+        """
+        for name,fp_type,params in fp_types:
+            new_items = dict((key,bits) for key,bits in items[name].items()
+                             if not key in tables[name])
+            self.__fp_cache.put_many(fingerprint_key(fp_type,params),new_items)
+            tables[name].update(new_items)
+
+    def __cached_onbits(self,smiles,fp_types):
+        """
+        Same as __compute_onbits, but fetch fingerprints of smiles from
+        fp_cache in bulk, then optionally of canonical smiles of the misses,
+        and only parse and compute the rest.
+        """
+        unique = sorted(set(smile for smile in smiles if isinstance(smile,basestring)))
+        tables, missing = self.__cache_lookup(unique,fp_types)
+        failed = set()
+        # smile -> canonical smile of misses, to also cache them by the latter.
+        canonical = {}
+        if self.__canonical_key and len(missing) > 0:
+            for smile,canonical_smile in zip(missing,self.__canonical(missing,False)):
+                if canonical_smile is None:
+                    failed.add(smile)
+                else:
+                    canonical[smile] = canonical_smile
+            canonical_tables, _ = self.__cache_lookup(
+                sorted(set(canonical.values())),fp_types)
+            found = dict((name,dict((smile,canonical_tables[name][canonical_smile])
+                                    for smile,canonical_smile in canonical.items()
+                                    if canonical_smile in canonical_tables[name]))
+                         for name,fp_type,params in fp_types)
+            self.__cache_put(tables,found,fp_types)
+            missing = [smile for smile in missing if not smile in failed and
+                       any(not smile in tables[name] for name,fp_type,params in fp_types)]
+        if len(missing) > 0:
+            onbits, missing_fail = self.__compute_onbits(missing,fp_types)
+            failed.update(smile for i,smile in enumerate(missing) if missing_fail[i])
+            computed = {}
+            for name,fp_type,params in fp_types:
+                bits = onbits_to_array(onbits[name][0],onbits[name][1],
+                                       num_bit(fp_type,params),'onbits')
+                computed[name] = {}
+                for i,smile in enumerate(missing):
+                    if not missing_fail[i]:
+                        computed[name][smile] = bits[i]
+                        if smile in canonical:
+                            computed[name][canonical[smile]] = bits[i]
+            self.__cache_put(tables,computed,fp_types)
+        empty = np.zeros(0,dtype = np.int32)
+        onbits = {}
+        for name,fp_type,params in fp_types:
+            rows = [tables[name].get(smile,empty) if isinstance(smile,basestring)
+                    else empty for smile in smiles]
+            counts = np.array([len(row) for row in rows],dtype = np.int64)
+            indices = np.concatenate(rows) if len(rows) > 0 else empty
+            onbits[name] = (counts,indices)
+        mol_fail = np.array([not isinstance(smile,basestring) or smile in failed
+                             for smile in smiles],dtype = bool)
+        return onbits, mol_fail
+
+    def __map_chunks(self,chunk_fn,smiles,option):
+        """
+        Run chunk_fn on (chunk of smiles, option) of all smiles, sharded
+        across n_jobs processes. Return list of chunk results in input order.
+        """
+        if self.__n_jobs == 1 or len(smiles) < 2:
+            return [chunk_fn((smiles,option))]
+        # Several chunks per process balance uneven molecule sizes.
+        num_chunk = min(len(smiles), self.__n_jobs * 4)
+        chunk_size = -(-len(smiles) // num_chunk)
+        chunks = [(smiles[start:start + chunk_size],option)
+                  for start in range(0,len(smiles),chunk_size)]
+        pool = multiprocessing.Pool(self.__n_jobs)
+        try:
+            results = pool.map(chunk_fn,chunks)
+            pool.close()
+        except:
+            pool.terminate()
+            raise
+        finally:
+            pool.join()
+        return results
+
+    def __fingerprint_df(self,fp_type,params):
+        arrays, mol_fail = self.fingerprints({'fingerprint':(fp_type,params)})
+        df = self.__df.copy()
+        df['fingerprint'] = util.array_to_fpString_fast(arrays['fingerprint'])
+        return df
 
     def Morgan(self,radius = 2, nBits = 1024):
-        mol_fail = 0
-        fingerprint = []
-        for i,smile in enumerate(self.__df[self.__smile_col]):
-            if Chem.MolFromSmiles(smile):
-                tmp_mol = Chem.MolFromSmiles(smile)
-                fps = AllChem.GetMorganFingerprintAsBitVect(tmp_mol,
-                                                radius = radius,nBits = nBits ) # GetHashedTopologicalTorsionFingerprintAsBitVec
-                fingerprint.append(fps.ToBitString())
-            else:
-                # fail to construct a RDKit molecule, mannual create fingerprint with all 0.
-                fps = '0'
-                for k in range(nBits-1):
-                    fps = fps + '0'
-                fingerprint.append(fps)
-                mol_fail += 1
-        self.__df['fingerprint'] = fingerprint
-        print 'Number of molecue failed: ' + str(mol_fail)
-        return self.__df
+        return self.__fingerprint_df('Morgan',{'radius':radius,'nBits':nBits})
 
     def MACCSkeys(self):
-        mol_fail = 0
-        fingerprint = []
-        for i,smile in enumerate(self.__df[self.__smile_col]):
-            if Chem.MolFromSmiles(smile):
-                tmp_mol = Chem.MolFromSmiles(smile)
-                fps = MACCSkeys.GenMACCSKeys(tmp_mol)
-                fingerprint.append(fps.ToBitString())
-            else:
-                # fail to construct a RDKit molecule, mannual create fingerprint with all 0.
-                fps = '0'
-                for k in range(166):
-                    fps = fps + '0'
-                fingerprint.append(fps)
-                mol_fail += 1
-        self.__df['fingerprint'] = fingerprint
-        print 'Number of molecue failed: ' + str(mol_fail)
-        return self.__df
+        return self.__fingerprint_df('MACCSkeys',{})
 
 """ RDKit featurization method has problem. Create unequal length fingerprint.
 
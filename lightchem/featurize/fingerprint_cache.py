@@ -0,0 +1,156 @@
+"""
+Persistent fingerprint cache keyed by smile, fingerprint type and
+parameters, stored in one sqlite file.
+"""
+
+import os
+import sqlite3
+import threading
+import numpy as np
+
+# sqlite allows at most 999 bound variables in one statement.
+_BATCH_SIZE = 900
+
+def fingerprint_key(fp_type,params = None):
+    """
+    Return string identifying a fingerprint type with given parameters.
+    Ex: fingerprint_key('Morgan',{'radius':2,'nBits':1024}) ->
+        'Morgan(nBits=1024,radius=2)'
+    """
+    params = params or {}
+    return fp_type + '(' + ','.join(str(name) + '=' + repr(params[name])
+                                    for name in sorted(params)) + ')'
+
+class fingerprintCache(object):
+    """
+    On-disk table of fingerprint on bit index. Entries are evicted in least
+    recently used order once the table holds more than max_entries. Hits and
+    misses are counted for `stats`.
+    """
+    def __init__(self,cache_path,max_entries = None):
+        """
+        Parameters:
+        -----------
+        cache_path: str
+          Path to sqlite file. Created if not exists.
+        max_entries: int
+          Maximum number of (smile, fingerprint) entries kept. Default to
+          None, no limit.
+        """
+        cache_dir = os.path.dirname(os.path.abspath(cache_path))
+        if not os.path.exists(cache_dir):
+            os.makedirs(cache_dir)
+        self.__cache_path = cache_path
+        self.__max_entries = max_entries
+        self.__hits = 0
+        self.__misses = 0
+        self.__lock = threading.Lock()
+        self.__conn = sqlite3.connect(cache_path,check_same_thread = False)
+        with self.__conn:
+            self.__conn.execute('CREATE TABLE IF NOT EXISTS fingerprint ('
+                                'smile TEXT NOT NULL, fp_key TEXT NOT NULL, '
+                                'onbits BLOB NOT NULL, last_used INTEGER NOT NULL, '
+                                'PRIMARY KEY (smile, fp_key))')
+            self.__conn.execute('CREATE INDEX IF NOT EXISTS fingerprint_last_used '
+                                'ON fingerprint (last_used)')
+        # Logical clock, increased by every batch of lookups or inserts.
+        self.__clock = self.__conn.execute(
+            'SELECT COALESCE(MAX(last_used), 0) FROM fingerprint').fetchone()[0]
+
+    def get_many(self,smiles,fp_key):
+        """
+        Fetch fingerprints of smiles in bulk. Return dict of smile to int32
+        array of on bit index, only for smiles found in the cache.
+        Parameters:
+        -----------
+        smiles: list
+          Canonical smile strings.
+        fp_key: str
+          Output of fingerprint_key.
+        """
+        smiles = list(set(smiles))
+        found = {}
+        with self.__lock:
+            self.__clock += 1
+            with self.__conn:
+                for start in range(0,len(smiles),_BATCH_SIZE):
+                    batch = smiles[start:start + _BATCH_SIZE]
+                    marks = ','.join('?' * len(batch))
+                    rows = self.__conn.execute(
+                        'SELECT smile, onbits FROM fingerprint WHERE fp_key = ? '
+                        'AND smile IN (' + marks + ')',[fp_key] + batch)
+                    for smile,onbits in rows:
+                        found[smile] = np.frombuffer(onbits,dtype = np.int32)
+                    # Mark hits as recently used.
+                    self.__conn.execute(
+                        'UPDATE fingerprint SET last_used = ? WHERE fp_key = ? '
+                        'AND smile IN (' + marks + ')',[self.__clock,fp_key] + batch)
+            self.__hits += len(found)
+            self.__misses += len(smiles) - len(found)
+        return found
+
+    def put_many(self,fp_key,items):
+        """
+        Store fingerprints, then evict least recently used entries.
+        Parameters:
+        -----------
+        fp_key: str
+          Output of fingerprint_key.
+        items: dict
+          Canonical smile to array of on bit index.
+        """
+        with self.__lock:
+            self.__clock += 1
+            rows = [(smile,fp_key,
+                     sqlite3.Binary(np.asarray(onbits,dtype = np.int32).tobytes()),
+                     self.__clock) for smile,onbits in items.items()]
+            with self.__conn:
+                self.__conn.executemany('INSERT OR REPLACE INTO fingerprint '
+                                        '(smile, fp_key, onbits, last_used) '
+                                        'VALUES (?, ?, ?, ?)',rows)
+                self.__evict()
+
+    def stats(self):
+        """
+        Return dict with number of hits, misses, hit rate and number of
+        cached entries.
+        """
+        with self.__lock:
+            num_entry = self.__num_entry()
+            lookups = self.__hits + self.__misses
+            return {'hits':self.__hits,
+                    'misses':self.__misses,
+                    'hit_rate':float(self.__hits) / lookups if lookups > 0 else 0.0,
+                    'num_entry':num_entry}
+
+    def report(self):
+        """
+        Return one line summary of `stats`.
+        """
+        stats = self.stats()
+        return ('Fingerprint cache: {} hits, {} misses, hit rate {:.1%}, '
+                '{} entries').format(stats['hits'],stats['misses'],
+                                     stats['hit_rate'],stats['num_entry'])
+
+    def clear(self):
+        """
+        Remove all cached entries.
+        """
+        with self.__lock:
+            with self.__conn:
+                self.__conn.execute('DELETE FROM fingerprint')
+
+    def close(self):
+        self.__conn.close()
+
+    def __num_entry(self):
+        return self.__conn.execute('SELECT COUNT(*) FROM fingerprint').fetchone()[0]
+
+    def __evict(self):
+        if self.__max_entries is None:
+            return
+        extra = self.__num_entry() - self.__max_entries
+        if extra > 0:
+            self.__conn.execute('DELETE FROM fingerprint WHERE rowid IN '
+                                '(SELECT rowid FROM fingerprint '
+                                'ORDER BY last_used LIMIT ?)',(extra,))
@@ -0,0 +1,213 @@
+"""
+Featurize molecule files chunk by chunk, so that memory use only depends on
+chunk size, not on the number of molecules in the file.
+"""
+import os
+import gzip
+import itertools
+import numpy as np
+import pandas as pd
+from rdkit import Chem
+from lightchem.featurize import fingerprint
+from lightchem.load import binary_store
+
+def _open(file_path):
+    if file_path.endswith('.gz'):
+        return gzip.open(file_path,'rb')
+    return open(file_path,'rb')
+
+def _file_format(file_path):
+    name = file_path[:-len('.gz')] if file_path.endswith('.gz') else file_path
+    for file_format in ['.smi','.csv','.sdf']:
+        if name.endswith(file_format):
+            return file_format[1:]
+    if name.endswith('.zip'):
+        return 'csv'
+    raise ValueError('file_path should be a .smi, .csv or .sdf file, '
+                     'optionally gzip compressed')
+
+def read_molecule_chunks(file_path,chunksize = 50000,smile_col_name = 'smiles',
+                         id_col_name = None,label_names = None):
+    """
+    Generator that reads a .smi, .csv or .sdf file chunksize molecules at a
+    time. Yield pandas.DataFrame with columns `id`, `smiles` and label names.
+    `id` defaults to row number in the file. `smiles` is None for records
+    that can not be read, missing smiles of .csv file are NaN.
+    Parameters:
+    -----------
+    file_path: str
+      Path to molecule file, format is detected from extension.
+      .smi: one `smile [id]` per line, white space separated. If the header
+      or first chunk has ids, missing ones are set to the row number.
+      .csv: smile column smile_col_name and optional id and label columns.
+      .sdf: id is the molecule name unless id_col_name names a property.
+    chunksize: int
+      Number of molecules per chunk.
+    smile_col_name: str
+      Name of smile column in .csv file.
+    id_col_name: str
+      Name of id column(.csv) or property(.sdf). Default to None.
+    label_names: list
+      Names of label columns(.csv) or properties(.sdf). Default to None.
+    """
+    if label_names is None:
+        label_names = []
+    file_format = _file_format(file_path)
+    if file_format == 'csv':
+        chunks = _read_csv(file_path,chunksize,smile_col_name,id_col_name,label_names)
+    elif file_format == 'smi':
+        chunks = _read_smi(file_path,chunksize)
+    else:
+        chunks = _read_sdf(file_path,chunksize,id_col_name,label_names)
+    start = 0
+    for chunk in chunks:
+        if not 'id' in chunk.columns:
+            chunk.insert(0,'id',np.arange(start,start + len(chunk)))
+        start += len(chunk)
+        yield chunk[['id','smiles'] + list(label_names)]
+
+def _read_csv(file_path,chunksize,smile_col_name,id_col_name,label_names):
+    usecols = [smile_col_name] + list(label_names)
+    if id_col_name is not None:
+        usecols.append(id_col_name)
+    reader = pd.read_csv(file_path,usecols = usecols,chunksize = chunksize,
+                         dtype = {smile_col_name:object})
+    for chunk in reader:
+        chunk = chunk.rename(columns = {smile_col_name:'smiles'})
+        if id_col_name is not None:
+            chunk = chunk.rename(columns = {id_col_name:'id'})
+        yield chunk.reset_index(drop = True)
+
+def _read_smi(file_path,chunksize):
+    # Whether lines hold ids is decided once, from the header or else the
+    # first chunk, so that every chunk has the same columns. Missing ids
+    # are filled with the row number.
+    with _open(file_path) as f:
+        lines = (line.split() for line in f)
+        lines = (line for line in lines if len(line) > 0 and not line[0].startswith('#'))
+        has_id = None
+        start = 0
+        while True:
+            rows = list(itertools.islice(lines,chunksize))
+            if has_id is None and len(rows) > 0 and rows[0][0].lower() == 'smiles':
+                # Header line.
+                has_id = len(rows[0]) > 1
+                rows = rows[1:] + list(itertools.islice(lines,1))
+            if len(rows) == 0:
+                break
+            if has_id is None:
+                has_id = any(len(row) > 1 for row in rows)
+            chunk = pd.DataFrame({'smiles':[row[0] for row in rows]})
+            if has_id:
+                chunk.insert(0,'id',[row[1] if len(row) > 1 else str(start + i)
+                                     for i,row in enumerate(rows)])
+            start += len(rows)
+            yield chunk
+
+def _read_sdf(file_path,chunksize,id_col_name,label_names):
+    with _open(file_path) as f:
+        supplier = Chem.ForwardSDMolSupplier(f)
+        while True:
+            mols = list(itertools.islice(supplier,chunksize))
+            if len(mols) == 0:
+                break
+            chunk = {'smiles':[Chem.MolToSmiles(mol) if mol else None
+                               for mol in mols]}
+            if id_col_name is not None:
+                chunk['id'] = [_mol_prop(mol,id_col_name) for mol in mols]
+            else:
+                chunk['id'] = [_mol_prop(mol,'_Name') for mol in mols]
+            for name in label_names:
+                chunk[name] = [_mol_prop(mol,name) for mol in mols]
+                chunk[name] = pd.to_numeric(chunk[name],errors = 'coerce')
+            yield pd.DataFrame(chunk)
+
+def _mol_prop(mol,name):
+    if mol and mol.HasProp(name):
+        return mol.GetProp(name)
+    return None
+
+def stream_fingerprints(file_path,fp_types,chunksize = 50000,output = 'dense',
+                        smile_col_name = 'smiles',id_col_name = None,
+                        label_names = None,n_jobs = 1,fp_cache = None):
+    """
+    Generator that featurizes a molecule file chunk by chunk. Yield
+    (ids, dict of name to fingerprint block, boolean array marking molecules
+    failed, labels) of each chunk, labels is a float64 array with one column
+    per label name.
+    Parameters:
+    -----------
+    file_path: str
+      Path to .smi, .csv or .sdf file, see read_molecule_chunks.
+    fp_types: dict
+      Map output name to (fingerprint type, parameter dict), see
+      smile_to_fps.fingerprints.
+    chunksize: int
+      Number of molecules per chunk.
+    output: str
+      Format of fingerprint block, see smile_to_fps.fingerprints.
+    n_jobs: int
+      Number of processes used to compute fingerprints of one chunk.
+    fp_cache: fingerprint_cache.fingerprintCache
+      Cache of fingerprints keyed by smile. Default to None.
+    """
+    if label_names is None:
+        label_names = []
+    for chunk in read_molecule_chunks(file_path,chunksize,smile_col_name,
+                                      id_col_name,label_names):
+        fp = fingerprint.smile_to_fps(chunk,'smiles',n_jobs = n_jobs,
+                                      fp_cache = fp_cache)
+        arrays, mol_fail = fp.fingerprints(fp_types,output)
+        labels = np.array(chunk[list(label_names)]).astype(np.float64)
+        labels = labels.reshape(len(chunk),len(label_names))
+        yield np.array(chunk['id']), arrays, mol_fail, labels
+
+def fingerprints_to_store(file_path,fp_types,store_dir,chunksize = 50000,
+                          skip_failed = True,smile_col_name = 'smiles',
+                          id_col_name = None,label_names = None,n_jobs = 1,
+                          fp_cache = None,verbose = False):
+    """
+    Featurize a molecule file chunk by chunk straight into binary stores,
+    one store per fingerprint name under store_dir. Row index of the store
+    is the row number of the molecule in the file. Return dict of name to
+    store directory.
+    Parameters:
+    -----------
+    store_dir: str
+      Directory to write stores. Ex: store of fingerprint name `ecfp1024` is
+      written to store_dir/ecfp1024.
+    skip_failed: boolean, default to True
+      Leave out molecules failed to featurize.
+    verbose: boolean, default to False
+      Print number of featurized and failed molecules.
+    Other parameters are the same as stream_fingerprints.
+    """
+    if label_names is None:
+        label_names = []
+    store_dirs = dict((name,os.path.join(store_dir,name)) for name in fp_types)
+    writers = dict((name,binary_store.binaryStoreWriter(store_dirs[name],label_names))
+                   for name in fp_types)
+    start = 0
+    num_fail = 0
+    completed = False
+    try:
+        for ids, arrays, mol_fail, labels in stream_fingerprints(
+                file_path,fp_types,chunksize,'packed',smile_col_name,id_col_name,
+                label_names,n_jobs,fp_cache):
+            keep = ~mol_fail if skip_failed else np.ones(len(ids),dtype = bool)
+            index = np.arange(start,start + len(ids))[keep]
+            for name in fp_types:
+                writers[name].append(arrays[name][keep],labels[keep],index)
+            start += len(ids)
+            num_fail += mol_fail.sum()
+        completed = True
+    finally:
+        # Stores of a failed run are left without header, see abort.
+        for name in fp_types:
+            if completed:
+                writers[name].close()
+            else:
+                writers[name].abort()
+    if verbose:
+        print 'Featurized ' + str(start) + ' molecules, failed: ' + str(num_fail)
+    return store_dirs
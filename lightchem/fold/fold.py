@@ -6,6 +6,131 @@ import pandas as pd
 from sklearn.model_selection import StratifiedKFold
 import numpy as np
 
+class foldIndex(object):
+    """
+    Compact cross validation fold. One int8(int16 for more than 127 folds)
+    fold id per row, which is the fold where the row is in the validation set,
+    or -1 if the row is used for training in every fold. Validation row index
+    of each fold is computed once, training row index of the fold requested
+    last is kept. Returned index arrays are read-only, copy them before
+    indexing with `.iloc` of older pandas, which rejects read-only index.
+    """
+    def __init__(self,fold_id,num_fold,index = None):
+        """
+        Parameters:
+        -----------
+        fold_id: numpy.ndarray
+          Fold id of each row, from 0 to num_fold - 1, or -1.
+        num_fold: int
+          Number of folds.
+        index: numpy.ndarray
+          Row labels used by `to_DataFrame`. Default to 0 ... num_row - 1.
+        """
+        dtype = np.int8 if num_fold < 127 else np.int16
+        fold_id = np.asarray(fold_id)
+        if fold_id.ndim != 1:
+            raise ValueError('fold_id must be 1-D')
+        if len(fold_id) > 0 and (fold_id.min() < -1 or fold_id.max() >= num_fold):
+            raise ValueError('fold_id must be in [-1, num_fold)')
+        self.__fold_id = fold_id.astype(dtype)
+        self.__num_fold = int(num_fold)
+        if index is None:
+            index = np.arange(len(fold_id))
+        self.__index = np.asarray(index)
+        # One stable sort groups rows by fold, keeping row order within fold.
+        order = np.argsort(self.__fold_id, kind = 'mergesort')
+        counts = np.bincount(self.__fold_id.astype(np.int64) + 1,
+                             minlength = self.__num_fold + 1)
+        bounds = np.cumsum(counts)
+        self.__validate_index = [order[bounds[i]:bounds[i + 1]]
+                                 for i in range(self.__num_fold)]
+        for validate_index in self.__validate_index:
+            validate_index.flags.writeable = False
+        # (fold, training row index) of the fold requested last.
+        self.__last_train_index = (None,None)
+
+    @classmethod
+    def from_DataFrame(cls,folds):
+        """
+        Convert legacy fold DataFrame, where each column is one fold and
+        value = 1 stands for validation row, into foldIndex.
+        """
+        values = np.asarray(folds) == 1
+        if np.any(values.sum(axis = 1) > 1):
+            raise ValueError('Each row can be in the validation set of at most '
+                             'one fold')
+        fold_id = np.where(values.any(axis = 1), values.argmax(axis = 1), -1)
+        return cls(fold_id, folds.shape[1], np.asarray(folds.index))
+
+    def num_fold(self):
+        return self.__num_fold
+
+    def num_row(self):
+        return len(self.__fold_id)
+
+    def fold_id(self):
+        """
+        Return fold id vector.
+        """
+        return self.__fold_id
+
+    def index(self):
+        """
+        Return row labels.
+        """
+        return self.__index
+
+    def validate_index(self,which_fold):
+        """
+        Return row index of the validation set of one fold.
+        """
+        return self.__validate_index[which_fold]
+
+    def train_index(self,which_fold):
+        """
+        Return row index of the training set of one fold. Only the last fold
+        requested is cached, caching every fold would take num_fold - 1
+        int64 per row.
+        """
+        if which_fold < 0:
+            which_fold += self.__num_fold
+        last_fold, train_index = self.__last_train_index
+        if last_fold != which_fold:
+            train_index = np.where(self.__fold_id != which_fold)[0]
+            train_index.flags.writeable = False
+            self.__last_train_index = (which_fold,train_index)
+        return train_index
+
+    def subset(self,row_index,num_fold = None):
+        """
+        Return foldIndex of selected rows, keeping the first num_fold folds.
+        Rows must not be in the validation set of a dropped fold.
+        """
+        if num_fold is None:
+            num_fold = self.__num_fold
+        return foldIndex(self.__fold_id[row_index], num_fold,
+                         self.__index[row_index])
+
+    def to_DataFrame(self):
+        """
+        Return legacy fold DataFrame. Each column is one fold, where
+        value = 1 stands for validation row, 0 stands for training row.
+        """
+        folds = pd.DataFrame(np.zeros((self.num_row(),self.__num_fold)),
+                             index = self.__index,
+                             columns=["fold" + str(i) for i in xrange(1,self.__num_fold+1)])
+        for i in range(self.__num_fold):
+            folds.iloc[self.__validate_index[i],i] = 1
+        return folds
+
+def as_foldIndex(folds):
+    """
+    Return folds as foldIndex. folds can be foldIndex or legacy DataFrame.
+    """
+    if isinstance(folds,foldIndex):
+        return folds
+    return foldIndex.from_DataFrame(folds)
+
 
 class fold(object):
     """
@@ -15,7 +140,7 @@ class fold(object):
         """Fold object
         Parameters:
         -----------
-        X_data: numpy.ndarray
+        X_data: numpy.ndarray/packedFingerprint
           Training features
         y_data: numpy.ndarray
           Label(Response variable)
@@ -33,18 +158,17 @@ class fold(object):
         fold, where value = 1 stands for test row,
         0 stands for training row.
         '''
-        X = range(self.__num_row)
+        return self.generate_foldIndex().to_DataFrame()
+
+    def generate_foldIndex(self):
+        '''
+        Return k-fold index as foldIndex.
+        '''
+        X = np.zeros(self.__num_row)
         y = pd.Series(self.__label)
         skf = StratifiedKFold(n_splits=self.__num_fold,
                                 shuffle = True, random_state = self.__seed)
-        train_index_list = list()
-        test_index_list = list()
-        for train_index, test_index in skf.split(X, y):
-            train_index_list.append(train_index)
-            test_index_list.append(test_index)
-        folds = pd.DataFrame(np.zeros((self.__num_row,self.__num_fold)),
-                             index = range(self.__num_row),
-                             columns=["fold" + str(i) for i in xrange(1,self.__num_fold+1)])
-        for i in range(folds.shape[1]):
-            folds.iloc[test_index_list[i],i] = 1
-        return folds
+        fold_id = np.full(self.__num_row, -1, dtype = np.int64)
+        for i, (train_index, test_index) in enumerate(skf.split(X, y)):
+            fold_id[test_index] = i
+        return foldIndex(fold_id, self.__num_fold)
@@ -0,0 +1,258 @@
+"""
+On-disk binary dataset store. Features, labels and row index are written once
+as raw binary files and opened with np.memmap, so any number of processes can
+load a dataset without parsing csv and share the same pages.
+
+Layout of a store directory:
+    header.json     shapes, dtypes, label names and file names
+    features.bin    feature matrix, packed bits for 0/1 fingerprints
+    index.bin       int64 row index of each row in the original csv
+    label_k.bin     float64 vector of the k-th label, one file per label
+"""
+
+import os
+import json
+import numpy as np
+import pandas as pd
+from lightchem.utility import util
+from lightchem.data.packed_fingerprint import packedFingerprint
+
+HEADER_FILE = 'header.json'
+FEATURE_FILE = 'features.bin'
+INDEX_FILE = 'index.bin'
+FORMAT_VERSION = 1
+
+def is_store(data_loc):
+    """
+    Return True if data_loc is a directory containing a binary store.
+    """
+    return os.path.isfile(os.path.join(data_loc, HEADER_FILE))
+
+def store_location(csv_path):
+    """
+    Default store directory of a csv file. Ex: muv.csv.zip -> muv_store
+    """
+    name = csv_path
+    for extension in ['.zip', '.gz', '.csv']:
+        if name.endswith(extension):
+            name = name[:-len(extension)]
+    return name + '_store'
+
+def store_or_csv(csv_path):
+    """
+    Return the store converted from csv_path if it exists, otherwise csv_path.
+    """
+    store_dir = store_location(csv_path)
+    if is_store(store_dir):
+        return store_dir
+    return csv_path
+
+class binaryStoreWriter(object):
+    """
+    Append feature and label blocks to a new binary store.
+    """
+    def __init__(self,store_dir,label_names = None,packed = True):
+        """
+        Parameters:
+        -----------
+        store_dir: str
+          Directory to write the store. Created if not exists.
+        label_names: list
+          Names of label columns. Default to None.
+        packed: boolean, default to True
+          Pack 0/1 features into bits. Set to False for real valued features,
+          which are stored as float64.
+        """
+        if label_names is None:
+            label_names = []
+        if not os.path.exists(store_dir):
+            os.makedirs(store_dir)
+        self.__store_dir = store_dir
+        self.__label_names = list(label_names)
+        self.__packed = packed
+        self.__num_row = 0
+        self.__num_feature = None
+        self.__feature_file = open(os.path.join(store_dir, FEATURE_FILE), 'wb')
+        self.__index_file = open(os.path.join(store_dir, INDEX_FILE), 'wb')
+        self.__label_files = ['label_' + str(i) + '.bin'
+                              for i in range(len(self.__label_names))]
+        self.__label_handles = [open(os.path.join(store_dir, name), 'wb')
+                                for name in self.__label_files]
+
+    def append(self,features,labels = None,index = None):
+        """
+        Append one block of rows.
+        Parameters:
+        -----------
+        features: numpy.ndarray/packedFingerprint
+          Feature block.
+        labels: numpy.ndarray
+          Label block with one column per label name.
+        index: numpy.ndarray
+          Row index of the block. Default to running row number.
+        """
+        if isinstance(features, packedFingerprint):
+            if not self.__packed:
+                raise ValueError('Can not append packedFingerprint to an unpacked store')
+            num_feature = features.shape[1]
+            block = features.packed()
+        elif self.__packed:
+            num_feature = features.shape[1]
+            block = packedFingerprint.from_array(features).packed()
+        else:
+            num_feature = features.shape[1]
+            block = np.asarray(features, dtype = np.float64)
+        if self.__num_feature is None:
+            self.__num_feature = num_feature
+        elif num_feature != self.__num_feature:
+            raise ValueError('All blocks must have the same number of features')
+        num_row = block.shape[0]
+        if index is None:
+            index = np.arange(self.__num_row, self.__num_row + num_row)
+        if len(self.__label_names) > 0:
+            labels = np.asarray(labels, dtype = np.float64).reshape(num_row, -1)
+            if labels.shape[1] != len(self.__label_names):
+                raise ValueError('labels must have one column per label name')
+            for i, handle in enumerate(self.__label_handles):
+                handle.write(np.ascontiguousarray(labels[:, i]).tobytes())
+        self.__feature_file.write(np.ascontiguousarray(block).tobytes())
+        self.__index_file.write(np.asarray(index, dtype = np.int64).tobytes())
+        self.__num_row += num_row
+
+    def close(self):
+        """
+        Close data files and write header. The store is only readable after
+        close is called.
+        """
+        for handle in [self.__feature_file, self.__index_file] + self.__label_handles:
+            handle.close()
+        num_feature = self.__num_feature or 0
+        if self.__packed:
+            feature_shape = [self.__num_row, (num_feature + 7) // 8]
+            feature_dtype = 'uint8'
+        else:
+            feature_shape = [self.__num_row, num_feature]
+            feature_dtype = 'float64'
+        header = {'format_version': FORMAT_VERSION,
+                  'num_row': self.__num_row,
+                  'num_feature': num_feature,
+                  'feature_file': FEATURE_FILE,
+                  'feature_packed': self.__packed,
+                  'feature_dtype': feature_dtype,
+                  'feature_shape': feature_shape,
+                  'index_file': INDEX_FILE,
+                  'index_dtype': 'int64',
+                  'label_names': self.__label_names,
+                  'label_files': self.__label_files,
+                  'label_dtype': 'float64'}
+        with open(os.path.join(self.__store_dir, HEADER_FILE), 'w') as f:
+            json.dump(header, f, indent = 2, sort_keys = True)
+
+    def abort(self):
+        """
+        Close data files without writing header, and remove the header of a
+        store previously written to the same directory, so that a partly
+        written store is never read.
+        """
+        for handle in [self.__feature_file, self.__index_file] + self.__label_handles:
+            handle.close()
+        header_path = os.path.join(self.__store_dir, HEADER_FILE)
+        if os.path.exists(header_path):
+            os.remove(header_path)
+
+class binaryStore(object):
+    """
+    Read-only view of a binary store. Arrays are np.memmap, nothing is read
+    from disk until it is accessed.
+    """
+    def __init__(self,store_dir):
+        if not is_store(store_dir):
+            raise ValueError(store_dir + ' is not a binary store, '
+                             'missing ' + HEADER_FILE)
+        with open(os.path.join(store_dir, HEADER_FILE), 'r') as f:
+            self.__header = json.load(f)
+        if self.__header['format_version'] != FORMAT_VERSION:
+            raise ValueError('Unsupported binary store version: ' +
+                             str(self.__header['format_version']))
+        self.__store_dir = store_dir
+
+    def __memmap(self,file_name,dtype,shape):
+        if shape[0] == 0:
+            # np.memmap can not map an empty file.
+            return np.zeros(shape, dtype = dtype)
+        return np.memmap(os.path.join(self.__store_dir, file_name),
+                         dtype = dtype, mode = 'r', shape = tuple(shape))
+
+    def num_row(self):
+        return self.__header['num_row']
+
+    def label_names(self):
+        return list(self.__header['label_names'])
+
+    def features(self):
+        """
+        Return packedFingerprint over the memory-mapped feature file, or the
+        memory-mapped float64 array for unpacked stores.
+        """
+        header = self.__header
+        features = self.__memmap(header['feature_file'], header['feature_dtype'],
+                                 header['feature_shape'])
+        if header['feature_packed']:
+            return packedFingerprint(features, header['num_feature'])
+        return features
+
+    def label(self,label_name):
+        """
+        Return memory-mapped float64 vector of one label.
+        """
+        if not label_name in self.__header['label_names']:
+            raise ValueError('Label names in store are: ' +
+                             ', '.join(self.__header['label_names']))
+        position = self.__header['label_names'].index(label_name)
+        return self.__memmap(self.__header['label_files'][position],
+                             self.__header['label_dtype'],
+                             [self.__header['num_row']])
+
+    def index(self):
+        """
+        Return memory-mapped row index in the original csv.
+        """
+        return self.__memmap(self.__header['index_file'], self.__header['index_dtype'],
+                             [self.__header['num_row']])
+
+def csv_to_store(csv_path,store_dir = None,label_names = None,chunksize = 50000):
+    """
+    One-time conversion of a csv file into a binary store, chunksize rows at
+    a time. Return the store directory.
+    Parameters:
+    -----------
+    csv_path: str
+      Path to csv file, with fingerprint column named `fingerprint` or
+      feature columns containing `Feature_`.
+    store_dir: str
+      Directory to write the store. Default to store_location(csv_path).
+    label_names: list
+      Label columns to store. Default to all numeric columns that are not
+      features.
+    chunksize: int
+      Number of rows read at a time.
+    """
+    if store_dir is None:
+        store_dir = store_location(csv_path)
+    if label_names is None:
+        head = pd.read_csv(csv_path, nrows = 1000)
+        label_names = [col for col in head.columns
+                       if col != 'fingerprint' and not 'Feature_' in col
+                       and not col.startswith('Unnamed')
+                       and np.issubdtype(head[col].dtype, np.number)]
+    writer = None
+    for features, labels in util.read_csv_chunks(csv_path, label_names, chunksize):
+        if writer is None:
+            # Fingerprint strings are decoded to uint8, pack them.
+            writer = binaryStoreWriter(store_dir, label_names,
+                                       packed = features.dtype == np.uint8)
+        writer.append(features, labels)
+    if writer is None:
+        writer = binaryStoreWriter(store_dir, label_names)
+    writer.close()
+    return store_dir
@@ -4,39 +4,127 @@ Contains helper class to read data and transform to ndarray
 
 import pandas as pd
 import numpy as np
+import scipy.sparse
 from lightchem.utility import util
+from lightchem.data.packed_fingerprint import packedFingerprint
+from lightchem.load import binary_store
+
+def is_feature_matrix(data):
+    """
+    Return True if data is a feature matrix accepted by readData: 2-D
+    numpy.ndarray, packedFingerprint or scipy.sparse matrix.
+    """
+    if isinstance(data,packedFingerprint) or scipy.sparse.issparse(data):
+        return True
+    return isinstance(data,np.ndarray) and data.ndim == 2
+
+def convert_features(X_data,feature_format='dense'):
+    """
+    Convert a feature matrix into feature_format of readData.
+    Parameters:
+    -----------
+    X_data: numpy.ndarray/packedFingerprint/scipy.sparse matrix
+      Feature matrix.
+    feature_format: str
+      `dense`: numpy.ndarray, 0/1 fingerprints stay uint8 as from
+      smile_to_fps. `packed`: packedFingerprint. `csr`:
+      scipy.sparse.csr_matrix.
+    """
+    if feature_format == 'packed':
+        if isinstance(X_data,packedFingerprint):
+            return X_data
+        return packedFingerprint.from_array(X_data)
+    if feature_format == 'csr':
+        if isinstance(X_data,packedFingerprint):
+            return X_data.tocsr()
+        if scipy.sparse.issparse(X_data):
+            return X_data.tocsr()
+        if X_data.dtype.kind in 'biu':
+            return util.array_to_csr(X_data)
+        return util.array_to_csr(X_data,np.float64)
+    if isinstance(X_data,packedFingerprint):
+        return X_data.toarray()
+    if scipy.sparse.issparse(X_data):
+        return X_data.toarray()
+    return np.asarray(X_data)
 
 class readData(object):
         '''
         Class to read data,such as fingerprint stored as string in one column
         or column names starting with `Feature_`, and transform to ndarray.
         '''
-        def __init__(self,data_loc,label_name=None):
+        def __init__(self,data_loc,label_name=None,feature_format='dense',
+                     chunksize=None,features=None):
             """
             Parameters:
             -----------
-            data_loc: str/pandas.DataFrame
-              if it is str, it is path to csv directory where data is stored.
+            data_loc: str/pandas.DataFrame/numpy.ndarray/packedFingerprint/scipy.sparse matrix
+              if it is str, it is path to csv directory where data is stored,
+                or a binary store directory created by binary_store.csv_to_store.
               if it is pandas.DataFrame, it is an in memory DataFrame object.
+              if it is a feature matrix, such as fingerprints from
+                smile_to_fps.fingerprints, it is used as features directly and
+                label_name must be None.
             label_name: str
               Name of your label(Response) variable
+            feature_format: str
+              Format of processed features. `dense`: numpy.ndarray of float64.
+              `packed`: packedFingerprint, 0/1 features packed into bits.
+              `csr`: scipy.sparse.csr_matrix, only non-zero features are
+                stored. float32 for fingerprint, float64 for `Feature_` columns.
+            chunksize: int
+              If set and data_loc is a path, stream the csv file chunksize
+              rows at a time. Only one chunk of raw strings is held at once,
+              decoded chunks are joined at the end, so peak memory is about
+              twice the processed features, less with `packed` or `csr`.
+            features: numpy.ndarray/packedFingerprint/scipy.sparse matrix
+              Feature matrix with one row per row of data_loc. If set,
+              features are not parsed from data_loc, which only provides
+              the label. Default to None.
             """
+            if is_feature_matrix(data_loc):
+                if label_name is not None:
+                    raise ValueError('label_name must be None when data_loc '
+                                     'is a feature matrix')
+                features = data_loc
+                data_loc = pd.DataFrame(index=range(data_loc.shape[0]))
             assert (isinstance(data_loc,str) or isinstance(data_loc,pd.DataFrame))
+            if features is not None:
+                assert is_feature_matrix(features)
+            self.__features = features
             if isinstance(data_loc,pd.DataFrame):
                 self.__data_pd = data_loc
             elif isinstance(data_loc,str):
                 self.__data_pd = None
                 self.__file_path = data_loc
+            self.__store = None
+            if isinstance(data_loc,str) and binary_store.is_store(data_loc):
+                self.__store = binary_store.binaryStore(data_loc)
             # Testing data does not have label_name 
             if label_name is not None:
                 assert isinstance(label_name,str)
             self.__label_name = label_name
+            if not feature_format in ['dense','packed','csr']:
+                raise ValueError("feature_format should be `dense`, `packed` or `csr`")
+            self.__feature_format = feature_format
+            if chunksize is not None:
+                assert isinstance(chunksize,int) and chunksize > 0
+            self.__chunksize = chunksize
             self.__X_data = None
             self.__y_data = None
         def read(self):
             """
             Read data
             """
+            if self.__features is not None:
+                self.__read_features()
+                return
+            if self.__store is not None:
+                self.__read_store()
+                return
+            if self.__chunksize is not None and not isinstance(self.__data_pd,pd.DataFrame):
+                self.__read_chunks()
+                return
             if not isinstance(self.__data_pd,pd.DataFrame):
                 self.__data_pd = pd.read_csv(self.__file_path)
             if self.__label_name is not None:
@@ -47,19 +135,112 @@ class readData(object):
 
             # extracting features from DataFrame
             if 'fingerprint' in self.__data_pd.columns:
-                self.__X_data = util.fpString_to_array(self.__data_pd['fingerprint'])
+                if self.__feature_format == 'packed':
+                    self.__X_data = packedFingerprint.from_fpString(self.__data_pd['fingerprint'])
+                elif self.__feature_format == 'csr':
+                    self.__X_data = util.fpString_to_csr(self.__data_pd['fingerprint'])
+                else:
+                    self.__X_data = util.fpString_to_array_fast(self.__data_pd['fingerprint'])
             else:
                 features_cols = [ col for col in self.__data_pd.columns if 'Feature_' in col]
                 self.__X_data = self.__data_pd[features_cols]
                 self.__X_data = np.array(self.__X_data)
-                self.__X_data = self.__X_data.astype(np.float64)
+                if self.__feature_format == 'packed':
+                    self.__X_data = packedFingerprint.from_array(self.__X_data)
+                elif self.__feature_format == 'csr':
+                    self.__X_data = util.array_to_csr(self.__X_data,np.float64)
+                else:
+                    self.__X_data = self.__X_data.astype(np.float64)
+
+        def __read_features(self):
+            """
+            Use the given feature matrix, only label is read from data_loc.
+            """
+            self.__X_data = convert_features(self.__features,self.__feature_format)
+            if self.__label_name is not None:
+                if isinstance(self.__data_pd,pd.DataFrame):
+                    label = self.__data_pd[self.__label_name]
+                elif self.__store is not None:
+                    label = self.__store.label(self.__label_name)
+                else:
+                    label = pd.read_csv(self.__file_path,
+                                        usecols=[self.__label_name])[self.__label_name]
+                self.__y_data = np.array(label).astype(np.float64)
+                if len(self.__y_data) != self.__X_data.shape[0]:
+                    raise ValueError('features and label have different number of rows')
+
+        def __read_store(self):
+            """
+            Open features and label of a binary store with np.memmap. With
+            feature_format = `packed`, packed features are not copied.
+            """
+            X_data = self.__store.features()
+            if self.__feature_format == 'packed':
+                if not isinstance(X_data,packedFingerprint):
+                    X_data = packedFingerprint.from_array(X_data)
+            elif self.__feature_format == 'csr':
+                if isinstance(X_data,packedFingerprint):
+                    X_data = X_data.tocsr()
+                else:
+                    X_data = util.array_to_csr(X_data,np.float64)
+            elif isinstance(X_data,packedFingerprint):
+                X_data = X_data.toarray(np.float64)
+            self.__X_data = X_data
+            if self.__label_name is not None:
+                self.__y_data = self.__store.label(self.__label_name)
+
+        def __read_chunks(self):
+            """
+            Stream csv file chunk by chunk. Only the feature and label columns
+            are parsed, and the raw strings of one chunk are released before
+            the next chunk is read. Decoded chunks are joined once at the end.
+            """
+            label_names = []
+            if self.__label_name is not None:
+                label_names = [self.__label_name]
+            X_blocks = []
+            y_blocks = []
+            num_feature = 0
+            for block, labels in util.read_csv_chunks(self.__file_path,label_names,
+                                                      self.__chunksize):
+                num_feature = block.shape[1]
+                if self.__feature_format == 'csr':
+                    # Only the non-zero entries of each chunk are kept.
+                    if block.dtype == np.uint8:
+                        block = util.array_to_csr(block)
+                    else:
+                        block = util.array_to_csr(block,np.float64)
+                elif self.__feature_format == 'packed':
+                    block = packedFingerprint.from_array(block).packed()
+                else:
+                    block = block.astype(np.float64)
+                X_blocks.append(block)
+                y_blocks.append(labels[:,0] if label_names else None)
+            if self.__feature_format == 'csr':
+                if len(X_blocks) == 0:
+                    self.__X_data = scipy.sparse.csr_matrix((0,0),dtype=np.float32)
+                else:
+                    self.__X_data = scipy.sparse.vstack(X_blocks,format='csr')
+            elif self.__feature_format == 'packed':
+                if len(X_blocks) == 0:
+                    X_blocks = [np.zeros((0,0),dtype=np.uint8)]
+                self.__X_data = packedFingerprint(np.concatenate(X_blocks),num_feature)
+            elif len(X_blocks) == 0:
+                self.__X_data = np.zeros((0,0),dtype=np.float64)
+            else:
+                self.__X_data = np.concatenate(X_blocks)
+            if self.__label_name is not None:
+                if len(y_blocks) == 0:
+                    self.__y_data = np.zeros(0,dtype=np.float64)
+                else:
+                    self.__y_data = np.concatenate(y_blocks)
 
         def features(self):
             """
             Method to return processed features data
 
             """
-            if not isinstance(self.__X_data, np.ndarray):
+            if self.__X_data is None:
                raise ValueError('You must call `read` before `features`')
             else:
                 return self.__X_data
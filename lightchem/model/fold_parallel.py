@@ -0,0 +1,43 @@
+"""
+Train cross validation folds of one model concurrently.
+"""
+from multiprocessing.pool import ThreadPool
+from lightchem.utility import thread_budget
+
+def num_jobs(n_jobs,num_folds):
+    """
+    Number of folds to train at once, -1 means one fold per usable cpu core.
+    """
+    if n_jobs is None:
+        n_jobs = 1
+    elif n_jobs < 0:
+        n_jobs = thread_budget.usable_cores() + 1 + n_jobs
+    return max(1,min(n_jobs,num_folds))
+
+def fold_param(param,n_jobs):
+    """
+    Return copy of xgboost parameter with `nthread` divided among n_jobs
+    folds trained at once, see thread_budget.threadBudget. Missing or
+    non-positive `nthread` means all usable cpu cores.
+    """
+    param = dict(param)
+    budget = thread_budget.threadBudget(param.get('nthread'))
+    param['nthread'] = budget.share(n_jobs)
+    return param
+
+def map_folds(train_fn,num_folds,n_jobs = 1,nthread = 1):
+    """
+    Return [train_fn(i) for i in range(num_folds)], running up to n_jobs
+    folds at once in threads. xgboost releases the GIL while training, so
+    threads share DMatrix without copying them to other processes. BLAS
+    threads are capped to nthread, the threads of each fold, meanwhile.
+    """
+    if n_jobs <= 1:
+        return [train_fn(i) for i in range(num_folds)]
+    pool = ThreadPool(n_jobs)
+    try:
+        with thread_budget.blas_limit(nthread):
+            return pool.map(train_fn,range(num_folds),chunksize = 1)
+    finally:
+        pool.close()
+        pool.join()
@@ -11,10 +11,13 @@ from sklearn.model_selection import StratifiedKFold
 import glob
 import re
 from lightchem.eval import xgb_eval
+from lightchem.eval import native_eval
 from lightchem.data import xgb_data
 from lightchem.model import first_layer_model
 from lightchem.eval import defined_eval
 from lightchem.model import defined_model
+from lightchem.model import fold_parallel
+from lightchem.model import train_callback
 
 
 class secondLayerModel(object):
@@ -55,6 +58,10 @@ class secondLayerModel(object):
         self.__firstLayerModel_prediction = None
         self.__param = self.__preDefined_model.model_param(model_type)
         self.__eval_function = self.__preDefined_eval.eval_function(self.__eval_name)
+        # Use xgboost's native metric where equivalent, see native_eval.
+        self.__native_eval = True
+        self.__watch_mode = 'eval'
+        self.__train_every = None
         self.__MAXIMIZE = self.__preDefined_eval.is_maximize(self.__eval_name)
         self.__STOPPING_ROUND = self.__preDefined_eval.stopping_round(self.__eval_name)
         self.__holdout = None
@@ -71,68 +78,111 @@ class secondLayerModel(object):
         #Remove later: sort the column so that column index is always the same
         #holdout_df = holdout_df[np.sort(holdout_df.columns)]
         label = self.__xgbData.get_holdoutLabel()
-        self.__xgbData = xgb_data.xgbData(self.__xgbData.get_train_fold(),
+        self.__xgbData = xgb_data.xgbData(self.__xgbData.get_train_foldIndex(),
                                           np.array(holdout_df),
                                           np.array(label),
-                                          False)
+                                          False,
+                                          weight = self.__xgbData.get_holdoutWeight())
         self.__xgbData.build()
 
-    def xgb_cv(self):
+    def xgb_cv(self,n_jobs = 1):
         '''
         Self-define wrapper to perform cross validation, which use training and
         validating data from xgbData to train k models where k = number of
         training folds.Later when do prediction, use the mean of k models'
         predictions.
+        Parameters:
+        -----------
+        n_jobs: int
+          Number of folds trained at once, in threads. `nthread` of model
+          parameter is divided among them. Models are the same as training
+          folds one by one with the divided `nthread`. -1 means one fold per
+          cpu core. Default to 1.
         '''
-        self.__collect_model = []
         num_folds = self.__xgbData.numberOfTrainFold()
-        for i in range(num_folds):
-            # load xgb data for one cross validation iteration.
-            dtrain = self.__xgbData.get_dtrain(i)[0]
-            dvalidate = self.__xgbData.get_dtrain(i)[1]
-            # prepare watchlist for model training
-            watchlist  = [(dtrain,'train'),(dvalidate,'eval')]
-
-            # Since when doing prediction, ntree limit not available for
-            # gblinear, use different training method for gbtree and gblinear
+        n_jobs = fold_parallel.num_jobs(n_jobs,num_folds)
+        param = fold_parallel.fold_param(self.__param,n_jobs)
+        def train_fold(i):
+            # Each fold is fetched when it starts training, so only the
+            # n_jobs folds trained at once are held besides fold_cache.
+            dtrain, dvalidate = self.__xgbData.get_dtrain(i)
+            return self.__train_fold(param,dtrain,dvalidate)
+        # Fold DMatrix may be shared with xgbData of other labels, keep
+        # them on this label until all folds are trained.
+        with self.__xgbData.label_gate():
+            results = fold_parallel.map_folds(train_fold,num_folds,n_jobs,
+                                              param['nthread'])
+        self.__collect_model = []
+        for i,(bst,used_param) in enumerate(results):
+            # collect this model
+            self.__collect_model.append(bst)
             if self.__param['booster'] == 'gbtree':
-                if self.__param['objective'] == 'binary:logistic':
-                    self.__param['scale_pos_weight'] = sum(dtrain.get_label()==0)/sum(dtrain.get_label()==1)
-               # model training
-                bst = xgb.train( self.__param, dtrain, 1000 , watchlist,
-                                 feval = self.__eval_function,
-                                 early_stopping_rounds = self.__STOPPING_ROUND,
-                                 maximize = self.__MAXIMIZE
-                                 #,callbacks=[xgb.callback.print_evaluation(show_stdv=True)]
-                                 )
-               # collect this model
-                self.__collect_model.append(bst)
-               # save best number of tree. Later when do prediction,
-               # use best number of tree, not the last tree.
+                # save best number of tree. Later when do prediction,
+                # use best number of tree, not the last tree.
                 ind_model_result = pd.DataFrame({'model_name' : 'Part' + str(i),
                                                  'best_ntree' : bst.best_ntree_limit},
                                                  index = ['Part' + str(i)])
                 self.__track_best_ntree = self.__track_best_ntree.append(ind_model_result)
+                if 'scale_pos_weight' in used_param:
+                    self.__param['scale_pos_weight'] = used_param['scale_pos_weight']
+            self.__best_score.append(bst.best_score)
 
-            elif self.__param['booster'] == 'gblinear':
+    def __train_fold(self,param,dtrain,dvalidate):
+        """
+        Train model of one fold. Return (booster, parameter used).
+        """
+        param = dict(param)
+        # prepare watchlist for model training. Only the last item drives
+        # early stopping, see watch_mode.
+        watchlist  = [(dvalidate,'eval')]
+        if self.__watch_mode == 'both':
+            watchlist.insert(0,(dtrain,'train'))
+        feval = self.__eval_function
+        native = None
+        if self.__native_eval and not 'eval_metric' in param:
+            # Let xgboost compute the metric if it has an equivalent one.
+            native = native_eval.offload(self.__eval_name,param,watchlist)
+        if native is not None:
+            param['eval_metric'], watchlist = native
+            feval = None
+        callbacks = []
+        if self.__watch_mode == 'eval' and self.__train_every is not None:
+            # Training data is evaluated apart with the custom metric, so
+            # offload neither copies it nor needs both classes in it.
+            callbacks.append(train_callback.trainMetric(dtrain,self.__train_every,
+                                                        self.__eval_function))
+        # Boosters trained at once may share dtrain, see firstRound.
+        first_round = train_callback.firstRound(dtrain)
+        callbacks = first_round.callbacks() + callbacks
+        # Since when doing prediction, ntree limit not available for
+        # gblinear, use different training method for gbtree and gblinear
+        try:
+            if param['booster'] == 'gbtree':
+                if param['objective'] == 'binary:logistic':
+                    param['scale_pos_weight'] = sum(dtrain.get_label()==0)/sum(dtrain.get_label()==1)
                 # model training
-                bst = xgb.train(self.__param, dtrain,600 , watchlist,
-                                feval = self.__eval_function,
-                                early_stopping_rounds = self.__STOPPING_ROUND,
-                                maximize = self.__MAXIMIZE
-                                #,callbacks=[xgb.callback.print_evaluation(show_stdv=True)]
-                                )
-                # retrain model using best ntree
-                temp_best_ntree = bst.best_ntree_limit
-                bst = xgb.train(self.__param, dtrain,temp_best_ntree, watchlist,
-                                feval = self.__eval_function,
+                bst = xgb.train( param, dtrain, 1000 , watchlist,
+                                 feval = feval,
+                                 early_stopping_rounds = self.__STOPPING_ROUND,
+                                 maximize = self.__MAXIMIZE,
+                                 callbacks = callbacks
+                                 #,callbacks=[xgb.callback.print_evaluation(show_stdv=True)]
+                                 )
+            elif param['booster'] == 'gblinear':
+                # model training, keep the booster of best iteration since
+                # ntree limit does not apply to gblinear.
+                snapshot = train_callback.bestSnapshot()
+                bst = xgb.train(param, dtrain,600 , watchlist,
+                                feval = feval,
                                 early_stopping_rounds = self.__STOPPING_ROUND,
-                                maximize = self.__MAXIMIZE
-                                #,callbacks = [xgb.callback.print_evaluation(show_stdv=True)]
+                                maximize = self.__MAXIMIZE,
+                                callbacks = callbacks + [snapshot]
                                 )
-                self.__collect_model.append(bst)
-
-            self.__best_score.append(bst.best_score)
+        finally:
+            first_round.release()
+        if param['booster'] == 'gblinear':
+            bst = snapshot.best_booster(bst,param.get('nthread'))
+        return bst, param
 
     def generate_holdout_pred(self):
         """
@@ -142,18 +192,20 @@ class secondLayerModel(object):
             raise ValueError('You must call `xgb_cv` before `generate_holdout_pred`')
         # find number of folds User choosed
         num_folds = self.__xgbData.numberOfTrainFold()
-        train_folds = self.__xgbData.get_train_fold()
-        self.__holdout = np.zeros(train_folds.shape[0])
-        for i in range(num_folds):
-            bst = self.__collect_model[i]
-            dvalidate = self.__xgbData.get_dtrain(i)[1]
-            if self.__param['booster'] == 'gbtree':
-                # Retrive saved best number of tree.
-                best_ntree = self.__track_best_ntree.loc['Part' + str(i),'best_ntree']
-                temp = bst.predict(dvalidate,ntree_limit = np.int64(np.float32(best_ntree)))
-            else:
-                temp = bst.predict(dvalidate)
-            self.__holdout[np.where(train_folds.iloc[:,i]==1)] = temp
+        train_folds = self.__xgbData.get_train_foldIndex()
+        self.__holdout = np.zeros(train_folds.num_row())
+        # Validating DMatrix may be shared with xgbData of other labels.
+        with self.__xgbData.label_gate():
+            for i in range(num_folds):
+                bst = self.__collect_model[i]
+                dvalidate = self.__xgbData.get_dtrain(i)[1]
+                if self.__param['booster'] == 'gbtree':
+                    # Retrive saved best number of tree.
+                    best_ntree = self.__track_best_ntree.loc['Part' + str(i),'best_ntree']
+                    temp = bst.predict(dvalidate,ntree_limit = np.int64(np.float32(best_ntree)))
+                else:
+                    temp = bst.predict(dvalidate)
+                self.__holdout[train_folds.validate_index(i)] = temp
 
     def predict(self,list_test_x):
         """
@@ -171,7 +223,7 @@ class secondLayerModel(object):
         # Convert test data into xgboost.DMatrix format
         for j,item in enumerate(list_test_x):
             if not isinstance(item,xgb.DMatrix):
-                list_test_x[j] = xgb.DMatrix(scipy.sparse.csr_matrix(np.array(item)))
+                list_test_x[j] = xgb_data.to_DMatrix(item)
             else:
                 list_test_x[j] = item
         # Generate firstLayerModel predictions using new test dataset.
@@ -217,7 +269,9 @@ class secondLayerModel(object):
 
     def cv_score(self):
         """
-        Print model's cross validation score.
+        Print model's cross validation score. Scores offloaded to xgboost's
+        native metric, see native_eval, are its float32 values and may
+        differ from the custom evaluation function by up to 1e-3.
         """
         print 'Evaluation metric: ' + self.__eval_name
         print 'Model name: ' + self.__model_type_writeout
@@ -226,7 +280,7 @@ class secondLayerModel(object):
 
     def cv_score_df(self):
         """
-        return cv score as dataframe
+        return cv score as dataframe, see cv_score.
         """
         return pd.DataFrame({self.__eval_name : [np.mean(self.__best_score),
                                                 np.std(self.__best_score)]},
@@ -267,6 +321,27 @@ class secondLayerModel(object):
           Custom evaluation function based on xgboost's format.
         """
         self.__eval_function = function
+        self.__native_eval = False
+
+    def watch_mode(self,mode = 'eval',train_every = None):
+        """
+        Choose data evaluated during boosting. Only validation data drives
+        early stopping, evaluating training data is for diagnostics.
+        Parameters:
+        -----------
+        mode: str
+          'eval' evaluates validation data only, 'both' evaluates training
+          and validation data every round. Default to 'eval'.
+        train_every: int
+          With mode 'eval', also evaluate training data every `train_every`
+          rounds. Default to None, never.
+        """
+        if not mode in ['eval','both']:
+            raise ValueError('mode must be one of eval, both')
+        if train_every is not None and train_every < 1:
+            raise ValueError('train_every must be a positive integer')
+        self.__watch_mode = mode
+        self.__train_every = train_every
 
     def get_validation_info(self):
         """
@@ -277,14 +352,16 @@ class secondLayerModel(object):
         if not isinstance(self.__holdout,np.ndarray):
             raise ValueError('You must call `generate_holdout_pred` ',
                              'before `get_validation_info`')
-        train_folds = self.__xgbData.get_train_fold()
+        train_folds = self.__xgbData.get_train_foldIndex()
         train_labels = self.__xgbData.get_holdoutLabel()
-        final = train_folds.copy(deep=True)
-        final.loc[:,'label'] = train_labels
-        final.loc[:,'validation_pred'] = self.__holdout
+        row_labels = train_folds.index()
         val_info = []
-        for fold in list(train_folds.columns):
-            temp = final.loc[final.loc[:,fold]==1,['label','validation_pred']]
+        for i in range(train_folds.num_fold()):
+            validate_index = train_folds.validate_index(i)
+            temp = pd.DataFrame({'label':train_labels[validate_index],
+                                 'validation_pred':self.__holdout[validate_index]},
+                                index = row_labels[validate_index],
+                                columns = ['label','validation_pred'])
             val_info.append(temp)
         return val_info
 
@@ -0,0 +1,155 @@
+"""
+Callbacks passed to xgboost.train by layer models.
+"""
+import threading
+import weakref
+import xgboost as xgb
+
+# DMatrix -> lock held by the booster running its first round on it.
+_first_round_locks = weakref.WeakKeyDictionary()
+_first_round_guard = threading.Lock()
+
+class bestSnapshot(object):
+    """
+    xgboost.train callback keeping the booster of the best iteration found
+    by early stopping. ntree_limit does not apply to gblinear, so instead of
+    retraining best_ntree_limit rounds from scratch, the best booster is
+    restored from its snapshot.
+    Ex: snapshot = bestSnapshot()
+        bst = xgb.train(param,dtrain,300,watchlist,early_stopping_rounds = 10,
+                        callbacks = [snapshot])
+        bst = snapshot.best_booster(bst,param.get('nthread'))
+    """
+    def __init__(self):
+        # iteration -> raw model
+        self.__snapshots = {}
+
+    def __call__(self,env):
+        # Callbacks passed by user run before early stopping of the same
+        # iteration, so best_iteration is up to the previous iteration.
+        # Either it or this iteration ends up the best.
+        keep = set([env.iteration])
+        best_iteration = env.model.attr('best_iteration')
+        if best_iteration is not None:
+            keep.add(int(best_iteration))
+        for iteration in list(self.__snapshots):
+            if not iteration in keep:
+                del self.__snapshots[iteration]
+        self.__snapshots[env.iteration] = env.model.save_raw()
+
+    def best_booster(self,bst,nthread = None):
+        """
+        Return booster of bst.best_iteration, with best_score, best_iteration
+        and best_ntree_limit of bst.
+        Parameters:
+        -----------
+        bst: xgboost.Booster
+          Booster returned by xgboost.train.
+        nthread: int
+          Number of threads of the returned booster used for prediction.
+          Default to None, xgboost's default.
+        """
+        best = xgb.Booster(model_file = self.__snapshots[bst.best_iteration])
+        if nthread is not None:
+            best.set_param('nthread',nthread)
+        for name in ['best_score','best_iteration','best_ntree_limit']:
+            if hasattr(bst,name):
+                setattr(best,name,getattr(bst,name))
+        self.__snapshots = {}
+        return best
+
+class trainMetric(object):
+    """
+    xgboost.train callback evaluating the training data every `every`
+    rounds, for diagnostics when it is left out of the watchlist.
+    Ex: bst = xgb.train(param,dtrain,300,[(dvalidate,'eval')],
+                        callbacks = [trainMetric(dtrain,10,feval)])
+    """
+    def __init__(self,dtrain,every,feval = None,verbose = True):
+        """
+        Parameters:
+        -----------
+        dtrain: xgboost.DMatrix
+          Training data.
+        every: int
+          Evaluate every `every` rounds, and at the first one.
+        feval: function
+          Custom evaluation function, evaluated instead of `eval_metric` of
+          the booster, which may not apply to training labels. Default to
+          None, `eval_metric` of the booster.
+        verbose: bool
+          Print each evaluation. Default to True.
+        """
+        if every < 1:
+            raise ValueError('every must be a positive integer')
+        self.__dtrain = dtrain
+        self.__every = int(every)
+        self.__feval = feval
+        self.__verbose = verbose
+        self.__history = []
+
+    def __call__(self,env):
+        if env.iteration % self.__every != 0:
+            return
+        if self.__feval is None:
+            message = env.model.eval_set([(self.__dtrain,'train')],env.iteration)
+            if not isinstance(message,str):
+                message = message.decode()
+        else:
+            name, value = self.__feval(env.model.predict(self.__dtrain),self.__dtrain)
+            message = '[%d]\ttrain-%s:%f' % (env.iteration,name,value)
+        self.__history.append((env.iteration,message))
+        if self.__verbose:
+            print message
+
+    def history(self):
+        """
+        Return list of (iteration, evaluation message) recorded so far.
+        """
+        return list(self.__history)
+
+class firstRound(object):
+    """
+    xgboost.train callbacks holding a lock of dtrain during the first
+    boosting round. xgboost builds column pages of a DMatrix in the first
+    round trained on it, without a lock, so boosters trained at once on a
+    shared DMatrix must not run their first round at the same time.
+    Ex: first_round = firstRound(dtrain)
+        try:
+            bst = xgb.train(param,dtrain,300,watchlist,
+                            callbacks = first_round.callbacks())
+        finally:
+            first_round.release()
+    """
+    def __init__(self,dtrain):
+        with _first_round_guard:
+            lock = _first_round_locks.get(dtrain)
+            if lock is None:
+                lock = threading.Lock()
+                _first_round_locks[dtrain] = lock
+        self.__lock = lock
+        self.__held = False
+
+    def __acquire(self,env):
+        if env.iteration == env.begin_iteration and not self.__held:
+            self.__lock.acquire()
+            self.__held = True
+    # Run before the update of each round.
+    __acquire.before_iteration = True
+
+    def __release(self,env):
+        self.release()
+
+    def callbacks(self):
+        """
+        Return list of callbacks to pass to xgboost.train.
+        """
+        return [self.__acquire,self.__release]
+
+    def release(self):
+        """
+        Release the lock if still held, Ex: training failed in first round.
+        """
+        if self.__held:
+            self.__held = False
+            self.__lock.release()
@@ -0,0 +1,179 @@
+"""
+Ranking metrics of virtual screening computed from predictions sorted once.
+"""
+import numpy as np
+from sklearn.metrics import auc
+
+class metricKernel(object):
+    """
+    Sort predictions once in decreasing order, then compute enrichment
+    factors, NEF AUC, AEF, ROC AUC, PR AUC, average precision and
+    reliability score from cumulative sums of the sorted labels. Tied
+    predictions are kept in the order of sklearn.metrics and
+    util.enrichment_factor, and curves only have one point per unique
+    prediction, so metrics are the same as theirs.
+    Ex: kernel = metricKernel(labels, preds)
+        kernel.roc_auc()
+        kernel.enrichment_factor(np.array([0.01, 0.05]))
+    """
+    def __init__(self,y_true,y_pred,num_active = None):
+        """
+        Parameters:
+        -----------
+        y_true: numpy.ndarray
+          Binary labels, 1 for actives.
+        y_pred: numpy.ndarray
+          Predictions, higher for actives.
+        num_active: float
+          np.nansum(y_true) if already known. Default to None, computed.
+        """
+        y_true = np.asarray(y_true)
+        y_pred = np.asarray(y_pred)
+        if y_true.shape[0] != y_pred.shape[0]:
+            raise ValueError('y_true and y_pred must have the same length')
+        self.__size = y_pred.shape[0]
+        order = np.argsort(y_pred,kind = 'mergesort')[::-1]
+        self.__pred = y_pred[order]
+        self.__label = y_true[order]
+        if num_active is None:
+            num_active = np.nansum(y_true)
+        self.__num_active = num_active
+        # Position of the last prediction of each group of tied predictions.
+        self.__last_tie = np.r_[np.where(np.diff(self.__pred))[0],self.__size - 1]
+        self.__cum_label = None
+        self.__curve = None
+
+    def num_unique(self):
+        """
+        Return number of unique predictions.
+        """
+        return len(self.__last_tie)
+
+    def __cumulative_label(self):
+        # Number of actives among the top k predictions is [k], NaN labels
+        # count as 0.
+        if self.__cum_label is None:
+            label = np.where(np.isnan(self.__label),0,self.__label)
+            self.__cum_label = np.r_[0,np.cumsum(label,dtype = np.float64)]
+        return self.__cum_label
+
+    def __sample_size(self,perc_vec):
+        return (self.__size * perc_vec).astype(np.int)
+
+    def enrichment_factor(self,perc_vec):
+        """
+        Return enrichment factor at each percentile of perc_vec, see
+        util.enrichment_factor.
+        """
+        perc_vec = np.asarray(perc_vec)
+        n_actives = self.__num_active
+        if n_actives == 0:
+            return np.repeat(np.nan,len(perc_vec))
+        sample_size_vec = np.minimum(self.__sample_size(perc_vec),self.__size)
+        n_experimental_vec = np.float32(self.__cumulative_label()[sample_size_vec])
+        return (n_experimental_vec / n_actives) / perc_vec
+
+    def max_enrichment_factor(self,perc_vec):
+        """
+        Return best possible enrichment factor at each percentile of perc_vec.
+        """
+        perc_vec = np.asarray(perc_vec)
+        n_actives = self.__num_active
+        if n_actives == 0:
+            return np.repeat(np.nan,len(perc_vec))
+        minimum_vec = np.minimum(n_actives,self.__sample_size(perc_vec)).astype(np.float64)
+        return (minimum_vec / n_actives) / perc_vec
+
+    def nef_auc(self,perc_vec):
+        """
+        Return area under normalized enrichment factor of perc_vec, divided
+        by max(perc_vec).
+        """
+        perc_vec = np.asarray(perc_vec)
+        nef_vec = self.enrichment_factor(perc_vec) / self.max_enrichment_factor(perc_vec)
+        return auc(perc_vec,nef_vec) / max(perc_vec)
+
+    def average_enrichment_factor(self,perc_vec):
+        """
+        Return mean enrichment factor of perc_vec, ignoring undefined ones.
+        """
+        return np.nanmean(self.enrichment_factor(perc_vec))
+
+    def __binary_curve(self):
+        # Number of false and true positives above each unique prediction.
+        if self.__curve is None:
+            positive = self.__label == 1
+            if not (np.all(positive | (self.__label == 0)) or
+                    np.all(positive | (self.__label == -1))):
+                raise ValueError('Data is not binary')
+            tps = np.cumsum(positive,dtype = np.float64)[self.__last_tie]
+            fps = 1 + self.__last_tie - tps
+            self.__curve = (fps,tps)
+        return self.__curve
+
+    def roc_auc(self):
+        """
+        Return area under ROC curve, see sklearn.metrics.roc_auc_score.
+        """
+        fps, tps = self.__binary_curve()
+        if tps.size == 0 or tps[-1] == 0 or fps[-1] == 0:
+            raise ValueError('Only one class present in y_true. ROC AUC score '
+                             'is not defined in that case.')
+        if len(fps) > 2:
+            # Drop points in the middle of straight lines.
+            keep = np.where(np.r_[True,
+                                  np.logical_or(np.diff(fps,2),np.diff(tps,2)),
+                                  True])[0]
+            fps = fps[keep]
+            tps = tps[keep]
+        if fps[0] != 0 or tps[0] != 0:
+            fps = np.r_[0,fps]
+            tps = np.r_[0,tps]
+        return auc(fps / fps[-1],tps / tps[-1])
+
+    def __precision_recall(self):
+        # Precision and decreasing recall, see
+        # sklearn.metrics.precision_recall_curve.
+        fps, tps = self.__binary_curve()
+        precision = tps / (tps + fps)
+        precision[np.isnan(precision)] = 0
+        recall = tps / tps[-1]
+        last_ind = tps.searchsorted(tps[-1])
+        sl = slice(last_ind,None,-1)
+        return np.r_[precision[sl],1], np.r_[recall[sl],0]
+
+    def pr_auc(self):
+        """
+        Return area under precision recall curve, see util.PRC_auc.
+        """
+        precision, recall = self.__precision_recall()
+        return auc(recall,precision)
+
+    def avg_precision(self):
+        """
+        Return average precision, see sklearn.metrics.average_precision_score.
+        """
+        precision, recall = self.__precision_recall()
+        return -np.sum(np.diff(recall) * precision[:-1])
+
+    def reliability_score(self,n_bin = 20):
+        """
+        Return reliability score of predicted probabilities, see
+        util.reliability_score. Predictions are split into n_bin bins of
+        increasing predictions, the last one holding the remainder. Tied
+        predictions are binned in their original order.
+        """
+        # Increasing order, ties in their original order.
+        label = self.__label[::-1]
+        pred = self.__pred[::-1]
+        length = self.__size // n_bin
+        if length > 0:
+            bins = np.minimum(np.arange(self.__size) // length,n_bin - 1)
+        else:
+            bins = np.repeat(n_bin - 1,self.__size)
+        count = np.bincount(bins,minlength = n_bin)
+        used = count > 0
+        label_mean = np.bincount(bins,label,n_bin)[used] / count[used]
+        pred_mean = np.bincount(bins,pred,n_bin)[used] / count[used]
+        overall_mean = np.mean(label)
+        return np.nanmean(abs(pred_mean / overall_mean - label_mean / overall_mean))
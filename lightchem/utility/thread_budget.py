@@ -0,0 +1,155 @@
+"""
+Share cpu threads among boosters running at once, so that parallel
+training does not oversubscribe the machine or its container quota.
+"""
+import math
+import ctypes
+import contextlib
+import threading
+import multiprocessing
+
+# (file name pattern, get threads function, set threads function) of BLAS
+# libraries whose thread count can be changed once loaded.
+BLAS_LIBRARIES = [('openblas','openblas_get_num_threads','openblas_set_num_threads'),
+                  ('mkl_rt','MKL_Get_Max_Threads','MKL_Set_Num_Threads')]
+# Number of blas_limit contexts entered, only the outermost one applies.
+_blas_depth = [0]
+_blas_lock = threading.Lock()
+
+def _read(path):
+    try:
+        with open(path,'r') as f:
+            return f.read().strip()
+    except (IOError,OSError):
+        return None
+
+def affinity_cores():
+    """
+    Return number of cpu cores this process may run on, None if unknown.
+    """
+    status = _read('/proc/self/status')
+    if status is None:
+        return None
+    for line in status.split('\n'):
+        if line.startswith('Cpus_allowed_list:'):
+            num_core = 0
+            for part in line.split(':',1)[1].strip().split(','):
+                if '-' in part:
+                    start, end = part.split('-')
+                    num_core += int(end) - int(start) + 1
+                elif part:
+                    num_core += 1
+            return num_core or None
+    return None
+
+def quota_cores():
+    """
+    Return number of cpu cores allowed by cgroup cpu quota, rounded up,
+    None if there is no quota.
+    """
+    # cgroup v2: "<quota> <period>" or "max <period>"
+    cpu_max = _read('/sys/fs/cgroup/cpu.max')
+    if cpu_max is not None:
+        quota, period = (cpu_max.split() + ['100000'])[:2]
+        if quota == 'max':
+            return None
+        return max(1,int(math.ceil(float(quota) / float(period))))
+    # cgroup v1
+    quota = _read('/sys/fs/cgroup/cpu/cpu.cfs_quota_us')
+    period = _read('/sys/fs/cgroup/cpu/cpu.cfs_period_us')
+    if quota is None or period is None or int(quota) <= 0:
+        return None
+    return max(1,int(math.ceil(float(quota) / float(period))))
+
+def usable_cores():
+    """
+    Return number of cpu cores usable by this process: the smallest of cpu
+    count, cpu affinity and cgroup quota.
+    """
+    limits = [multiprocessing.cpu_count(),affinity_cores(),quota_cores()]
+    return max(1,min(limit for limit in limits if limit is not None))
+
+def _loaded_blas():
+    # Yield (get threads, set threads) functions of BLAS libraries mapped
+    # in this process, such as the OpenBLAS bundled with numpy.
+    maps = _read('/proc/self/maps')
+    if maps is None:
+        return
+    paths = set(line.split()[-1] for line in maps.split('\n')
+                if line.endswith('.so') or '.so.' in line)
+    for path in sorted(paths):
+        name = path.rsplit('/',1)[-1]
+        for pattern, get_name, set_name in BLAS_LIBRARIES:
+            if pattern in name:
+                try:
+                    lib = ctypes.CDLL(path)
+                    yield getattr(lib,get_name), getattr(lib,set_name)
+                except (OSError,AttributeError):
+                    pass
+
+def blas_threads():
+    """
+    Return list of thread counts of loaded BLAS libraries, empty if none can
+    be controlled.
+    """
+    return [get_threads() for get_threads,_ in _loaded_blas()]
+
+@contextlib.contextmanager
+def blas_limit(nthread):
+    """
+    Context manager capping threads of loaded OpenBLAS and MKL libraries to
+    nthread, through their set threads functions. Environment variables are
+    only read when those libraries load, after numpy is imported, so they
+    are left untouched. The limit is process wide, contexts entered inside
+    another one, from any thread, keep the outer limit. Does nothing on
+    other BLAS libraries or without /proc/self/maps.
+    """
+    with _blas_lock:
+        _blas_depth[0] += 1
+        outermost = _blas_depth[0] == 1
+        if outermost:
+            libraries = list(_loaded_blas())
+            saved = [get_threads() for get_threads,_ in libraries]
+            for _, set_threads in libraries:
+                set_threads(int(nthread))
+    try:
+        yield
+    finally:
+        with _blas_lock:
+            _blas_depth[0] -= 1
+            if outermost:
+                for (_,set_threads),value in zip(libraries,saved):
+                    set_threads(value)
+
+class threadBudget(object):
+    """
+    Number of threads available to a group of jobs, handed out in equal
+    shares to jobs running at once.
+    Ex: threadBudget(-1).share(4) on a container limited to 8 cores -> 2
+    """
+    def __init__(self,nthread = -1):
+        """
+        Parameters:
+        -----------
+        nthread: int
+          Total number of threads. None or non-positive means usable_cores().
+          Default to -1.
+        """
+        if nthread is None or nthread <= 0:
+            nthread = usable_cores()
+        self.__nthread = int(nthread)
+
+    def nthread(self):
+        return self.__nthread
+
+    def share(self,n_jobs):
+        """
+        Number of threads of each of n_jobs jobs running at once.
+        """
+        return max(1,self.__nthread // max(1,n_jobs))
+
+    def split(self,n_jobs):
+        """
+        Return threadBudget of each of n_jobs jobs running at once.
+        """
+        return threadBudget(self.share(n_jobs))
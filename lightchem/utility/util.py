@@ -1,5 +1,6 @@
 import numpy as np
 import pandas as pd
+import scipy.sparse
 from sklearn.metrics import auc
 from sklearn import metrics
 import re
@@ -28,6 +29,123 @@ def fpString_to_array(fp_col, sep = ""):
     fp_array = fp_array.astype(np.float64)
     return fp_array
 
+def fpString_to_array_fast(fp_col, sep = "", dtype = np.float64):
+    """
+    Vectorized version of fpString_to_array. Instead of splitting every string,
+    concatenate the whole column and view the ASCII bytes as an uint8 buffer.
+    Falls back to fpString_to_array when fingerprint values are longer than
+    one character or the seperator is longer than one character.
+    Parameters:
+    -----------
+    fp_col: Pandas.Series, each item is a fingerprint string. Ex: 000101,110100
+    sep: Value used to seperate original value.
+    dtype: numpy dtype of returned array. Default to np.float64
+    Return fingerprint array.
+    """
+    fp_list = list(fp_col)
+    num_row = len(fp_list)
+    if num_row == 0:
+        return np.zeros((0, 0), dtype = dtype)
+    if len(sep) > 1:
+        return fpString_to_array(fp_list, sep).astype(dtype)
+    row_length = np.fromiter((len(item) for item in fp_list), dtype = np.int64,
+                             count = num_row)
+    if np.any(row_length != row_length[0]):
+        if sep != "":
+            return fpString_to_array(fp_list, sep).astype(dtype)
+        raise ValueError('All fingerprint strings must have the same length')
+    width = row_length[0]
+    raw = "".join(fp_list)
+    if not isinstance(raw, bytes):
+        raw = raw.encode('ascii')
+    buf = np.frombuffer(raw, dtype = np.uint8).reshape(num_row, width)
+    if sep != "":
+        # Fast path for single character values, ex: 0|1|1. Every other byte
+        # must be the seperator, otherwise values have more than one character.
+        if width % 2 == 0 or np.any(buf[:, 1::2] != ord(sep)):
+            return fpString_to_array(fp_list, sep).astype(dtype)
+        buf = buf[:, ::2]
+    # ASCII '0' is 48, values outside 0-9 wrap around in uint8.
+    fp_array = buf - np.uint8(48)
+    if np.any(fp_array > 9):
+        raise ValueError('Fingerprint strings can only contain digits')
+    return fp_array.astype(dtype, copy = False)
+
+def array_to_csr(fp_array, dtype = np.float32):
+    """
+    Convert a dense feature block into scipy.sparse.csr_matrix, zeros are not
+    stored.
+    """
+    fp_array = np.asarray(fp_array)
+    row, col = np.nonzero(fp_array)
+    data = fp_array[row, col].astype(dtype)
+    indptr = np.zeros(fp_array.shape[0] + 1, dtype = np.int64)
+    indptr[1:] = np.cumsum(np.bincount(row, minlength = fp_array.shape[0]))
+    return scipy.sparse.csr_matrix((data, col, indptr), shape = fp_array.shape)
+
+def fpString_to_csr(fp_col, sep = "", chunk_size = 10000, dtype = np.float32):
+    """
+    Decode fingerprint strings chunk by chunk into a scipy.sparse.csr_matrix,
+    so only one chunk is held as a dense array.
+    Parameters:
+    -----------
+    fp_col: Pandas.Series, each item is a fingerprint string. Ex: 000101,110100
+    sep: Value used to seperate original value.
+    chunk_size: Number of strings decoded at a time.
+    dtype: numpy dtype of the stored values. Default to np.float32, the type
+      xgboost.DMatrix uses internally.
+    """
+    fp_list = list(fp_col)
+    blocks = []
+    for start in range(0, len(fp_list), chunk_size):
+        block = fpString_to_array_fast(fp_list[start:start + chunk_size], sep,
+                                       dtype = np.uint8)
+        blocks.append(array_to_csr(block, dtype))
+    if len(blocks) == 0:
+        return scipy.sparse.csr_matrix((0, 0), dtype = dtype)
+    if len(set(block.shape[1] for block in blocks)) > 1:
+        raise ValueError('All fingerprint strings must have the same length')
+    return scipy.sparse.vstack(blocks, format = 'csr')
+
+def read_csv_chunks(file_path, label_names = None, chunksize = 50000):
+    """
+    Generator that reads a csv file chunksize rows at a time, only parsing the
+    feature and label columns.
+    Parameters:
+    -----------
+    file_path: str, path to csv file. Features are either fingerprint strings
+      in column `fingerprint` or columns containing `Feature_`.
+    label_names: list, names of label columns. Default to None.
+    chunksize: int, number of rows per chunk.
+    Yield (features, labels) of each chunk, where features is uint8 for
+    fingerprint strings and float64 for `Feature_` columns, labels is a float64
+    array with one column per label name.
+    """
+    if label_names is None:
+        label_names = []
+    columns = pd.read_csv(file_path, nrows = 0).columns
+    if 'fingerprint' in columns:
+        features_cols = ['fingerprint']
+        dtype = {'fingerprint': str}
+    else:
+        features_cols = [col for col in columns if 'Feature_' in col]
+        dtype = None
+    reader = pd.read_csv(file_path, usecols = features_cols + list(label_names),
+                         dtype = dtype, chunksize = chunksize)
+    num_feature = None
+    for chunk in reader:
+        if 'fingerprint' in features_cols:
+            features = fpString_to_array_fast(chunk['fingerprint'], dtype = np.uint8)
+        else:
+            features = np.array(chunk[features_cols]).astype(np.float64)
+        if num_feature is None:
+            num_feature = features.shape[1]
+        elif features.shape[1] != num_feature:
+            raise ValueError('All rows must have the same number of features')
+        labels = np.array(chunk[list(label_names)]).astype(np.float64)
+        labels = labels.reshape(features.shape[0], len(label_names))
+        yield features, labels
+
 def array_to_fpString(fp_array, sep = ""):
     '''
     Convert array back to original fingerprint string format
@@ -44,6 +162,27 @@ def array_to_fpString(fp_array, sep = ""):
         fpString_list.append(fp)
     return fpString_list
 
+def array_to_fpString_fast(fp_array, sep = ""):
+    """
+    Vectorized version of array_to_fpString for integer arrays with values
+    0-9 and separator of at most one character. Each row is written into a
+    uint8 buffer of ASCII digits, which is viewed as one fixed width string.
+    Falls back to array_to_fpString for other input.
+    """
+    fp_array = np.asarray(fp_array)
+    if (fp_array.ndim != 2 or fp_array.shape[0] == 0 or fp_array.shape[1] == 0
+            or fp_array.dtype.kind not in 'iu' or len(sep) > 1
+            or np.any((fp_array < 0) | (fp_array > 9))):
+        return array_to_fpString(fp_array, sep)
+    chars = fp_array.astype(np.uint8) + np.uint8(48)
+    if sep != "":
+        buf = np.full((chars.shape[0], 2 * chars.shape[1] - 1), ord(sep),
+                      dtype = np.uint8)
+        buf[:, ::2] = chars
+        chars = buf
+    strings = np.ascontiguousarray(chars).view('S' + str(chars.shape[1])).ravel()
+    return [str(item.decode('ascii')) for item in strings]
+
 def reverse_generate_fold_index(whole_df, file_path, fold_num, join_on):
     """
     Use to regenerate fold index from created individual fold.
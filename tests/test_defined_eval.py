@@ -13,3 +13,12 @@ def test_defined_eval():
         assert mark == 1
     except ValueError:
         mark = 1
+
+def test_native_metric():
+    eval = defined_eval.definedEvaluation()
+    assert eval.native_metric('ROCAUC') == 'auc'
+    assert eval.native_metric('ROCAUC_5','reg:linear') == 'auc'
+    assert eval.native_metric('Logloss','binary:logistic') is None
+    assert eval.native_metric('PRAUC') is None
+    assert eval.eval_cut('ROCAUC_5') == 5.0
+    assert eval.eval_cut('ROCAUC') is None
@@ -3,6 +3,7 @@ Test if fingerprint can be generated properly
 '''
 from lightchem.featurize import fingerprint
 import pandas as pd
+import numpy as np
 
 def test_fingerprint():
     '''
@@ -28,3 +29,219 @@ def test_fingerprint():
     assert len(smiles) == maccs_fp.shape[0]
     for fp in maccs_fp.fingerprint:
         assert len(fp) == 167
+
+def test_fingerprint_n_jobs():
+    '''
+    Fingerprints computed by several processes should match, in input order.
+    '''
+    smiles = ['Cn1ccnc1SCC(=O)Nc1ccc(Oc2ccccc2)cc1',
+                'CN(C)C1(c2nnnn2-c2ccc(Cl)cc2)CCCCC1',
+                'ThisIsaFakeSmileString',
+                'Cc1c(C(=O)Nc2c(C)n(C)n(-c3ccccc3)c2=O)oc2ccccc12',
+                'Cc1cc(N2CCOCC2)n2nc(-c3cccc(F)c3)cc2n1'] * 3
+    df = pd.DataFrame({'smile':smiles})
+    serial = fingerprint.smile_to_fps(df,'smile').Morgan()
+    parallel = fingerprint.smile_to_fps(df,'smile',n_jobs = 2).Morgan()
+    assert list(serial.fingerprint) == list(parallel.fingerprint)
+    serial = fingerprint.smile_to_fps(df,'smile').MACCSkeys()
+    parallel = fingerprint.smile_to_fps(df,'smile',n_jobs = 2).MACCSkeys()
+    assert list(serial.fingerprint) == list(parallel.fingerprint)
+
+def test_fingerprints():
+    '''
+    Several fingerprint types computed in one pass should match the single
+    type methods.
+    '''
+    smiles = ['Cn1ccnc1SCC(=O)Nc1ccc(Oc2ccccc2)cc1',
+                'ThisIsaFakeSmileString',
+                'Cc1cc(N2CCOCC2)n2nc(-c3cccc(F)c3)cc2n1']
+    df = pd.DataFrame({'smile':smiles})
+    fp = fingerprint.smile_to_fps(df,'smile')
+    arrays, mol_fail = fp.fingerprints({'ecfp':('Morgan',{'radius':2,'nBits':512}),
+                                        'maccs':('MACCSkeys',{}),
+                                        'ap':('AtomPair',{})})
+    assert list(mol_fail) == [False, True, False]
+    assert arrays['ecfp'].shape == (3, 512)
+    assert arrays['maccs'].shape == (3, 167)
+    assert arrays['ap'].shape == (3, 2048)
+    assert arrays['ecfp'][1].sum() == 0
+    morgan_fp = fp.Morgan(nBits = 512)
+    assert ["".join(item) for item in arrays['ecfp'].astype(str)] == list(morgan_fp.fingerprint)
+    # input DataFrame is not modified
+    assert list(df.columns) == ['smile']
+
+def test_fingerprints_output():
+    '''
+    All output formats should hold the same fingerprints.
+    '''
+    smiles = ['Cn1ccnc1SCC(=O)Nc1ccc(Oc2ccccc2)cc1',
+                'ThisIsaFakeSmileString',
+                'Cc1cc(N2CCOCC2)n2nc(-c3cccc(F)c3)cc2n1']
+    df = pd.DataFrame({'smile':smiles})
+    fp = fingerprint.smile_to_fps(df,'smile')
+    fp_types = {'ecfp':('Morgan',{'radius':2,'nBits':1024}),
+                'maccs':('MACCSkeys',{})}
+    dense = fp.fingerprints(fp_types)[0]
+    packed = fp.fingerprints(fp_types, 'packed')[0]
+    csr = fp.fingerprints(fp_types, 'csr')[0]
+    onbits = fp.fingerprints(fp_types, 'onbits')[0]
+    for name in fp_types:
+        assert dense[name].dtype == np.uint8
+        assert (packed[name].toarray() == dense[name]).all()
+        assert (csr[name].toarray() == dense[name]).all()
+        for i, bits in enumerate(onbits[name]):
+            assert list(bits) == list(np.where(dense[name][i])[0])
+
+def test_fingerprints_cache():
+    '''
+    Fingerprints fetched from cache should match computed ones, and only
+    new smiles should miss.
+    '''
+    from lightchem.featurize import fingerprint_cache
+    import tempfile
+    import shutil
+    import os
+    smiles = ['Cn1ccnc1SCC(=O)Nc1ccc(Oc2ccccc2)cc1',
+                'ThisIsaFakeSmileString',
+                'Cc1cc(N2CCOCC2)n2nc(-c3cccc(F)c3)cc2n1']
+    fp_types = {'ecfp':('Morgan',{'radius':2,'nBits':1024}),
+                'maccs':('MACCSkeys',{})}
+    df = pd.DataFrame({'smile':smiles})
+    expected, expected_fail = fingerprint.smile_to_fps(df,'smile').fingerprints(fp_types)
+    cache_dir = tempfile.mkdtemp()
+    try:
+        cache = fingerprint_cache.fingerprintCache(os.path.join(cache_dir, 'fp.sqlite'))
+        fp = fingerprint.smile_to_fps(df,'smile',fp_cache = cache)
+        for i in range(2):
+            arrays, mol_fail = fp.fingerprints(fp_types)
+            assert list(mol_fail) == list(expected_fail)
+            for name in fp_types:
+                assert (arrays[name] == expected[name]).all()
+        # Molecules failed are not cached, they miss every time.
+        stats = cache.stats()
+        assert (stats['hits'], stats['misses']) == (4, 8)
+        # Smiles found in the cache are not parsed.
+        parsed = []
+        mol_from_smile = fingerprint._mol_from_smile
+        def counting_mol_from_smile(smile):
+            parsed.append(smile)
+            return mol_from_smile(smile)
+        fingerprint._mol_from_smile = counting_mol_from_smile
+        try:
+            df2 = pd.DataFrame({'smile':smiles + ['CCO']})
+            fingerprint.smile_to_fps(df2,'smile',fp_cache = cache).fingerprints(fp_types)
+            assert sorted(parsed) == ['CCO', 'ThisIsaFakeSmileString']
+            # Another spelling of a cached molecule is found by its canonical
+            # smile, and parsed only once.
+            ethanol = fingerprint.smile_to_fps(pd.DataFrame({'smile':['CCO']}),'smile',
+                                               fp_cache = cache,canonical_key = True)
+            expected = ethanol.fingerprints(fp_types)[0]
+            parsed[:] = []
+            other = fingerprint.smile_to_fps(pd.DataFrame({'smile':['OCC']}),'smile',
+                                             fp_cache = cache,canonical_key = True)
+            arrays, mol_fail = other.fingerprints(fp_types)
+            assert parsed == ['OCC']
+            assert not mol_fail[0]
+            for name in fp_types:
+                assert (arrays[name] == expected[name]).all()
+        finally:
+            fingerprint._mol_from_smile = mol_from_smile
+        cache.close()
+    finally:
+        shutil.rmtree(cache_dir)
+
+def test_stream_fingerprints():
+    '''
+    Fingerprints streamed from .smi and .csv files chunk by chunk should
+    match fingerprints of the whole DataFrame, and be written into stores.
+    '''
+    from lightchem.featurize import fingerprint_stream
+    from lightchem.load import binary_store
+    import tempfile
+    import shutil
+    import os
+    smiles = ['Cn1ccnc1SCC(=O)Nc1ccc(Oc2ccccc2)cc1',
+                'ThisIsaFakeSmileString',
+                'Cc1cc(N2CCOCC2)n2nc(-c3cccc(F)c3)cc2n1',
+                'CCO',
+                'CCN']
+    fp_types = {'ecfp':('Morgan',{'radius':2,'nBits':1024}),
+                'maccs':('MACCSkeys',{})}
+    df = pd.DataFrame({'smiles':smiles,'name':['m' + str(i) for i in range(5)],
+                       'label':[1.0, 0.0, 0.0, 1.0, 0.0]})
+    expected, expected_fail = fingerprint.smile_to_fps(df,'smiles').fingerprints(fp_types)
+    file_dir = tempfile.mkdtemp()
+    try:
+        smi_path = os.path.join(file_dir, 'lib.smi')
+        with open(smi_path, 'w') as f:
+            f.write('smiles name\n')
+            for smile, name in zip(df.smiles, df.name):
+                f.write(smile + ' ' + name + '\n')
+        csv_path = os.path.join(file_dir, 'lib.csv')
+        df.to_csv(csv_path, index = False)
+        for path, id_col_name in [(smi_path, None), (csv_path, 'name')]:
+            batches = list(fingerprint_stream.stream_fingerprints(
+                path, fp_types, chunksize = 2, id_col_name = id_col_name))
+            assert [len(batch[0]) for batch in batches] == [2, 2, 1]
+            assert list(np.concatenate([batch[0] for batch in batches])) == list(df.name)
+            mol_fail = np.concatenate([batch[2] for batch in batches])
+            assert list(mol_fail) == list(expected_fail)
+            for name in fp_types:
+                arrays = np.concatenate([batch[1][name] for batch in batches])
+                assert (arrays == expected[name]).all()
+        # Some lines without name, ids of every batch come from the file.
+        partial_path = os.path.join(file_dir, 'partial.smi')
+        with open(partial_path, 'w') as f:
+            for i, smile in enumerate(df.smiles):
+                f.write(smile + (' ' + df.name[i] if i in [0, 4] else '') + '\n')
+        for chunksize in [1, 2]:
+            batches = list(fingerprint_stream.read_molecule_chunks(
+                partial_path, chunksize = chunksize))
+            ids = np.concatenate([np.array(batch['id']) for batch in batches])
+            assert list(ids) == ['m0', '1', '2', '3', 'm4']
+        store_dirs = fingerprint_stream.fingerprints_to_store(
+            csv_path, fp_types, os.path.join(file_dir, 'store'), chunksize = 2,
+            label_names = ['label'])
+        for name in fp_types:
+            store = binary_store.binaryStore(store_dirs[name])
+            assert list(store.index()) == [0, 2, 3, 4]
+            assert list(store.label('label')) == [1.0, 0.0, 1.0, 0.0]
+            assert (store.features().toarray() == expected[name][[0, 2, 3, 4]]).all()
+        # A failed run leaves no readable store behind.
+        try:
+            fingerprint_stream.fingerprints_to_store(
+                csv_path, fp_types, os.path.join(file_dir, 'store'), chunksize = 2,
+                label_names = ['missing'])
+        except ValueError:
+            pass
+        for name in fp_types:
+            assert not binary_store.is_store(store_dirs[name])
+    finally:
+        shutil.rmtree(file_dir)
+
+def test_deduplicate():
+    '''
+    Duplicate compounds and salts should collapse into one row with
+    aggregated labels and multiplicity.
+    '''
+    from lightchem.featurize import deduplicate
+    df = pd.DataFrame({'smile':['CCO', 'OCC', 'ThisIsaFakeSmileString',
+                                'CCN', 'CCO.Cl', 'CCN'],
+                       'label':[0.0, 1.0, 1.0, 0.0, np.nan, 0.0]})
+    unique_df, row_map = deduplicate.deduplicate(df, 'smile', ['label'])
+    fp = fingerprint.smile_to_fps(df, 'smile')
+    canonical = fp.canonical_smiles(strip_salts = True)
+    assert list(unique_df.columns) == ['smile', 'label', 'multiplicity']
+    assert row_map[2] == -1
+    for i in [0, 1, 3, 4, 5]:
+        assert unique_df.smile[row_map[i]] == canonical[i]
+    assert row_map[0] == row_map[4]
+    assert row_map[3] == row_map[5]
+    assert unique_df.multiplicity.sum() == 5
+    for i in range(len(unique_df)):
+        rows = np.where(row_map == i)[0]
+        assert unique_df.multiplicity[i] == len(rows)
+        assert unique_df.label[i] == df.label[rows].max()
+    unique_df, row_map = deduplicate.deduplicate(df, 'smile', ['label'],
+                                                 rule = 'mean', strip_salts = False)
+    assert row_map[0] != row_map[4]
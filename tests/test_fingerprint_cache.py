@@ -0,0 +1,43 @@
+'''
+Test featurize.fingerprint_cache.fingerprintCache
+'''
+from lightchem.featurize import fingerprint_cache
+import numpy as np
+import tempfile
+import shutil
+import os
+
+def test_fingerprintCache():
+    '''
+    Cached fingerprints should be returned in bulk, hits and misses counted,
+    and least recently used entries evicted beyond max_entries.
+    '''
+    cache_dir = tempfile.mkdtemp()
+    try:
+        cache_path = os.path.join(cache_dir, 'fp.sqlite')
+        key = fingerprint_cache.fingerprint_key('Morgan', {'radius':2, 'nBits':1024})
+        assert key == 'Morgan(nBits=1024,radius=2)'
+        cache = fingerprint_cache.fingerprintCache(cache_path, max_entries = 3)
+        assert cache.get_many(['CCO', 'c1ccccc1'], key) == {}
+        cache.put_many(key, {'CCO':np.array([1, 5]), 'c1ccccc1':np.array([], dtype = int)})
+        found = cache.get_many(['CCO', 'c1ccccc1', 'CCN'], key)
+        assert sorted(found) == ['CCO', 'c1ccccc1']
+        assert list(found['CCO']) == [1, 5]
+        assert len(found['c1ccccc1']) == 0
+        # other fingerprint types are cached separately
+        assert cache.get_many(['CCO'], 'MACCSkeys()') == {}
+        stats = cache.stats()
+        assert (stats['hits'], stats['misses'], stats['num_entry']) == (2, 4, 2)
+        cache.get_many(['CCO'], key)
+        cache.put_many(key, {'CCN':np.array([2]), 'CCC':np.array([3])})
+        # c1ccccc1 is least recently used
+        assert cache.stats()['num_entry'] == 3
+        cache.close()
+        cache = fingerprint_cache.fingerprintCache(cache_path, max_entries = 3)
+        assert sorted(cache.get_many(['CCO', 'c1ccccc1', 'CCN', 'CCC'], key)) == \
+            ['CCC', 'CCN', 'CCO']
+        cache.clear()
+        assert cache.stats()['num_entry'] == 0
+        cache.close()
+    finally:
+        shutil.rmtree(cache_dir)
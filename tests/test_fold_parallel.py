@@ -0,0 +1,43 @@
+'''
+Test training cross validation folds concurrently.
+'''
+from lightchem.data import xgb_data
+from lightchem.fold import fold
+from lightchem.model import first_layer_model
+from lightchem.model import fold_parallel
+import numpy as np
+
+def test_fold_param():
+    '''
+    nthread should be divided among folds trained at once.
+    '''
+    assert fold_parallel.num_jobs(8, 3) == 3
+    assert fold_parallel.num_jobs(None, 3) == 1
+    param = {'nthread':8, 'eta':0.1}
+    assert fold_parallel.fold_param(param, 3)['nthread'] == 2
+    assert fold_parallel.fold_param(param, 1) == param
+    assert fold_parallel.fold_param({'nthread':2}, 4)['nthread'] == 1
+    assert param['nthread'] == 8
+
+def test_xgb_cv_n_jobs():
+    '''
+    Folds trained at once should give the same models as one by one.
+    '''
+    np.random.seed(2017)
+    X_data = np.random.binomial(1, 0.2, (200, 30)).astype(np.float64)
+    y_data = (X_data[:, 0] + X_data[:, 1] + np.random.binomial(1, 0.1, 200) > 1).astype(np.float64)
+    myfold = fold.fold(X_data, y_data, 4).generate_foldIndex()
+    data = xgb_data.xgbData(myfold, X_data, y_data)
+    data.build()
+    for model_type in ['GbtreeLogistic', 'GblinearLogistic']:
+        holdout = []
+        for n_jobs in [1, 3]:
+            model = first_layer_model.firstLayerModel(data, 'ROCAUC', model_type, 'model')
+            param, maximize, stopping_round = model.get_param()
+            param['nthread'] = 1
+            model.update_param(param, maximize, 5)
+            model.xgb_cv(n_jobs)
+            model.generate_holdout_pred()
+            holdout.append(model.get_holdout())
+            assert model.get_param()[0]['nthread'] == 1
+        assert (holdout[0] == holdout[1]).all()
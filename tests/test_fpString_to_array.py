@@ -1,8 +1,9 @@
 '''
-Test utility.util.fpString_to_array
+Test utility.util fingerprint string conversion
 '''
 from lightchem.utility import util
 import pandas as pd
+import numpy as np
 
 def test_fpString_to_array():
     fp = pd.Series(['11010','01001'])
@@ -10,3 +11,28 @@ def test_fpString_to_array():
     assert len(fp) == len(fp_array)
     for i,item in enumerate(fp):
         assert len(item) == len(fp_array[i])
+
+def test_fpString_to_array_fast():
+    fp = pd.Series(['11010','01001','00000'])
+    fp_array = util.fpString_to_array(fp)
+    fp_array_fast = util.fpString_to_array_fast(fp)
+    assert fp_array_fast.dtype == fp_array.dtype
+    assert (fp_array_fast == fp_array).all()
+    fp_sep = pd.Series(['1|1|0|1|0','0|1|0|0|1','0|0|0|0|0'])
+    assert (util.fpString_to_array_fast(fp_sep, "|") == fp_array).all()
+    # multi-character value falls back to the original parser
+    fp_count = pd.Series(['12|0|3','0|1|0'])
+    assert (util.fpString_to_array_fast(fp_count, "|") ==
+            util.fpString_to_array(fp_count, "|")).all()
+
+def test_array_to_fpString_fast():
+    np.random.seed(2017)
+    fp_array = np.random.binomial(1, 0.3, (20, 9))
+    assert util.array_to_fpString_fast(fp_array) == util.array_to_fpString(fp_array)
+    assert (util.array_to_fpString_fast(fp_array, '|') ==
+            util.array_to_fpString(fp_array, '|'))
+    assert (util.array_to_fpString_fast(fp_array.astype(np.uint8)) ==
+            util.array_to_fpString(fp_array))
+    float_array = fp_array.astype(np.float64)
+    assert (util.array_to_fpString_fast(float_array) ==
+            util.array_to_fpString(float_array))
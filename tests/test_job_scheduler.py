@@ -0,0 +1,23 @@
+'''
+Test ensemble.job_scheduler.jobScheduler
+'''
+from lightchem.ensemble import job_scheduler
+import time
+
+def test_jobScheduler():
+    '''
+    Results should be in submission order whichever job finishes first, and
+    threads divided among running jobs.
+    '''
+    scheduler = job_scheduler.jobScheduler(n_jobs = 3, nthread = 8)
+    assert scheduler.job_nthread() == 2
+    def make_job(i):
+        def job():
+            time.sleep(0.01 * (5 - i))
+            return i
+        return job
+    jobs = [('job' + str(i), make_job(i)) for i in range(5)]
+    assert scheduler.run(jobs) == range(5)
+    assert [name for name, _ in scheduler.wall_time()] == ['job' + str(i) for i in range(5)]
+    assert len(scheduler.report().split('\n')) == 5
+    assert job_scheduler.jobScheduler(n_jobs = 1, nthread = 4).job_nthread() == 4
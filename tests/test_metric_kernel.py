@@ -0,0 +1,42 @@
+"""
+Unit-test for metric_kernel, metrics should be the same as util ones.
+"""
+import numpy as np
+from lightchem.utility import util
+from lightchem.utility.metric_kernel import metricKernel
+
+np.random.seed(2017)
+bin_labels = np.random.binomial(1,0.1,2000).astype(np.float64)
+# Few unique predictions, like early boosting rounds of small trees.
+tied_pred = np.random.randint(0,50,2000) / 50.0
+cont_pred = np.random.normal(0.5,0.2,2000)
+
+def test_enrichment_factor():
+    perc_vec = np.linspace(0.001, .25, 10)
+    for pred in [tied_pred,cont_pred]:
+        kernel = metricKernel(bin_labels, pred)
+        assert np.array_equal(kernel.enrichment_factor(perc_vec),
+                              util.enrichment_factor(bin_labels, pred, perc_vec))
+        assert kernel.nef_auc(perc_vec) == util.nef_auc(bin_labels, pred, perc_vec)
+
+def test_curves():
+    for pred in [tied_pred,cont_pred]:
+        kernel = metricKernel(bin_labels, pred)
+        assert kernel.num_unique() == len(np.unique(pred))
+        assert kernel.roc_auc() == util.ROC_auc(bin_labels, pred)
+        assert kernel.pr_auc() == util.PRC_auc(bin_labels, pred)
+        assert kernel.avg_precision() == util.avg_precision(bin_labels, pred)
+
+def test_reliability_score():
+    kernel = metricKernel(bin_labels, cont_pred)
+    assert np.isclose(kernel.reliability_score(20),
+                      util.reliability_score(bin_labels, cont_pred, 20))
+
+def test_one_class():
+    kernel = metricKernel(np.zeros(100), cont_pred[:100])
+    assert np.isnan(kernel.enrichment_factor(np.array([0.01]))).all()
+    try:
+        kernel.roc_auc()
+        assert False
+    except ValueError:
+        pass
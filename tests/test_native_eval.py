@@ -0,0 +1,73 @@
+"""
+Unit-test for native_eval
+"""
+import os
+import numpy as np
+import pandas as pd
+import xgboost as xgb
+from lightchem.eval import native_eval
+from lightchem.eval import defined_eval
+from lightchem.eval import xgb_eval
+from lightchem.load import load
+from lightchem.model import defined_model
+
+np.random.seed(2017)
+x = np.random.rand(200,5)
+y_bin = np.random.binomial(1,0.5,200).astype(float)
+y_cont = y_bin * np.random.randint(1,10,200)
+
+def test_offload_auc():
+    dtrain = xgb.DMatrix(x,label = y_cont)
+    metric, evals = native_eval.offload('ROCAUC_0',{'objective':'reg:linear'},
+                                        [(dtrain,'train')])
+    assert metric == 'auc'
+    assert np.array_equal(evals[0][0].get_label(),y_bin)
+    # Original DMatrix keeps its continuous labels.
+    assert np.array_equal(dtrain.get_label(),y_cont)
+    # The binary copy is reused until labels change.
+    assert native_eval.offload('ROCAUC_0',{},[(dtrain,'train')])[1][0][0] is evals[0][0]
+    dtrain.set_label(y_cont[::-1].copy())
+    xgb_eval.clear_eval_context(dtrain)
+    copy = native_eval.binary_copy(dtrain,0)
+    assert not copy is evals[0][0]
+    assert np.array_equal(copy.get_label(),y_bin[::-1])
+
+def test_offload_same_best_iteration():
+    '''
+    Early stopping on native auc should pick the same round as custom ROCAUC.
+    '''
+    dir_path = os.path.dirname(os.path.realpath(__file__))
+    muv = pd.read_csv(os.path.join(dir_path,
+                                   'test_datasets/muv_sample/muv466_macckey.csv.zip'))
+    data = load.readData(muv,'MUV-466')
+    data.read()
+    X_data = data.features()
+    y_data = data.label()
+    index = np.r_[np.where(y_data == 1)[0],np.arange(1000)]
+    np.random.seed(2016)
+    np.random.shuffle(index)
+    train_index, validate_index = index[:len(index) * 2 / 3], index[len(index) * 2 / 3:]
+    dtrain = xgb.DMatrix(X_data[train_index],label = y_data[train_index])
+    dvalidate = xgb.DMatrix(X_data[validate_index],label = y_data[validate_index])
+    param = defined_model.definedModel().model_param('GblinearLogistic')
+    param['nthread'] = 1
+    watchlist = [(dvalidate,'eval')]
+    custom = xgb.train(param,dtrain,300,watchlist,
+                       feval = defined_eval.definedEvaluation().eval_function('ROCAUC'),
+                       early_stopping_rounds = 10,maximize = True,verbose_eval = False)
+    native_param = dict(param)
+    native_param['eval_metric'], watchlist = native_eval.offload('ROCAUC',param,watchlist)
+    native = xgb.train(native_param,dtrain,300,watchlist,
+                       early_stopping_rounds = 10,maximize = True,verbose_eval = False)
+    assert custom.best_iteration < 299
+    assert native.best_iteration == custom.best_iteration
+
+def test_offload_fallback():
+    dtrain = xgb.DMatrix(x,label = y_bin)
+    param = {'objective':'binary:logistic'}
+    assert native_eval.offload('PRAUC',param,[(dtrain,'eval')]) is None
+    assert native_eval.offload('Logloss',param,[(dtrain,'eval')]) is None
+    one_class = xgb.DMatrix(x,label = np.zeros(200))
+    assert native_eval.offload('ROCAUC',param,[(one_class,'eval')]) is None
+    weighted = xgb.DMatrix(x,label = y_bin,weight = np.ones(200))
+    assert native_eval.offload('ROCAUC',param,[(weighted,'eval')]) is None
@@ -0,0 +1,53 @@
+'''
+Test data.packed_fingerprint.packedFingerprint
+'''
+from lightchem.data.packed_fingerprint import packedFingerprint
+from lightchem.data import xgb_data
+from lightchem.fold import fold
+from lightchem.utility import util
+import pandas as pd
+import numpy as np
+
+def test_packedFingerprint():
+    np.random.seed(2017)
+    fp_array = np.random.binomial(1, 0.1, (50, 13))
+    fp_col = pd.Series(["".join(item) for item in fp_array.astype(str)])
+    packed = packedFingerprint.from_fpString(fp_col, chunk_size = 7)
+    assert packed.shape == (50, 13)
+    assert packed.nbytes == 50 * 2
+    assert (packed.toarray() == fp_array).all()
+    assert (packedFingerprint.from_array(fp_array).packed() == packed.packed()).all()
+    # row selection
+    index = [3, 0, 49, 3]
+    assert (packed[index].toarray() == fp_array[index]).all()
+    assert (packed[fp_array[:,0] == 1].toarray() == fp_array[fp_array[:,0] == 1]).all()
+    assert (packed[10:20].toarray() == fp_array[10:20]).all()
+    # unpack to csr and dense blocks
+    assert (packed.tocsr(block_size = 7).toarray() == fp_array).all()
+    blocks = list(packed.dense_blocks(block_size = 20))
+    assert len(blocks) == 3
+    assert (np.concatenate(blocks) == fp_array).all()
+    mark = 0
+    try:
+        packedFingerprint.from_array(fp_array * 2)
+    except ValueError:
+        mark = 1
+    assert mark == 1
+
+def test_packedFingerprint_xgbData():
+    np.random.seed(2017)
+    fp_array = np.random.binomial(1, 0.1, (60, 20))
+    label = np.array([1.0] * 12 + [0.0] * 48)
+    myfold = fold.fold(fp_array, label, 3).generate_skfolds()
+    packed = packedFingerprint.from_array(fp_array)
+    dense_data = xgb_data.xgbData(myfold, fp_array.astype(np.float64), label)
+    packed_data = xgb_data.xgbData(myfold, packed, label)
+    dense_data.build()
+    packed_data.build()
+    for i in range(dense_data.numberOfTrainFold()):
+        for j in range(2):
+            assert (dense_data.get_dtrain(i)[j].get_label() ==
+                    packed_data.get_dtrain(i)[j].get_label()).all()
+            assert (dense_data.get_dtrain(i)[j].num_row() ==
+                    packed_data.get_dtrain(i)[j].num_row())
+    assert packed_data.num_feature() == 20
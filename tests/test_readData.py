@@ -0,0 +1,128 @@
+'''
+Test load.readData
+'''
+from lightchem.load import load
+from lightchem.load import binary_store
+from lightchem.data.packed_fingerprint import packedFingerprint
+import pandas as pd
+import numpy as np
+import os
+import tempfile
+import shutil
+import scipy.sparse
+
+def test_readData_chunksize():
+    '''
+    Streaming a csv file in chunks should give the same features and label.
+    '''
+    np.random.seed(2017)
+    fp_array = np.random.binomial(1, 0.2, (23, 12))
+    df = pd.DataFrame({'fingerprint':["".join(item) for item in fp_array.astype(str)],
+                       'label':np.random.binomial(1, 0.5, 23)})
+    result_dir = tempfile.mkdtemp()
+    file_dir = os.path.join(result_dir, 'fp.csv')
+    df.to_csv(file_dir, index = False)
+    for feature_format in ['dense', 'packed']:
+        data = load.readData(file_dir, 'label', feature_format, chunksize = 5)
+        data.read()
+        X_data = data.features()
+        if feature_format == 'packed':
+            X_data = X_data.toarray()
+        else:
+            assert X_data.dtype == np.float64
+        assert X_data.shape == (23, 12)
+        assert (X_data == fp_array).all()
+        assert (data.label() == df.label).all()
+    # Feature_ columns
+    feature_df = pd.DataFrame(fp_array * 0.5,
+                              columns = ['Feature_' + str(i) for i in range(12)])
+    feature_df.to_csv(file_dir, index = False)
+    data = load.readData(file_dir, chunksize = 10)
+    data.read()
+    assert (data.features() == fp_array * 0.5).all()
+    shutil.rmtree(result_dir)
+
+def test_readData_binary_store():
+    '''
+    Features and label read from a binary store should match the csv.
+    '''
+    np.random.seed(2017)
+    fp_array = np.random.binomial(1, 0.2, (23, 12))
+    df = pd.DataFrame({'fingerprint':["".join(item) for item in fp_array.astype(str)],
+                       'label1':np.random.binomial(1, 0.5, 23),
+                       'label2':np.random.normal(0, 1, 23)})
+    result_dir = tempfile.mkdtemp()
+    file_dir = os.path.join(result_dir, 'fp.csv')
+    df.to_csv(file_dir, index = False)
+    store_dir = binary_store.csv_to_store(file_dir, chunksize = 10)
+    assert store_dir == os.path.join(result_dir, 'fp_store')
+    assert binary_store.store_or_csv(file_dir) == store_dir
+    store = binary_store.binaryStore(store_dir)
+    assert sorted(store.label_names()) == ['label1', 'label2']
+    assert (store.index() == np.arange(23)).all()
+    for label_name in ['label1', 'label2']:
+        data = load.readData(store_dir, label_name, 'packed')
+        data.read()
+        assert (data.features().toarray() == fp_array).all()
+        assert (data.label() == pd.read_csv(file_dir)[label_name]).all()
+    data = load.readData(store_dir)
+    data.read()
+    assert data.features().dtype == np.float64
+    assert (data.features() == fp_array).all()
+    shutil.rmtree(result_dir)
+
+def test_readData_csr():
+    '''
+    csr features should hold the same values as dense features, whether read
+    from a DataFrame, csv chunks or a binary store.
+    '''
+    np.random.seed(2017)
+    fp_array = np.random.binomial(1, 0.2, (23, 12))
+    df = pd.DataFrame({'fingerprint':["".join(item) for item in fp_array.astype(str)],
+                       'label':np.random.binomial(1, 0.5, 23)})
+    result_dir = tempfile.mkdtemp()
+    file_dir = os.path.join(result_dir, 'fp.csv')
+    df.to_csv(file_dir, index = False)
+    store_dir = binary_store.csv_to_store(file_dir)
+    for data in [load.readData(df, 'label', 'csr'),
+                 load.readData(file_dir, 'label', 'csr', chunksize = 5),
+                 load.readData(store_dir, 'label', 'csr')]:
+        data.read()
+        X_data = data.features()
+        assert scipy.sparse.isspmatrix_csr(X_data)
+        assert X_data.nnz == fp_array.sum()
+        assert (X_data.toarray() == fp_array).all()
+        assert (data.label() == df.label).all()
+    feature_df = pd.DataFrame(fp_array * 0.5,
+                              columns = ['Feature_' + str(i) for i in range(12)])
+    data = load.readData(feature_df, feature_format = 'csr')
+    data.read()
+    assert (data.features().toarray() == fp_array * 0.5).all()
+    shutil.rmtree(result_dir)
+
+def test_readData_features():
+    '''
+    A feature matrix, such as fingerprints from smile_to_fps, can be passed
+    directly instead of fingerprint strings.
+    '''
+    np.random.seed(2017)
+    fp_array = np.random.binomial(1, 0.2, (23, 12)).astype(np.uint8)
+    df = pd.DataFrame({'label':np.random.binomial(1, 0.5, 23)})
+    packed = packedFingerprint.from_array(fp_array)
+    for X_data in [fp_array, packed, scipy.sparse.csr_matrix(fp_array)]:
+        for feature_format in ['dense', 'packed', 'csr']:
+            data = load.readData(df, 'label', feature_format, features = X_data)
+            data.read()
+            X_out = data.features()
+            if feature_format == 'packed':
+                assert isinstance(X_out, packedFingerprint)
+                X_out = X_out.toarray()
+            elif feature_format == 'csr':
+                assert scipy.sparse.isspmatrix_csr(X_out)
+                X_out = X_out.toarray()
+            assert (X_out == fp_array).all()
+            assert (data.label() == df.label).all()
+        # Without label
+        data = load.readData(X_data, feature_format = 'csr')
+        data.read()
+        assert (data.features().toarray() == fp_array).all()
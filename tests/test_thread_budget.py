@@ -0,0 +1,36 @@
+'''
+Test utility.thread_budget
+'''
+from lightchem.utility import thread_budget
+import numpy as np
+import pytest
+import multiprocessing
+
+def test_threadBudget():
+    '''
+    Threads should be shared among running jobs, at least one each.
+    '''
+    cores = thread_budget.usable_cores()
+    assert 1 <= cores <= multiprocessing.cpu_count()
+    assert thread_budget.threadBudget(-1).nthread() == cores
+    assert thread_budget.threadBudget(None).nthread() == cores
+    budget = thread_budget.threadBudget(8)
+    assert budget.share(3) == 2
+    assert budget.share(16) == 1
+    assert budget.split(2).nthread() == 4
+
+def test_blas_limit():
+    '''
+    Loaded BLAS libraries should use nthread threads inside the outermost
+    context only, and their own thread count after.
+    '''
+    np.dot(np.ones((2,2)),np.ones((2,2)))
+    before = thread_budget.blas_threads()
+    if not before:
+        pytest.skip('numpy is not linked against OpenBLAS or MKL')
+    nthread = max(before) + 2
+    with thread_budget.blas_limit(nthread):
+        assert thread_budget.blas_threads() == [nthread] * len(before)
+        with thread_budget.blas_limit(1):
+            assert thread_budget.blas_threads() == [nthread] * len(before)
+    assert thread_budget.blas_threads() == before
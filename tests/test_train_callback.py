@@ -0,0 +1,93 @@
+'''
+Test model.train_callback
+'''
+from lightchem.model import train_callback
+import numpy as np
+import xgboost as xgb
+
+def test_bestSnapshot():
+    '''
+    Booster restored from snapshot should predict the same as retraining
+    best_ntree_limit rounds.
+    '''
+    np.random.seed(2017)
+    X_data = np.random.normal(0, 1, (300, 10))
+    y_data = (X_data[:, 0] + np.random.normal(0, 2, 300) > 0).astype(np.float64)
+    dtrain = xgb.DMatrix(X_data[:200], label = y_data[:200])
+    dvalidate = xgb.DMatrix(X_data[200:], label = y_data[200:])
+    param = {'booster':'gblinear', 'objective':'binary:logistic', 'eta':0.5,
+             'eval_metric':'logloss', 'nthread':1, 'silent':1}
+    watchlist = [(dtrain, 'train'), (dvalidate, 'eval')]
+    snapshot = train_callback.bestSnapshot()
+    bst = xgb.train(param, dtrain, 100, watchlist, early_stopping_rounds = 5,
+                    verbose_eval = False, callbacks = [snapshot])
+    assert bst.best_iteration < 99
+    best = snapshot.best_booster(bst, 1)
+    assert best.best_score == bst.best_score
+    assert best.best_ntree_limit == bst.best_ntree_limit
+    retrain = xgb.train(param, dtrain, bst.best_ntree_limit, verbose_eval = False)
+    assert (best.predict(dvalidate) == retrain.predict(dvalidate)).all()
+
+def test_trainMetric():
+    '''
+    Training data is evaluated every `every` rounds without changing early
+    stopping driven by the validation data.
+    '''
+    np.random.seed(2017)
+    X_data = np.random.normal(0, 1, (300, 10))
+    y_data = (X_data[:, 0] + np.random.normal(0, 2, 300) > 0).astype(np.float64)
+    dtrain = xgb.DMatrix(X_data[:200], label = y_data[:200])
+    dvalidate = xgb.DMatrix(X_data[200:], label = y_data[200:])
+    param = {'objective':'binary:logistic', 'eval_metric':'auc',
+             'max_depth':2, 'nthread':1, 'silent':1}
+    both = xgb.train(param, dtrain, 20, [(dtrain, 'train'), (dvalidate, 'eval')],
+                     early_stopping_rounds = 5, verbose_eval = False)
+    train_metric = train_callback.trainMetric(dtrain, 3, verbose = False)
+    eval_only = xgb.train(param, dtrain, 20, [(dvalidate, 'eval')],
+                          early_stopping_rounds = 5, verbose_eval = False,
+                          callbacks = [train_metric])
+    assert eval_only.best_iteration == both.best_iteration
+    assert eval_only.best_score == both.best_score
+    history = train_metric.history()
+    assert history[0][0] == 0
+    assert all(iteration % 3 == 0 for iteration,_ in history)
+    assert all('train-auc' in message for _,message in history)
+    # Custom metric replaces auc, which fails on continuous labels.
+    dtrain.set_label(y_data[:200] * 2)
+    feval = lambda preds, dtrain: ('positive', np.sum(dtrain.get_label() > 0))
+    train_metric = train_callback.trainMetric(dtrain, 3, feval, verbose = False)
+    param['objective'] = 'reg:linear'
+    xgb.train(param, dtrain, 4, [(dvalidate, 'eval')], verbose_eval = False,
+              callbacks = [train_metric])
+    assert train_metric.history() == [(0, '[0]\ttrain-positive:%f' % np.sum(y_data[:200])),
+                                      (3, '[3]\ttrain-positive:%f' % np.sum(y_data[:200]))]
+
+def test_firstRound():
+    '''
+    Lock of dtrain is held during the first round only, and released if
+    training fails.
+    '''
+    np.random.seed(2017)
+    X_data = np.random.normal(0, 1, (100, 5))
+    dtrain = xgb.DMatrix(X_data, label = (X_data[:, 0] > 0).astype(np.float64))
+    param = {'booster':'gblinear', 'objective':'binary:logistic', 'nthread':1,
+             'silent':1}
+    first_round = train_callback.firstRound(dtrain)
+    other = train_callback.firstRound(dtrain)
+    held = []
+    def check(env):
+        # The other booster sharing dtrain cannot start its first round.
+        held.append(other._firstRound__lock.acquire(False))
+        if held[-1]:
+            other._firstRound__lock.release()
+    xgb.train(param, dtrain, 3, callbacks = [check] + first_round.callbacks())
+    assert held == [False, True, True]
+    def fail(env):
+        raise ValueError('fail')
+    first_round = train_callback.firstRound(dtrain)
+    try:
+        xgb.train(param, dtrain, 3, callbacks = first_round.callbacks() + [fail])
+        assert False
+    except ValueError:
+        first_round.release()
+    assert other._firstRound__lock.acquire(False)
@@ -0,0 +1,237 @@
+'''
+Test data.xgb_data.xgbData
+'''
+from lightchem.data import xgb_data
+from lightchem.data import dmatrix_cache
+from lightchem.eval import xgb_eval
+from lightchem.eval import native_eval
+from lightchem.fold import fold
+import numpy as np
+import tempfile
+import shutil
+
+def test_xgbData_fold_slices():
+    '''
+    Fold and test DMatrix sliced from the master DMatrix should hold the rows
+    given by fold index.
+    '''
+    np.random.seed(2017)
+    X_data = np.random.binomial(1, 0.1, (60, 20)).astype(np.float64)
+    label = np.arange(60, dtype = np.float64)
+    y_data = np.array([1.0] * 12 + [0.0] * 48)
+    myfold = fold.fold(X_data, y_data, 4).generate_skfolds()
+    data = xgb_data.xgbData(myfold, X_data, label)
+    data.build()
+    test_index = np.where(myfold.iloc[:, 3] == 1)[0]
+    assert (data.get_dtest().get_label() == test_index).all()
+    train_folds = data.get_train_fold()
+    train_index = np.where(myfold.iloc[:, 3] != 1)[0]
+    for i in range(data.numberOfTrainFold()):
+        dtrain, dvalidate = data.get_dtrain(i)
+        assert (dtrain.get_label() ==
+                train_index[np.array(train_folds.iloc[:, i] == 0)]).all()
+        assert (dvalidate.get_label() ==
+                train_index[np.array(train_folds.iloc[:, i] == 1)]).all()
+        assert dtrain.num_col() == 20
+    data = xgb_data.xgbData(myfold, X_data, label, createTestset = False)
+    data.build()
+    assert data.numberOfTrainFold() == 4
+    for i in range(4):
+        assert (data.get_dtrain(i)[1].get_label() ==
+                np.where(myfold.iloc[:, i] == 1)[0]).all()
+
+def test_xgbData_fold_cache():
+    '''
+    Folds are built on first request and evicted by the LRU memory cap.
+    '''
+    np.random.seed(2017)
+    X_data = np.random.binomial(1, 0.1, (60, 20)).astype(np.float64)
+    y_data = np.array([1.0] * 12 + [0.0] * 48)
+    myfold = fold.fold(X_data, y_data, 4).generate_skfolds()
+    cache = xgb_data.foldCache()
+    data = xgb_data.xgbData(myfold, X_data, y_data, fold_cache = cache)
+    data.build()
+    assert len(cache) == 0
+    fold0 = data.get_dtrain(0)
+    assert data.get_dtrain(0) is fold0
+    fold1 = data.get_dtrain(1)
+    assert len(cache) == 2
+    # Cap below two folds, only the most recently used fold stays.
+    cache.set_max_bytes(cache.nbytes() - 1)
+    assert len(cache) == 1
+    assert data.get_dtrain(1) is fold1
+    rebuilt = data.get_dtrain(0)
+    assert rebuilt is not fold0
+    assert (rebuilt[1].get_label() == fold0[1].get_label()).all()
+    assert len(cache) == 1
+    del data
+    cache.get(cache, 'other', lambda: 1, 0)
+    assert len(cache) == 1
+
+def test_xgbData_disk_cache():
+    '''
+    A second xgbData on the same data and folds should load every DMatrix
+    from the disk cache.
+    '''
+    np.random.seed(2017)
+    X_data = np.random.binomial(1, 0.1, (60, 20)).astype(np.float64)
+    y_data = np.array([1.0] * 12 + [0.0] * 48)
+    myfold = fold.fold(X_data, y_data, 4).generate_skfolds()
+    cache_dir = tempfile.mkdtemp()
+    disk_cache = dmatrix_cache.dmatrixCache(cache_dir)
+    collect = []
+    for i in range(2):
+        data = xgb_data.xgbData(myfold, X_data, y_data,
+                                fold_cache = xgb_data.foldCache(),
+                                disk_cache = disk_cache)
+        data.build()
+        collect.append([data.get_dtrain(j) for j in range(3)] + [data.get_dtest()])
+    stats = disk_cache.stats()
+    # row bytes, 3 folds of train and validate, and test
+    assert stats['misses'] == 8
+    assert stats['hits'] == 8
+    assert stats['num_file'] == 8
+    for first, second in zip(collect[0][:3], collect[1][:3]):
+        for j in range(2):
+            assert (first[j].get_label() == second[j].get_label()).all()
+            assert first[j].num_col() == second[j].num_col()
+    # Size cap keeps only the most recently written file.
+    disk_cache = dmatrix_cache.dmatrixCache(cache_dir, max_bytes = 1)
+    data = xgb_data.xgbData(myfold, X_data * 2, y_data,
+                            fold_cache = xgb_data.foldCache(),
+                            disk_cache = disk_cache)
+    data.build()
+    assert disk_cache.stats()['num_file'] == 1
+    shutil.rmtree(cache_dir)
+
+def test_foldIndex():
+    '''
+    foldIndex should match the legacy fold DataFrame.
+    '''
+    np.random.seed(2017)
+    y_data = np.array([1.0] * 12 + [0.0] * 48)
+    myfold = fold.fold(np.zeros((60, 3)), y_data, 4)
+    folds = myfold.generate_foldIndex()
+    legacy = myfold.generate_skfolds()
+    assert folds.fold_id().dtype == np.int8
+    assert (folds.to_DataFrame() == legacy).all().all()
+    converted = fold.foldIndex.from_DataFrame(legacy)
+    assert (converted.fold_id() == folds.fold_id()).all()
+    for i in range(4):
+        assert (folds.validate_index(i) == np.where(legacy.iloc[:, i] == 1)[0]).all()
+        assert (folds.train_index(i) == np.where(legacy.iloc[:, i] == 0)[0]).all()
+        # Fold index arrays are cached and read-only.
+        assert folds.train_index(i) is folds.train_index(i)
+        assert folds.validate_index(i) is folds.validate_index(i)
+        assert not folds.train_index(i).flags.writeable
+        assert not folds.validate_index(i).flags.writeable
+    assert (folds.train_index(-1) == folds.train_index(3)).all()
+    # Rows outside every validation set are always used for training.
+    subset = folds.subset(folds.train_index(3), 3)
+    assert subset.num_row() == 60 - len(folds.validate_index(3))
+    assert (subset.index() == folds.train_index(3)).all()
+    data = xgb_data.xgbData(legacy, np.zeros((60, 3)), y_data)
+    data.build()
+    assert (data.get_train_fold() == legacy.iloc[folds.train_index(3).copy(), :3]).all().all()
+
+def test_xgbData_with_label():
+    '''
+    xgbData from with_label should share fold DMatrix and switch their label.
+    '''
+    np.random.seed(2017)
+    X_data = np.random.binomial(1, 0.1, (60, 20)).astype(np.float64)
+    y_data = np.array([1.0] * 12 + [0.0] * 48)
+    y_cont = np.random.normal(0, 1, 60)
+    myfold = fold.fold(X_data, y_data, 4).generate_foldIndex()
+    cache = xgb_data.foldCache()
+    binary = xgb_data.xgbData(myfold, X_data, y_data, fold_cache = cache)
+    binary.build()
+    continuous = binary.with_label(y_cont)
+    continuous.build()
+    assert (continuous.get_holdoutLabel() == y_cont[myfold.train_index(3)]).all()
+    for i in range(3):
+        dtrain, dvalidate = binary.get_dtrain(i)
+        assert (dvalidate.get_label() ==
+                binary.get_holdoutLabel()[binary.get_train_foldIndex().validate_index(i)]).all()
+        assert continuous.get_dtrain(i)[0] is dtrain
+        assert (dvalidate.get_label() ==
+                y_cont[myfold.train_index(3)][
+                    continuous.get_train_foldIndex().validate_index(i)].astype(np.float32)).all()
+    assert len(cache) == 3
+    assert (continuous.get_dtest().get_label() ==
+            y_cont[myfold.validate_index(3)].astype(np.float32)).all()
+    assert (binary.get_dtest().get_label() == y_data[myfold.validate_index(3)]).all()
+
+def test_xgbData_eval_context():
+    '''
+    Switching label of shared DMatrix should clear its cached binary label.
+    '''
+    np.random.seed(2017)
+    X_data = np.random.binomial(1, 0.1, (60, 20)).astype(np.float64)
+    y_data = np.array([1.0] * 12 + [0.0] * 48)
+    myfold = fold.fold(X_data, y_data, 4).generate_foldIndex()
+    binary = xgb_data.xgbData(myfold, X_data, y_data)
+    binary.build()
+    flipped = binary.with_label(1 - y_data)
+    flipped.build()
+    dvalidate = binary.get_dtrain(0)[1]
+    context = xgb_eval.eval_context(dvalidate)
+    assert xgb_eval.eval_context(dvalidate) is context
+    assert (context.labels() == dvalidate.get_label()).all()
+    assert flipped.get_dtrain(0)[1] is dvalidate
+    assert (xgb_eval.eval_context(dvalidate).labels() == dvalidate.get_label()).all()
+    assert (xgb_eval.eval_context(dvalidate).labels() != context.labels()).all()
+
+def test_xgbData_weight():
+    '''
+    Sample weight should follow the xgbData that requests shared DMatrix.
+    '''
+    np.random.seed(2017)
+    X_data = np.random.binomial(1, 0.1, (60, 20)).astype(np.float64)
+    y_data = np.array([1.0] * 12 + [0.0] * 48)
+    weight = np.random.randint(1, 5, 60).astype(np.float64)
+    myfold = fold.fold(X_data, y_data, 4).generate_foldIndex()
+    weighted = xgb_data.xgbData(myfold, X_data, y_data, fold_cache = xgb_data.foldCache(),
+                                weight = weight)
+    weighted.build()
+    unweighted = weighted.with_label(y_data)
+    unweighted.build()
+    train_index = myfold.train_index(3)
+    assert (weighted.get_holdoutWeight() == weight[train_index]).all()
+    assert unweighted.get_holdoutWeight() is None
+    validate_index = train_index[weighted.get_train_foldIndex().validate_index(0)]
+    dvalidate = weighted.get_dtrain(0)[1]
+    assert (dvalidate.get_weight() == weight[validate_index]).all()
+    # Unweighted label clears weight, so native metrics still apply.
+    assert unweighted.get_dtrain(0)[1].get_weight().size == 0
+    assert native_eval.offload('ROCAUC', {}, [(dvalidate, 'eval')]) is not None
+    assert (weighted.get_dtrain(0)[1].get_weight() == weight[validate_index]).all()
+    assert (weighted.get_dtest().get_weight() == weight[myfold.validate_index(3)]).all()
+
+def test_xgbData_label_gate():
+    '''
+    xgbData sharing features should not hold the label gate at once, while
+    users of the same xgbData can.
+    '''
+    import threading
+    np.random.seed(2017)
+    X_data = np.random.binomial(1, 0.1, (60, 20)).astype(np.float64)
+    y_data = np.array([1.0] * 12 + [0.0] * 48)
+    myfold = fold.fold(X_data, y_data, 4).generate_foldIndex()
+    binary = xgb_data.xgbData(myfold, X_data, y_data)
+    binary.build()
+    other = binary.with_label(1 - y_data)
+    other.build()
+    events = []
+    with binary.label_gate():
+        with binary.label_gate():
+            events.append('binary')
+        def use_other():
+            with other.label_gate():
+                events.append('other')
+        thread = threading.Thread(target = use_other)
+        thread.start()
+        thread.join(0.1)
+        assert events == ['binary']
+    thread.join()
+    assert events == ['binary', 'other']
@@ -1,4 +1,5 @@
 from lightchem.eval.defined_eval import definedEvaluation
+from lightchem.eval import xgb_eval
 import numpy as np
 
 # Testing pass contious label into evalutaion functions that required binary labels.
@@ -111,3 +112,14 @@ def test_evalReliabilityScore():
     value1 = e(bin_pred, dtrain_bin)
     assert value0 == value1
     assert np.round([value0[1]],2) == 0.25
+
+def test_eval_context():
+    dtrain = pseudo_dtrain("continuous")
+    context = xgb_eval.eval_context(dtrain, 0)
+    # Binary label is computed once per DMatrix and cut.
+    assert xgb_eval.eval_context(dtrain, 0) is context
+    assert xgb_eval.eval_context(dtrain) is not context
+    assert (context.labels() == (dtrain.get_label() > 0)).all()
+    assert context.num_positive() == np.sum(dtrain.get_label() > 0)
+    xgb_eval.clear_eval_context(dtrain)
+    assert xgb_eval.eval_context(dtrain, 0) is not context
@@ -9,6 +9,9 @@ import pandas as pd
 import os
 import numpy as np
 
+FP_TYPES = {'ecfp1024':('Morgan',{'radius':2,'nBits':1024}),
+            'maccs':('MACCSkeys',{})}
+
 if __name__ == "__main__":
     """
     Require VS_wrapper_config.json.
@@ -34,14 +37,11 @@ if __name__ == "__main__":
     df = df.loc[~missing_row]
     df = df.reset_index(drop=True)
     print 'Preparing training data fingerprints'
-    # morgan(ecfp) fp
-    fp = fingerprint.smile_to_fps(df,smile_colname)
-    morgan_fp = fp.Morgan()
-    # MACCSkeys fp
+    # morgan(ecfp) and MACCSkeys fp, each smile is parsed once
     fp = fingerprint.smile_to_fps(df,smile_colname)
-    maccs_fp = fp.MACCSkeys()
-    comb1 = (morgan_fp,label_name_list)
-    comb2 = (maccs_fp,label_name_list)
+    fp_arrays, mol_fail = fp.fingerprints(FP_TYPES,output='csr')
+    comb1 = (df,label_name_list,fp_arrays['ecfp1024'])
+    comb2 = (df,label_name_list,fp_arrays['maccs'])
     training_info = [comb1,comb2]
     print 'Building and selecting best model'
     model = virtualScreening_models.VsEnsembleModel(training_info,eval_name,num_of_fold=3)
@@ -55,13 +55,10 @@ if __name__ == "__main__":
     if dir_test != "":
         df_test = pd.read_csv(dir_test)
         print 'Preparing testing data fingerprints'
-        # morgan(ecfp) fp
-        fp = fingerprint.smile_to_fps(df_test,smile_colname)
-        morgan_fp = fp.Morgan()
-        # MACCSkeys fp
+        # morgan(ecfp) and MACCSkeys fp, each smile is parsed once
         fp = fingerprint.smile_to_fps(df_test,smile_colname)
-        maccs_fp = fp.MACCSkeys()
-        test_data = [morgan_fp.fingerprint,maccs_fp.fingerprint]
+        fp_arrays, mol_fail = fp.fingerprints(FP_TYPES,output='csr')
+        test_data = [(fp_arrays['ecfp1024'],),(fp_arrays['maccs'],)]
         print 'Predict test data'
         pred = model.predict(test_data)
         pred = pd.DataFrame({'Prediction':pred})
@@ -10,6 +10,9 @@ import pandas as pd
 import os
 import numpy as np
 
+FP_TYPES = {'ecfp1024':('Morgan',{'radius':2,'nBits':1024}),
+            'maccs':('MACCSkeys',{})}
+
 if __name__ == "__main__":
     """
     Require VS_wrapper_pcba128_config.json.
@@ -58,13 +61,10 @@ if __name__ == "__main__":
     if dir_test != "":
         df_test = pd.read_csv(dir_test)
         print 'Preparing testing data fingerprints'
-        # morgan(ecfp) fp
-        fp = fingerprint.smile_to_fps(df_test,smile_colname)
-        morgan_fp = fp.Morgan()
-        # MACCSkeys fp
+        # morgan(ecfp) and MACCSkeys fp, each smile is parsed once
         fp = fingerprint.smile_to_fps(df_test,smile_colname)
-        maccs_fp = fp.MACCSkeys()
-        test_data = [morgan_fp.fingerprint,maccs_fp.fingerprint]
+        fp_arrays, mol_fail = fp.fingerprints(FP_TYPES,output='csr')
+        test_data = [(fp_arrays['ecfp1024'],),(fp_arrays['maccs'],)]
         print 'Predict test data'
         pred = model.predict(test_data)
         pred = pd.DataFrame({'Prediction':pred})